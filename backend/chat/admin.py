@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Query, Response
+from .models import ChatJob, ChatUsageDaily, Query, Response
 
 
 @admin.register(Query)
@@ -13,7 +13,24 @@ class QueryAdmin(admin.ModelAdmin):
 
 @admin.register(Response)
 class ResponseAdmin(admin.ModelAdmin):
-    list_display = ['query', 'response_preview', 'timestamp']
+    list_display = ['query', 'response_preview', 'source', 'model', 'timestamp']
+    list_filter = ['source', 'model']
+    list_select_related = ['query', 'body']
+    # Both tables run to millions of rows: no <select> of every one
+    raw_id_fields = ['query', 'body']
 
     def response_preview(self, obj):
         return obj.response_text[:80]
+
+
+@admin.register(ChatJob)
+class ChatJobAdmin(admin.ModelAdmin):
+    list_display = ['query', 'status', 'attempts', 'worker', 'created_at']
+    list_filter = ['status']
+
+
+@admin.register(ChatUsageDaily)
+class ChatUsageDailyAdmin(admin.ModelAdmin):
+    list_display = ['day', 'user', 'model', 'source', 'responses', 'prompt_tokens', 'completion_tokens']
+    list_filter = ['model', 'source']
+    date_hierarchy = 'day'
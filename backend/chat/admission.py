@@ -0,0 +1,245 @@
+"""
+Admission control for outbound LLM calls.
+
+Every completion needs a slot. At most MAX_CONCURRENT calls run per process
+and at most PER_USER per student; everyone else waits in a priority queue
+ordered by role (admin, then faculty, then students) and, within a role, by
+how many requests the user already has queued, so one student's burst
+cannot starve the others. When the expected wait would exceed the latency
+SLO, or a waiter has queued for SLO seconds, the request is shed: it raises
+LoadShed and chat.services answers it from the local fallback instead.
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+
+from .llm import LLMUnavailable
+
+ROLE_PRIORITY = {'admin': 0, 'faculty': 1, 'student': 2}
+
+# Weight of the newest sample in the service-time moving average
+SERVICE_TIME_ALPHA = 0.2
+
+
+class LoadShed(LLMUnavailable):
+    """The request was not admitted within the latency SLO."""
+
+
+class _Waiter:
+    __slots__ = ('key', 'user_id', 'enqueued', 'granted', 'cancelled',
+                 'event', 'loop', 'future')
+
+    def __init__(self, key, user_id, loop=None):
+        self.key = key
+        self.user_id = user_id
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.cancelled = False
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class AdmissionController:
+
+    def __init__(self, max_concurrent=16, per_user=2, slo=10.0):
+        self.max_concurrent = max_concurrent
+        self.per_user = per_user
+        self.slo = slo
+        self._lock = threading.Lock()
+        self._queue = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._user_active = {}    # user id -> running
+        self._user_queued = {}    # user id -> waiting
+        self._service_time = 0.0
+        # Counters
+        self.admitted = 0
+        self.shed = 0
+        self.queued = 0
+        self.max_queue_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    # ─── Bookkeeping (caller holds the lock) ─────────────────────
+
+    def _can_run(self, user_id):
+        return (self._in_flight < self.max_concurrent
+                and self._user_active.get(user_id, 0) < self.per_user)
+
+    def _start(self, user_id):
+        self._in_flight += 1
+        self._user_active[user_id] = self._user_active.get(user_id, 0) + 1
+        self.admitted += 1
+
+    def _expected_wait(self, key):
+        ahead = sum(1 for w in self._queue if not w.cancelled and w.key < key)
+        return (ahead + 1) * self._service_time / self.max_concurrent
+
+    def _enqueue(self, user, loop=None):
+        """Queue the request, shedding it if the wait would be too long."""
+        user_id = getattr(user, 'pk', None)
+        role_rank = ROLE_PRIORITY.get(getattr(user, 'role', None), len(ROLE_PRIORITY))
+        with self._lock:
+            key = (role_rank, self._user_queued.get(user_id, 0), next(self._seq))
+            if (self._depth() or not self._can_run(user_id)) and self._expected_wait(key) > self.slo:
+                self.shed += 1
+                raise LoadShed('LLM queue wait would exceed the latency SLO')
+            waiter = _Waiter(key, user_id, loop)
+            heapq.heappush(self._queue, waiter)
+            self._user_queued[user_id] = self._user_queued.get(user_id, 0) + 1
+            self._dispatch()
+            if not waiter.granted:
+                self.queued += 1
+                self.max_queue_depth = max(self.max_queue_depth, self._depth())
+        return waiter
+
+    def _depth(self):
+        return sum(1 for w in self._queue if not w.cancelled)
+
+    def _dequeued(self, waiter):
+        remaining = self._user_queued.get(waiter.user_id, 1) - 1
+        if remaining:
+            self._user_queued[waiter.user_id] = remaining
+        else:
+            self._user_queued.pop(waiter.user_id, None)
+
+    def _dispatch(self):
+        """Grant slots to the best waiters that can run now."""
+        skipped = []
+        while self._queue and self._in_flight < self.max_concurrent:
+            waiter = heapq.heappop(self._queue)
+            if waiter.cancelled:
+                continue
+            if not self._can_run(waiter.user_id):
+                skipped.append(waiter)
+                continue
+            self._dequeued(waiter)
+            self._start(waiter.user_id)
+            waiter.granted = True
+            wait = time.monotonic() - waiter.enqueued
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            waiter.wake()
+        for waiter in skipped:
+            heapq.heappush(self._queue, waiter)
+
+    def _give_up(self, waiter, shed=True):
+        """Withdraw a waiter that timed out; False if it was granted meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            waiter.cancelled = True
+            self._dequeued(waiter)
+            self.shed += shed
+            return True
+
+    # ─── Public API ──────────────────────────────────────────────
+
+    def acquire(self, user):
+        waiter = self._enqueue(user)
+        if not waiter.granted:
+            waiter.event.wait(self.slo)
+            if self._give_up(waiter):
+                raise LoadShed('LLM queue wait exceeded the latency SLO')
+        return waiter.user_id
+
+    async def aacquire(self, user):
+        waiter = self._enqueue(user, asyncio.get_running_loop())
+        if not waiter.granted:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.slo)
+            except asyncio.TimeoutError:
+                if self._give_up(waiter):
+                    raise LoadShed('LLM queue wait exceeded the latency SLO')
+            except asyncio.CancelledError:
+                if not self._give_up(waiter, shed=False):
+                    self.release(waiter.user_id, None)
+                raise
+        return waiter.user_id
+
+    def release(self, user_id, started):
+        with self._lock:
+            self._in_flight -= 1
+            active = self._user_active.get(user_id, 1) - 1
+            if active:
+                self._user_active[user_id] = active
+            else:
+                self._user_active.pop(user_id, None)
+            if started is not None:
+                elapsed = time.monotonic() - started
+                self._service_time += SERVICE_TIME_ALPHA * (elapsed - self._service_time)
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, user):
+        user_id = self.acquire(user)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(user_id, started)
+
+    @asynccontextmanager
+    async def aslot(self, user):
+        user_id = await self.aacquire(user)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(user_id, started)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': self._in_flight,
+                'queue_depth': self._depth(),
+                'max_queue_depth': self.max_queue_depth,
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'shed': self.shed,
+                'avg_wait': self.wait_total / self.admitted if self.admitted else 0.0,
+                'max_wait': self.wait_max,
+                'service_time': self._service_time,
+            }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """Return the process-wide AdmissionController, or None when disabled."""
+    global _controller
+    config = settings.CHAT_ADMISSION
+    if not config['ENABLED']:
+        return None
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    max_concurrent=config['MAX_CONCURRENT'],
+                    per_user=config['PER_USER'],
+                    slo=config['SLO'],
+                )
+    return _controller
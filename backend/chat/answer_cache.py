@@ -0,0 +1,220 @@
+"""
+Semantic cache for LLM answers.
+
+Questions are normalized (case, punctuation, stopwords, a few synonyms) and
+turned into hashed bag-of-words + character-trigram vectors. A lookup hits
+when a previously answered question against the *same* course context is
+within a cosine-similarity threshold, so "when is the CS101 assignment due"
+and "cs101 deadline?" share one OpenAI call. Tokens containing digits (course
+codes, week numbers) and topic words (exam, syllabus, ...) must match exactly,
+so CS101 never answers for CS201 and an exam question never gets an
+assignment answer.
+"""
+
+import hashlib
+import math
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = frozenset({
+    'a', 'an', 'the', 'is', 'are', 'was', 'be', 'of', 'for', 'to', 'in', 'on',
+    'at', 'my', 'me', 'i', 'can', 'you', 'please', 'tell', 'show', 'what',
+    'when', 'whats', 'which', 'do', 'does', 'about', 'and', 'or', 'it', 'this',
+    'that', 'there', 'any', 'give', 'us', 'we', 'our', 'am', 'will', 'how',
+})
+
+SYNONYMS = {
+    'deadline': 'due', 'deadlines': 'due', 'submission': 'due',
+    'assignments': 'assignment', 'homework': 'assignment', 'hw': 'assignment',
+    'courses': 'course', 'classes': 'course', 'class': 'course',
+    'subjects': 'course', 'subject': 'course',
+    'curriculum': 'syllabus', 'topics': 'syllabus', 'syllabi': 'syllabus',
+    'exams': 'exam', 'test': 'exam', 'tests': 'exam',
+}
+
+# Words that change what is being asked about; they must match exactly.
+# ('assignment' is deliberately absent: a bare "deadline" means assignments.)
+TOPIC_WORDS = frozenset({
+    'exam', 'quiz', 'lab', 'project', 'syllabus', 'grade', 'grades',
+    'course', 'enrolled', 'fee', 'fees', 'attendance', 'faculty',
+})
+
+VECTOR_DIM = 1 << 18
+TRIGRAM_WEIGHT = 0.3
+
+
+def normalize_question(text):
+    """Canonical token string for a question."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        token = SYNONYMS.get(token, token)
+        if token not in STOPWORDS:
+            tokens.append(token)
+    return ' '.join(tokens)
+
+
+def vectorize(normalized):
+    """L2-normalized sparse hashed vector ({bucket: weight})."""
+    vector = {}
+    for token in normalized.split():
+        bucket = zlib.crc32(token.encode()) % VECTOR_DIM
+        vector[bucket] = vector.get(bucket, 0.0) + 1.0
+        padded = f'^{token}$'
+        for i in range(len(padded) - 2):
+            bucket = zlib.crc32(b'#' + padded[i:i + 3].encode()) % VECTOR_DIM
+            vector[bucket] = vector.get(bucket, 0.0) + TRIGRAM_WEIGHT
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    if norm:
+        vector = {k: w / norm for k, w in vector.items()}
+    return vector
+
+
+def cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(k, 0.0) for k, w in a.items())
+
+
+def _key_tokens(normalized):
+    return frozenset(
+        t for t in normalized.split()
+        if t in TOPIC_WORDS or any(c.isdigit() for c in t)
+    )
+
+
+def context_fingerprint(context):
+    """Stable key for a build_context() output."""
+    return hashlib.sha256(context.encode()).hexdigest()
+
+
+class _Entry:
+    __slots__ = ('normalized', 'vector', 'key_tokens', 'answer', 'expires_at')
+
+    def __init__(self, normalized, answer, expires_at):
+        self.normalized = normalized
+        self.vector = vectorize(normalized)
+        self.key_tokens = _key_tokens(normalized)
+        self.answer = answer
+        self.expires_at = expires_at
+
+
+class AnswerCache:
+    """
+    In-process LRU + TTL cache of answers, bucketed by context fingerprint.
+    Similarity search is a linear scan of one bucket (bounded by
+    max_per_context), which is microseconds next to an LLM round trip.
+    """
+
+    def __init__(self, threshold=0.75, ttl=3600, max_entries=5000, max_per_context=64):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_per_context = max_per_context
+        self._buckets = OrderedDict()   # context_key -> OrderedDict(normalized -> _Entry)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, question, context_key):
+        normalized = normalize_question(question)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(context_key)
+            entry = self._match(bucket, normalized, now) if bucket else None
+            if bucket is not None and not bucket:
+                del self._buckets[context_key]
+            if entry is None:
+                self.misses += 1
+                return None
+            self._buckets.move_to_end(context_key)
+            bucket.move_to_end(entry.normalized)
+            self.hits += 1
+            return entry.answer
+
+    def store(self, question, context_key, answer):
+        normalized = normalize_question(question)
+        entry = _Entry(normalized, answer, time.monotonic() + self.ttl)
+        with self._lock:
+            bucket = self._buckets.setdefault(context_key, OrderedDict())
+            self._buckets.move_to_end(context_key)
+            if normalized not in bucket:
+                self._size += 1
+            bucket[normalized] = entry
+            bucket.move_to_end(normalized)
+            if len(bucket) > self.max_per_context:
+                bucket.popitem(last=False)
+                self._size -= 1
+            self._evict()
+
+    def _match(self, bucket, normalized, now):
+        entry = bucket.get(normalized)
+        if entry is not None and entry.expires_at >= now:
+            return entry
+
+        vector = vectorize(normalized)
+        key_tokens = _key_tokens(normalized)
+        best, best_score = None, self.threshold
+        for key, candidate in list(bucket.items()):
+            if candidate.expires_at < now:
+                del bucket[key]
+                self._size -= 1
+                continue
+            if candidate.key_tokens != key_tokens:
+                continue
+            score = cosine(vector, candidate.vector)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def _evict(self):
+        while self._size > self.max_entries and self._buckets:
+            context_key, bucket = next(iter(self._buckets.items()))
+            bucket.popitem(last=False)
+            self._size -= 1
+            if not bucket:
+                del self._buckets[context_key]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._size = 0
+            self.hits = self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': self._size,
+            'contexts': len(self._buckets),
+        }
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """Return the process-wide answer cache, or None when disabled."""
+    global _answer_cache
+    config = settings.CHAT_ANSWER_CACHE
+    if not config['ENABLED']:
+        return None
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = AnswerCache(
+                    threshold=config['THRESHOLD'],
+                    ttl=config['TTL'],
+                    max_entries=config['MAX_ENTRIES'],
+                )
+    return _answer_cache
@@ -0,0 +1,209 @@
+"""
+Single-flight coalescing of identical concurrent LLM calls.
+
+When many students ask the same question against the same course context
+at once, only the first request (the leader) calls the LLM; the others wait
+for and share its answer. Each request still writes its own Query/Response
+rows. Within a process waiters block on an Event (or await a Future); with
+CROSS_PROCESS enabled, a lock in Django's cache elects one leader across
+workers and the answer is handed over through the cache.
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+import uuid
+import weakref
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .answer_cache import normalize_question
+
+
+def coalesce_key(user_message, context_key):
+    normalized = normalize_question(user_message) or user_message.strip().lower()
+    return hashlib.sha256(f'{context_key}\x1f{normalized}'.encode()).hexdigest()
+
+
+class _Call:
+    __slots__ = ('event', 'done', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.done = False
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+
+    key_prefix = 'chat:flight'
+
+    def __init__(self, cross_process=False, cache_alias='default',
+                 lock_timeout=60, wait_timeout=30, poll_interval=0.1, result_ttl=15):
+        self.cross_process = cross_process
+        self.cache_alias = cache_alias
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.result_ttl = result_ttl
+        self._calls = {}
+        self._futures = weakref.WeakKeyDictionary()   # event loop -> {key: Future}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _keys(self, key):
+        return f'{self.key_prefix}:lock:{key}', f'{self.key_prefix}:result:{key}'
+
+    # ─── Sync ────────────────────────────────────────────────────
+
+    def do(self, key, fn):
+        """Run fn() once per key among concurrent callers; share its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            call.event.wait(self.wait_timeout)
+            if not call.done:
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_shared(key, fn)
+            return call.result
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            call.done = True
+            call.event.set()
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def _run_shared(self, key, fn):
+        if not self.cross_process:
+            return fn()
+        lock_key, result_key = self._keys(key)
+        token = uuid.uuid4().hex
+        if self.cache.add(lock_key, token, self.lock_timeout):
+            try:
+                result = fn()
+                self.cache.set(result_key, result, self.result_ttl)
+                return result
+            finally:
+                if self.cache.get(lock_key) == token:
+                    self.cache.delete(lock_key)
+
+        # Another worker process is the leader: wait for its answer
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            result = self.cache.get(result_key)
+            if result is not None:
+                return result
+            if self.cache.get(lock_key) is None:
+                break
+            time.sleep(self.poll_interval)
+        result = self.cache.get(result_key)
+        return result if result is not None else fn()
+
+    # ─── Async ───────────────────────────────────────────────────
+
+    async def ado(self, key, afn):
+        """Async do(): afn is a coroutine function."""
+        loop = asyncio.get_running_loop()
+        futures = self._futures.setdefault(loop, {})
+        future = futures.get(key)
+        if future is not None:
+            self.followers += 1
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), self.wait_timeout)
+            except asyncio.TimeoutError:
+                return await afn()
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise   # this follower was cancelled itself
+                # The leader was cancelled (its client went away): answer ourselves
+                return await afn()
+
+        self.leaders += 1
+        future = futures[key] = loop.create_future()
+        try:
+            result = await self._arun_shared(key, afn)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # Followers must not inherit one request's cancellation
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark retrieved so an unawaited failure is not logged
+            future.exception()
+            raise
+        finally:
+            futures.pop(key, None)
+
+    async def _arun_shared(self, key, afn):
+        if not self.cross_process:
+            return await afn()
+        lock_key, result_key = self._keys(key)
+        token = uuid.uuid4().hex
+        if await self.cache.aadd(lock_key, token, self.lock_timeout):
+            try:
+                result = await afn()
+                await self.cache.aset(result_key, result, self.result_ttl)
+                return result
+            finally:
+                if await self.cache.aget(lock_key) == token:
+                    await self.cache.adelete(lock_key)
+
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            result = await self.cache.aget(result_key)
+            if result is not None:
+                return result
+            if await self.cache.aget(lock_key) is None:
+                break
+            await asyncio.sleep(self.poll_interval)
+        result = await self.cache.aget(result_key)
+        return result if result is not None else await afn()
+
+    def stats(self):
+        return {'leaders': self.leaders, 'followers': self.followers}
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    """Return the process-wide SingleFlight, or None when disabled."""
+    global _single_flight
+    config = settings.CHAT_COALESCE
+    if not config['ENABLED']:
+        return None
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight(
+                    cross_process=config['CROSS_PROCESS'],
+                    cache_alias=config['CACHE_ALIAS'],
+                    lock_timeout=config['LOCK_TIMEOUT'],
+                    wait_timeout=config['WAIT_TIMEOUT'],
+                )
+    return _single_flight
@@ -0,0 +1,189 @@
+"""
+Versioned per-student cache for the course context sent to the LLM.
+
+Entries are keyed by (student, version, namespace); the namespace lets the
+rendered context text and the retrieval index share one version per student.
+Signals in chat.signals bump a student's version whenever one of their
+courses, assignments or enrollments changes, so stale text is never served;
+the TTL bounds staleness for bulk updates that bypass signals (and, for the
+in-process backend, for edits made in other worker processes).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class LocalContextCache:
+    """In-process LRU with TTL. Fast, but private to each worker process."""
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # (user_id, version, namespace) -> (expires_at, value)
+        self._versions = {}             # user_id -> version
+        self._lock = threading.Lock()
+
+    def version(self, user_id):
+        return self._versions.get(user_id, 0)
+
+    def get(self, user_id, version, namespace='context'):
+        key = (user_id, version, namespace)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, user_id, version, value, namespace='context'):
+        key = (user_id, version, namespace)
+        with self._lock:
+            if self._versions.get(user_id, 0) != version:
+                # Invalidated while the value was being built
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_ids):
+        # Old-version entries become unreachable and age out of the LRU
+        with self._lock:
+            for user_id in user_ids:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    async def aversion(self, user_id):
+        return self.version(user_id)
+
+    async def aget(self, user_id, version, namespace='context'):
+        return self.get(user_id, version, namespace)
+
+    async def aset(self, user_id, version, value, namespace='context'):
+        self.set(user_id, version, value, namespace)
+
+
+class DjangoContextCache:
+    """
+    Backed by Django's cache framework, so invalidations are shared by every
+    worker process using the same cache (e.g. Redis or Memcached).
+    Eviction is left to the configured cache backend. A version combines a
+    cache-wide generation, bumped by clear(), with the student's own.
+    """
+    key_prefix = 'chat:ctx'
+    generation_key = f'{key_prefix}:gen'
+
+    def __init__(self, alias='default', ttl=300):
+        self.alias = alias
+        self.ttl = ttl
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _version_key(self, user_id):
+        return f'{self.key_prefix}:v:{user_id}'
+
+    def _entry_key(self, user_id, version, namespace):
+        return f'{self.key_prefix}:{namespace}:{user_id}:{version}'
+
+    @staticmethod
+    def _new_version():
+        # Time-based so an evicted version key can never resurrect old entries
+        return time.time_ns()
+
+    def version(self, user_id):
+        keys = [self.generation_key, self._version_key(user_id)]
+        found = self.cache.get_many(keys)
+        parts = []
+        for key in keys:
+            value = found.get(key)
+            if value is None:
+                value = self._new_version()
+                if not self.cache.add(key, value, timeout=None):
+                    value = self.cache.get(key, value)
+            parts.append(value)
+        return '{}.{}'.format(*parts)
+
+    def get(self, user_id, version, namespace='context'):
+        return self.cache.get(self._entry_key(user_id, version, namespace))
+
+    def set(self, user_id, version, value, namespace='context'):
+        self.cache.set(
+            self._entry_key(user_id, version, namespace), value, timeout=self.ttl
+        )
+
+    def invalidate(self, user_ids):
+        version = self._new_version()
+        self.cache.set_many(
+            {self._version_key(user_id): version for user_id in user_ids},
+            timeout=None,
+        )
+
+    def clear(self):
+        # The cache may be shared; only orphan this cache's own entries
+        self.cache.set(self.generation_key, self._new_version(), timeout=None)
+
+    async def aversion(self, user_id):
+        keys = [self.generation_key, self._version_key(user_id)]
+        found = await self.cache.aget_many(keys)
+        parts = []
+        for key in keys:
+            value = found.get(key)
+            if value is None:
+                value = self._new_version()
+                if not await self.cache.aadd(key, value, timeout=None):
+                    value = await self.cache.aget(key, value)
+            parts.append(value)
+        return '{}.{}'.format(*parts)
+
+    async def aget(self, user_id, version, namespace='context'):
+        return await self.cache.aget(self._entry_key(user_id, version, namespace))
+
+    async def aset(self, user_id, version, value, namespace='context'):
+        await self.cache.aset(
+            self._entry_key(user_id, version, namespace), value, timeout=self.ttl
+        )
+
+
+_context_cache = None
+_context_cache_lock = threading.Lock()
+
+
+def get_context_cache():
+    """Return the process-wide context cache configured in settings."""
+    global _context_cache
+    if _context_cache is None:
+        with _context_cache_lock:
+            if _context_cache is None:
+                config = settings.CHAT_CONTEXT_CACHE
+                if config['BACKEND'] == 'django':
+                    _context_cache = DjangoContextCache(
+                        alias=config.get('ALIAS', 'default'),
+                        ttl=config['TTL'],
+                    )
+                else:
+                    _context_cache = LocalContextCache(
+                        max_entries=config['MAX_ENTRIES'],
+                        ttl=config['TTL'],
+                    )
+    return _context_cache
+
+
+def invalidate_students(user_ids):
+    """Drop the cached context for the given students."""
+    user_ids = list(user_ids)
+    if user_ids:
+        get_context_cache().invalidate(user_ids)
@@ -0,0 +1,180 @@
+"""
+Incremental content-index pipeline for course material.
+
+Each course is chunked (chat.retrieval.chunk_course) and every chunk is
+hashed; on re-index only chunks whose hash is new are tokenized and written,
+vanished chunks are deleted and moved ones just get a new position. Like the
+prompt context, only a course's CONTEXT_ASSIGNMENTS_PER_COURSE most recent
+assignments are indexed.
+
+Work is scheduled on commit and runs on a background thread, off the
+request path. That queue lives in memory, so a re-index is lost if the
+process exits first; every chunk of a course is stamped with the time its
+last re-index started, and `reindex_courses --stale` (run it from cron)
+re-indexes the courses edited since.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from courses.models import Assignment, Course, Enrollment
+from .context_cache import invalidate_students
+from .models import CourseChunk
+from .retrieval import CONTEXT_ASSIGNMENTS_PER_COURSE, chunk_course, chunk_terms
+
+logger = logging.getLogger(__name__)
+
+IndexStats = namedtuple('IndexStats', ['added', 'removed', 'moved', 'unchanged'])
+
+
+def chunk_hash(chunk):
+    payload = '\x1f'.join([
+        chunk.course_code, chunk.kind, str(chunk.assignment_id or ''), chunk.text,
+    ])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def reindex_course(course_id):
+    """Bring a course's CourseChunk rows in line with its current content."""
+    started = timezone.now()
+    course = Course.objects.select_related('faculty').filter(pk=course_id).first()
+    if course is None:
+        return IndexStats(0, 0, 0, 0)
+    assignments = course.assignments.order_by('-created_at')[:CONTEXT_ASSIGNMENTS_PER_COURSE]
+
+    existing = {}
+    for row in CourseChunk.objects.filter(course=course).defer('terms'):
+        existing.setdefault(row.content_hash, []).append(row)
+
+    to_create, to_move = [], []
+    unchanged = 0
+    for position, chunk in enumerate(chunk_course(course, assignments)):
+        digest = chunk_hash(chunk)
+        rows = existing.get(digest)
+        if rows:
+            row = rows.pop()
+            if row.position != position:
+                row.position = position
+                to_move.append(row)
+            else:
+                unchanged += 1
+            continue
+        to_create.append(CourseChunk(
+            course=course,
+            assignment_id=chunk.assignment_id,
+            kind=chunk.kind,
+            position=position,
+            text=chunk.text,
+            content_hash=digest,
+            terms=chunk_terms(chunk),
+        ))
+    stale_ids = [row.pk for rows in existing.values() for row in rows]
+
+    with transaction.atomic():
+        if stale_ids:
+            CourseChunk.objects.filter(pk__in=stale_ids).delete()
+        if to_create:
+            CourseChunk.objects.bulk_create(to_create, batch_size=500)
+        if to_move:
+            CourseChunk.objects.bulk_update(to_move, ['position'], batch_size=500)
+        # Edits saved after `started` may have been missed: see stale_course_ids()
+        CourseChunk.objects.filter(course=course).update(updated_at=started)
+
+    stats = IndexStats(len(to_create), len(stale_ids), len(to_move), unchanged)
+    if to_create or stale_ids or to_move:
+        # Cached retrieval indexes were built from the old chunks
+        invalidate_students(
+            Enrollment.objects.filter(course=course).values_list('student_id', flat=True)
+        )
+    return stats
+
+
+def stale_course_ids():
+    """
+    Ids of courses edited since their last re-index (or never indexed),
+    e.g. because a scheduled re-index was lost with its process.
+    """
+    def newest(queryset):
+        return Subquery(
+            queryset.filter(course=OuterRef('pk')).order_by('-updated_at').values('updated_at')[:1]
+        )
+
+    return Course.objects.annotate(
+        indexed_at=newest(CourseChunk.objects),
+        assignment_changed_at=newest(Assignment.objects),
+    ).filter(
+        Q(indexed_at__isnull=True)
+        | Q(updated_at__gt=F('indexed_at'))
+        | Q(assignment_changed_at__gt=F('indexed_at'))
+    ).values_list('id', flat=True)
+
+
+def stored_chunks(course_ids):
+    """Persisted chunks for the given courses, for chat.retrieval.build_index."""
+    return CourseChunk.objects.filter(course_id__in=course_ids).only(
+        'course_id', 'assignment_id', 'kind', 'text', 'terms',
+    )
+
+
+class ReindexWorker:
+    """
+    Single background thread that re-indexes courses one at a time.
+    Repeated requests for a course that is already queued are collapsed.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='course-reindex',
+        )
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, course_id):
+        with self._lock:
+            if course_id in self._pending:
+                return
+            self._pending.add(course_id)
+        self._executor.submit(self._run, course_id)
+
+    def _run(self, course_id):
+        with self._lock:
+            # Edits arriving while we run must schedule another pass
+            self._pending.discard(course_id)
+        try:
+            stats = reindex_course(course_id)
+            logger.info(f"Re-indexed course {course_id}: {stats}")
+        except Exception:
+            logger.exception(f"Re-indexing course {course_id} failed")
+        finally:
+            close_old_connections()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_reindex_worker():
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = ReindexWorker()
+    return _worker
+
+
+def schedule_reindex(course_id):
+    """Re-index a course once the current transaction commits."""
+    def run():
+        if settings.CHAT_INDEXING['BACKGROUND']:
+            get_reindex_worker().schedule(course_id)
+        else:
+            reindex_course(course_id)
+    transaction.on_commit(run)
@@ -0,0 +1,172 @@
+"""
+Job mode for chat: answers generated by a worker pool off the request path.
+
+POST /api/chat/ in job mode only stores the Query and a pending ChatJob row
+and returns 202. Workers (python manage.py run_chat_workers) claim pending
+jobs with a conditional UPDATE — portable across SQLite and PostgreSQL and
+safe with several worker processes — generate the answer and write the
+Response. A job whose worker died is picked up again once its lease
+expires, up to MAX_ATTEMPTS times.
+"""
+
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import ChatJob, Response
+from .services import get_ai_response
+from .telemetry import collect
+
+logger = logging.getLogger(__name__)
+
+
+def claim_jobs(worker, limit):
+    """
+    Mark up to `limit` runnable jobs as running for this worker and return
+    their ids. Pending jobs are taken oldest first, along with running jobs
+    whose lease has expired; an expired job that has used up MAX_ATTEMPTS
+    is marked failed instead.
+    """
+    if limit <= 0:
+        return []
+    config = settings.CHAT_JOBS
+    now = timezone.now()
+    expired = Q(status=ChatJob.Status.RUNNING,
+                locked_at__lt=now - timedelta(seconds=config['LEASE']))
+    ChatJob.objects.filter(expired, attempts__gte=config['MAX_ATTEMPTS']).update(
+        status=ChatJob.Status.FAILED,
+        error='Worker lease expired on every attempt.',
+        locked_at=None,
+        updated_at=now,
+    )
+    runnable = ChatJob.objects.filter(
+        Q(status=ChatJob.Status.PENDING)
+        | (expired & Q(attempts__lt=config['MAX_ATTEMPTS']))
+    ).order_by('created_at')
+    claimed = []
+    for pk, job_status, locked_at in runnable.values_list('id', 'status', 'locked_at')[:limit * 2]:
+        # Only one worker's UPDATE can still match the row it saw
+        won = ChatJob.objects.filter(pk=pk, status=job_status, locked_at=locked_at).update(
+            status=ChatJob.Status.RUNNING,
+            worker=worker,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+            updated_at=now,
+        )
+        if won:
+            claimed.append(pk)
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def run_job(job_id):
+    """Generate and store the answer for one claimed job."""
+    job = ChatJob.objects.select_related('query__user').get(pk=job_id)
+    query = job.query
+    try:
+        if not Response.objects.filter(query=query).exists():
+            with collect() as telemetry:
+                text = get_ai_response(query.content, query.user)
+            Response.objects.get_or_create(query=query, defaults={
+                'response_text': text, **telemetry.fields(),
+            })
+        ChatJob.objects.filter(pk=job.pk).update(
+            status=ChatJob.Status.DONE, error='', updated_at=timezone.now(),
+        )
+    except Exception as exc:
+        logger.exception(f"Chat job {job.pk} failed")
+        retry = job.attempts < settings.CHAT_JOBS['MAX_ATTEMPTS']
+        ChatJob.objects.filter(pk=job.pk).update(
+            status=ChatJob.Status.PENDING if retry else ChatJob.Status.FAILED,
+            error=str(exc)[:1000],
+            locked_at=None,
+            updated_at=timezone.now(),
+        )
+
+
+class JobWorkerPool:
+    """
+    Polls the chat_jobs table and runs claimed jobs on a fixed-size thread
+    pool; the pool size is the cap on concurrent LLM calls per process.
+    """
+
+    def __init__(self, workers=None, poll_interval=None, name=None):
+        config = settings.CHAT_JOBS
+        self.workers = workers or config['WORKERS']
+        self.poll_interval = poll_interval if poll_interval is not None else config['POLL_INTERVAL']
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix='chat-job',
+        )
+        self._slots = threading.Semaphore(self.workers)
+        self._stop = threading.Event()
+        self.processed = 0
+
+    def run(self, once=False):
+        """Process jobs until stop() (or, with once=True, the queue is empty)."""
+        try:
+            while not self._stop.is_set():
+                free = 0
+                while free < self.workers and self._slots.acquire(blocking=False):
+                    free += 1
+                claimed = claim_jobs(self.name, free) if free else []
+                for _ in range(free - len(claimed)):
+                    self._slots.release()
+                for job_id in claimed:
+                    self._executor.submit(self._run, job_id)
+                if not claimed:
+                    if once:
+                        break
+                    self._stop.wait(self.poll_interval)
+        finally:
+            self._executor.shutdown(wait=True)
+            close_old_connections()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, job_id):
+        try:
+            run_job(job_id)
+            self.processed += 1
+        except Exception:
+            logger.exception(f"Chat job {job_id} crashed")
+        finally:
+            close_old_connections()
+            self._slots.release()
+
+
+async def aenqueue_job(query):
+    return await ChatJob.objects.acreate(query=query)
+
+
+def in_flight(query, now=None):
+    """
+    Whether an unanswered query's answer may still arrive: its job is
+    pending or running or, without a job, it was asked within
+    CHAT_IDEMPOTENCY['WAIT'] seconds (after that it is taken as abandoned).
+    """
+    job = getattr(query, 'job', None)
+    if job is not None:
+        return job.status in (ChatJob.Status.PENDING, ChatJob.Status.RUNNING)
+    age = (now or timezone.now()) - query.timestamp
+    return age.total_seconds() < settings.CHAT_IDEMPOTENCY['WAIT']
+
+
+def job_status(query):
+    """Status of a query's answer: a job's status, or done/pending without one."""
+    job = getattr(query, 'job', None)
+    if job is not None and job.status != ChatJob.Status.DONE:
+        return job.status
+    if getattr(query, 'response', None) is not None:
+        return ChatJob.Status.DONE
+    return ChatJob.Status.PENDING
@@ -0,0 +1,279 @@
+"""
+Process-wide OpenAI client management.
+
+One long-lived client per process (and per event loop for the async client)
+keeps HTTP connections alive across requests instead of paying a new TLS
+handshake per chat. Every call gets a deadline, transient failures are
+retried with jittered exponential backoff, and a circuit breaker sends
+requests straight to the local fallback while the provider is unhealthy.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailable(Exception):
+    """The provider is not usable right now (breaker open or deadline hit)."""
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker. After `failure_threshold` consecutive
+    failures it opens for `reset_timeout` seconds, then lets a single probe
+    through (half-open); the probe's outcome closes or re-opens it.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and self._cooled_down():
+                return self.HALF_OPEN
+            return self._state
+
+    def _cooled_down(self):
+        return time.monotonic() - self._opened_at >= self.reset_timeout
+
+    def allow(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and self._cooled_down():
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning("LLM circuit breaker opened")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """Give up a probe that ended without an outcome (e.g. cancelled)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+def _retryable(exc):
+    import openai
+    return isinstance(exc, (
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+    ))
+
+
+class LLMClient:
+    """Pooled sync/async OpenAI clients behind retries and a breaker."""
+
+    def __init__(self, config):
+        self.config = config
+        self.breaker = CircuitBreaker(
+            failure_threshold=config['BREAKER_THRESHOLD'],
+            reset_timeout=config['BREAKER_RESET'],
+        )
+        self._sync_client = None
+        self._async_clients = weakref.WeakKeyDictionary()  # event loop -> client
+        self._lock = threading.Lock()
+
+    def _client_kwargs(self):
+        # The SDK's own HTTP client keeps a keep-alive connection pool, so
+        # reusing one client instance is what avoids per-request handshakes.
+        return {
+            'api_key': settings.OPENAI_API_KEY or 'unused',   # the SDK insists on one
+            'base_url': self.config['BASE_URL'] or None,
+            'timeout': self._timeout(),
+            'max_retries': 0,   # retries are ours, bounded by the deadline
+        }
+
+    def _timeout(self, read=None):
+        from openai import Timeout
+        return Timeout(
+            read if read is not None else self.config['TIMEOUT'],
+            connect=self.config['CONNECT_TIMEOUT'],
+        )
+
+    @property
+    def sync_client(self):
+        if self._sync_client is None:
+            with self._lock:
+                if self._sync_client is None:
+                    from openai import OpenAI
+                    self._sync_client = OpenAI(**self._client_kwargs())
+        return self._sync_client
+
+    @property
+    def async_client(self):
+        # Async connection pools are bound to the loop that created them
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            from openai import AsyncOpenAI
+            client = AsyncOpenAI(**self._client_kwargs())
+            self._async_clients[loop] = client
+        return client
+
+    def _backoff(self, attempt):
+        # Full jitter: uniform(0, base * 2^attempt), capped
+        return random.uniform(0, min(self.config['BACKOFF_CAP'],
+                                     self.config['BACKOFF_BASE'] * 2 ** attempt))
+
+    def _remaining(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMUnavailable('LLM deadline exceeded')
+        return remaining
+
+    def _before_call(self):
+        if not self.breaker.allow():
+            raise LLMUnavailable('LLM circuit breaker is open')
+        return time.monotonic() + self.config['DEADLINE']
+
+    def _on_error(self, exc, attempt, deadline):
+        """Record the failure; return the backoff delay, or re-raise."""
+        if not _retryable(exc):
+            # Client-side errors (bad request, auth) say nothing about health
+            self.breaker.record_success()
+            raise exc
+        self.breaker.record_failure()
+        if attempt >= self.config['MAX_RETRIES']:
+            raise exc
+        delay = self._backoff(attempt)
+        if time.monotonic() + delay >= deadline:
+            raise exc
+        if not self.breaker.allow():
+            raise LLMUnavailable('LLM circuit breaker is open') from exc
+        logger.warning(f"LLM call failed ({exc}); retrying in {delay:.2f}s")
+        return delay
+
+    def _on_stream_error(self, exc):
+        if _retryable(exc):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _monitored(self, stream):
+        """Yield from `stream`; the breaker hears its outcome once consumed."""
+        try:
+            yield from stream
+        except Exception as exc:
+            self._on_stream_error(exc)
+            raise
+        except BaseException:
+            self.breaker.release()   # abandoned by the consumer
+            raise
+        self.breaker.record_success()
+
+    async def _amonitored(self, stream):
+        try:
+            async for chunk in stream:
+                yield chunk
+        except Exception as exc:
+            self._on_stream_error(exc)
+            raise
+        except BaseException:
+            self.breaker.release()   # cancelled, or abandoned by the consumer
+            raise
+        self.breaker.record_success()
+
+    def complete(self, **kwargs):
+        """
+        chat.completions.create() with deadline, retries and breaker. With
+        stream=True returns the opened stream, whose outcome is recorded
+        when it has been consumed.
+        """
+        deadline = self._before_call()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    response = self.sync_client.chat.completions.create(
+                        timeout=self._timeout(self._remaining(deadline)), **kwargs
+                    )
+                    if kwargs.get('stream'):
+                        return self._monitored(response)
+                    self.breaker.record_success()
+                    return response
+                except LLMUnavailable:
+                    self.breaker.record_failure()
+                    raise
+                except Exception as exc:
+                    time.sleep(self._on_error(exc, attempt, deadline))
+                    attempt += 1
+        except Exception:
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+
+    async def acomplete(self, **kwargs):
+        """Async complete()."""
+        deadline = self._before_call()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    response = await self.async_client.chat.completions.create(
+                        timeout=self._timeout(self._remaining(deadline)), **kwargs
+                    )
+                    if kwargs.get('stream'):
+                        return self._amonitored(response)
+                    self.breaker.record_success()
+                    return response
+                except LLMUnavailable:
+                    self.breaker.record_failure()
+                    raise
+                except Exception as exc:
+                    await asyncio.sleep(self._on_error(exc, attempt, deadline))
+                    attempt += 1
+        except Exception:
+            raise
+        except BaseException:
+            # A cancelled call must not leave a half-open probe in flight
+            self.breaker.release()
+            raise
+
+
+_llm = None
+_llm_lock = threading.Lock()
+
+
+def get_llm():
+    """Return the process-wide LLMClient."""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                _llm = LLMClient(settings.CHAT_LLM)
+    return _llm
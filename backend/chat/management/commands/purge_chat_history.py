@@ -0,0 +1,64 @@
+"""
+Archive and delete chat history older than the retention horizon.
+Run: python manage.py purge_chat_history [--days N] [--no-archive]
+
+Safe to schedule (e.g. nightly cron) and to interrupt: each batch is its
+own transaction and the next run resumes where this one stopped.
+"""
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.models import Query
+from chat.retention import Archive, purge
+
+
+class Command(BaseCommand):
+    help = 'Move chat queries/responses older than the retention horizon to compressed archives.'
+
+    def add_arguments(self, parser):
+        config = settings.CHAT_RETENTION
+        parser.add_argument('--days', type=int, default=config['DAYS'],
+                            help='Keep this many days of history.')
+        parser.add_argument('--archive-dir', default=str(config['ARCHIVE_DIR']))
+        parser.add_argument('--no-archive', action='store_true',
+                            help='Delete without writing an archive.')
+        parser.add_argument('--batch-size', type=int, default=config['BATCH_SIZE'])
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches.')
+        parser.add_argument('--max-seconds', type=float, default=None,
+                            help='Stop after this long; the next run resumes.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        if options['dry_run']:
+            count = Query.objects.filter(timestamp__lt=cutoff).count()
+            self.stdout.write(f"{count} queries older than {cutoff:%Y-%m-%d} would be purged.")
+            return
+
+        archive = None if options['no_archive'] else Archive(options['archive_dir'])
+        started = time.monotonic()
+        deleted = archived = written = 0
+        for batch in purge(cutoff, archive, options['batch_size'],
+                           options['pause'], options['max_seconds']):
+            deleted += batch.deleted
+            archived += batch.archived
+            written += batch.bytes
+            self.stdout.write(
+                f"ids {batch.first_id}-{batch.last_id}: deleted {batch.deleted} "
+                f"in {batch.seconds * 1000:.0f} ms"
+            )
+
+        elapsed = time.monotonic() - started
+        rate = deleted / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {deleted} queries ({archived} archived, {written / 1024:.1f} KiB "
+            f"before compression) in {elapsed:.1f}s — {rate:.0f} rows/s."
+        ))
+        if archive is not None and archived:
+            self.stdout.write(f"Archive: {archive.path}")
@@ -0,0 +1,39 @@
+"""
+Backfill or repair the course-content index.
+Run: python manage.py reindex_courses [course_id ...] [--stale]
+
+Edits are normally re-indexed in the background as they are saved; that
+work is lost if the process exits first. Run with --stale periodically
+(e.g. from cron) to re-index only the courses edited since their last
+re-index.
+"""
+
+from django.core.management.base import BaseCommand
+
+from courses.models import Course
+from chat.indexing import reindex_course, stale_course_ids
+
+
+class Command(BaseCommand):
+    help = 'Incrementally re-index course syllabi and assignments for retrieval.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_ids', nargs='*', type=int)
+        parser.add_argument('--stale', action='store_true',
+                            help='Only courses edited since their last re-index.')
+
+    def handle(self, *args, **options):
+        if options['stale']:
+            stale = stale_course_ids()
+            if options['course_ids']:
+                stale = stale.filter(id__in=options['course_ids'])
+            course_ids = list(stale)
+        else:
+            course_ids = options['course_ids'] or Course.objects.values_list('id', flat=True)
+        for course_id in course_ids:
+            stats = reindex_course(course_id)
+            self.stdout.write(
+                f"Course {course_id}: +{stats.added} -{stats.removed} "
+                f"~{stats.moved} ={stats.unchanged}"
+            )
+        self.stdout.write(self.style.SUCCESS('Re-indexing complete.'))
@@ -0,0 +1,44 @@
+"""
+Build the daily chat usage rollups that cost and capacity reports read.
+Run: python manage.py rollup_chat_usage [--days N | --from YYYY-MM-DD --to YYYY-MM-DD]
+
+Idempotent: each day is rebuilt from scratch, so schedule it (e.g. hourly
+or nightly from cron) with a small --days to keep today and yesterday fresh.
+"""
+
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from chat.usage import oldest_rebuildable_day, rollup
+
+
+class Command(BaseCommand):
+    help = 'Aggregate chat responses into per-day usage rollups.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2,
+                            help='Rebuild this many days, ending today (default: 2).')
+        parser.add_argument('--from', dest='first', type=date.fromisoformat,
+                            help='First day to rebuild.')
+        parser.add_argument('--to', dest='last', type=date.fromisoformat,
+                            help='Last day to rebuild (default: today).')
+
+    def handle(self, *args, **options):
+        last = options['last'] or timezone.localdate()
+        first = options['first'] or last - timedelta(days=options['days'] - 1)
+        if first > last:
+            raise CommandError('--from must not be after --to.')
+        if first < oldest_rebuildable_day():
+            self.stdout.write(self.style.WARNING(
+                f"Days before {oldest_rebuildable_day()} are past the retention "
+                f"horizon and keep their existing rollups."
+            ))
+
+        days = rows = 0
+        for day, written in rollup(first, last):
+            days += 1
+            rows += written
+            self.stdout.write(f"{day}: {written} rollup rows")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {days} days ({rows} rows)."))
@@ -0,0 +1,28 @@
+"""
+Run the chat job worker pool (answers for job-mode requests).
+Run: python manage.py run_chat_workers [--workers N] [--once]
+"""
+
+import signal
+
+from django.core.management.base import BaseCommand
+
+from chat.jobs import JobWorkerPool
+
+
+class Command(BaseCommand):
+    help = 'Generate answers for queued chat jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Concurrent jobs (default: CHAT_JOBS["WORKERS"]).')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue and exit instead of polling.')
+
+    def handle(self, *args, **options):
+        pool = JobWorkerPool(workers=options['workers'])
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: pool.stop())
+        self.stdout.write(f"Chat workers started ({pool.workers} threads, {pool.name}).")
+        pool.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS(f"Processed {pool.processed} job(s)."))
@@ -0,0 +1,144 @@
+"""
+Rolling conversation memory.
+
+Follow-up questions ("and when is that due?") get the last few turns
+verbatim plus a compact per-user summary of everything older, so the prompt
+stays bounded however long the history grows. The summary is folded forward
+lazily, when a follow-up loads memory and turns have left the verbatim
+window since the last fold: each such turn becomes one short extractive
+line, and the oldest lines fall off once the summary exceeds its token
+budget. Chats that never need memory never pay for it.
+
+Standalone questions are sent without memory; they stay eligible for the
+shared answer cache and request coalescing.
+"""
+
+import hashlib
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import ConversationMemory, Query
+from .prompt import estimate_tokens, truncate_to_tokens
+
+Memory = namedtuple('Memory', ['summary', 'turns'])   # turns: [(question, answer)], oldest first
+
+_CONNECTIVE_RE = re.compile(r"^\s*(?:and|also|then|so|but|what about|how about)\b", re.IGNORECASE)
+_BACK_REFERENCE_RE = re.compile(
+    r"\b(?:you (?:said|mentioned)|(?:your|the) (?:last|previous) (?:answer|reply|one))\b",
+    re.IGNORECASE,
+)
+# Demonstratives before a time word ("this week") point at the calendar, not a turn
+_PRONOUN_RE = re.compile(
+    r"\b(?:it|its|they|them|their|that|this|those|these)\b"
+    r"(?!\s+(?:week|weekend|month|semester|term|year|morning|afternoon|evening|time)\b)",
+    re.IGNORECASE,
+)
+# In longer questions a pronoun usually refers to something named in the
+# question itself, so only short pronoun questions count as follow-ups
+FOLLOW_UP_MAX_WORDS = 8
+
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s')
+_MARKUP_RE = re.compile(r'[*_`#>]+')
+
+# Words kept per side of a summary line
+SUMMARY_QUESTION_WORDS = 20
+SUMMARY_ANSWER_WORDS = 30
+
+# Turns newer than the summary but beyond this many are skipped, not folded:
+# they would fall off the summary's token budget anyway
+MAX_FOLD = 20
+
+
+def is_follow_up(message):
+    """
+    Whether the message leans on earlier turns: a leading connective ("and
+    ..."), an explicit back-reference, or a short question built around a
+    pronoun ("what does that mean?").
+    """
+    if _CONNECTIVE_RE.search(message) or _BACK_REFERENCE_RE.search(message):
+        return True
+    return len(message.split()) <= FOLLOW_UP_MAX_WORDS and bool(_PRONOUN_RE.search(message))
+
+
+def _words(text, limit):
+    words = _MARKUP_RE.sub('', text).split()
+    clipped = ' '.join(words[:limit])
+    return clipped + ' …' if len(words) > limit else clipped
+
+
+def summary_line(question, answer):
+    """One compact line for a turn: the question and the answer's lead."""
+    lead = _SENTENCE_END_RE.split(answer.strip(), maxsplit=1)[0]
+    return (f"- Asked: {_words(question, SUMMARY_QUESTION_WORDS)} "
+            f"| Answered: {_words(lead, SUMMARY_ANSWER_WORDS)}")
+
+
+def fold(summary, turns, max_tokens):
+    """Append turns to the summary, then drop its oldest lines to fit."""
+    lines = summary.splitlines() if summary else []
+    lines += [summary_line(question, answer) for question, answer in turns]
+    total = sum(estimate_tokens(line) + 1 for line in lines)
+    while lines and total > max_tokens:
+        total -= estimate_tokens(lines.pop(0)) + 1
+    return '\n'.join(lines)
+
+
+def _turns(user_id):
+    return Query.objects.filter(
+        user_id=user_id,
+        response__isnull=False,
+        response__is_partial=False,
+    ).select_related('response__body').order_by('-id')
+
+
+def load_memory(user):
+    """
+    The user's summary and most recent completed turns: two queries, plus
+    a fold when turns have left the verbatim window since the last one.
+    """
+    config = settings.CHAT_MEMORY
+    summary, summarized_through = ConversationMemory.objects.filter(user=user).values_list(
+        'summary', 'summarized_through',
+    ).first() or ('', 0)
+    # One turn beyond the window shows whether anything is left to fold
+    recent = list(_turns(user.pk)[:config['TURNS'] + 1])
+    if len(recent) > config['TURNS'] and recent[-1].id > summarized_through:
+        summary = update_memory(user.pk).summary
+    turns = []
+    for query in reversed(recent[:config['TURNS']]):
+        answer = query.response.response_text
+        if estimate_tokens(answer) > config['TURN_TOKENS']:
+            answer = truncate_to_tokens(answer, config['TURN_TOKENS'])
+        turns.append((query.content, answer))
+    return Memory(summary, turns)
+
+
+def memory_fingerprint(memory):
+    payload = '\x1e'.join([memory.summary] + [f'{q}\x1f{a}' for q, a in memory.turns])
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def update_memory(user_id):
+    """Fold turns that have left the verbatim window into the summary."""
+    config = settings.CHAT_MEMORY
+    with transaction.atomic():
+        memory, _ = ConversationMemory.objects.select_for_update().get_or_create(
+            user_id=user_id,
+        )
+        leaving = list(
+            _turns(user_id).filter(id__gt=memory.summarized_through)
+            [config['TURNS']:config['TURNS'] + MAX_FOLD]
+        )
+        if not leaving:
+            return memory
+        memory.summary = fold(
+            memory.summary,
+            [(q.content, q.response.response_text) for q in reversed(leaving)],
+            config['SUMMARY_TOKENS'],
+        )
+        memory.summarized_through = leaving[0].id
+        memory.save(update_fields=['summary', 'summarized_through', 'updated_at'])
+    return memory
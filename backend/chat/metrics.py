@@ -0,0 +1,70 @@
+"""
+Chat metrics: how answers were produced, LLM token use, and scrape-time
+snapshots of the admission controller, single-flight and answer cache.
+"""
+
+from unibot_backend.metrics import collector, counter, gauge
+
+from .admission import get_admission_controller
+from .answer_cache import get_answer_cache
+from .coalesce import get_single_flight
+
+# source: routed | cache | llm | fallback | demo
+ANSWERS = counter('unibot_chat_answers_total', 'Chat answers by how they were produced.', ['source'])
+LLM_TOKENS = counter('unibot_llm_tokens_total', 'Tokens reported by the LLM provider.', ['kind'])
+LLM_CALLS = counter('unibot_llm_calls_total', 'LLM calls by outcome.', ['outcome'])
+LLM_IN_FLIGHT = gauge('unibot_llm_in_flight', 'LLM calls currently in flight.')
+
+
+def record_usage(usage):
+    """Count prompt/completion tokens from a completion's `usage`, if any."""
+    if usage is None:
+        return
+    LLM_TOKENS.inc('prompt', amount=usage.prompt_tokens or 0)
+    LLM_TOKENS.inc('completion', amount=usage.completion_tokens or 0)
+
+
+class llm_call:
+    """Tracks one provider call: in-flight gauge plus outcome counter."""
+    __slots__ = ()
+
+    def __enter__(self):
+        LLM_IN_FLIGHT.inc()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        LLM_IN_FLIGHT.dec()
+        LLM_CALLS.inc('error' if exc_type else 'ok')
+        return False
+
+
+def _series(prefix, kinds, stats, documentation):
+    for key, value in stats.items():
+        kind = kinds.get(key, 'gauge')
+        name = f'{prefix}_{key}_total' if kind == 'counter' else f'{prefix}_{key}'
+        yield name, kind, f'{documentation}: {key}.', {(): value}
+
+
+@collector
+def chat_components():
+    controller = get_admission_controller()
+    if controller is not None:
+        yield from _series(
+            'unibot_admission',
+            {'admitted': 'counter', 'queued': 'counter', 'shed': 'counter'},
+            controller.stats(), 'LLM admission control',
+        )
+    flight = get_single_flight()
+    if flight is not None:
+        yield from _series(
+            'unibot_coalesce',
+            {'leaders': 'counter', 'followers': 'counter'},
+            flight.stats(), 'Request coalescing',
+        )
+    cache = get_answer_cache()
+    if cache is not None:
+        yield from _series(
+            'unibot_answer_cache',
+            {'hits': 'counter', 'misses': 'counter'},
+            cache.stats(), 'Semantic answer cache',
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='response',
+            name='is_partial',
+            field=models.BooleanField(default=False, help_text='Set when a streamed answer was cut off by a client disconnect or an LLM failure.'),
+        ),
+    ]
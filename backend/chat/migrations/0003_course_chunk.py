@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_response_is_partial'),
+        ('courses', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('position', models.PositiveIntegerField()),
+                ('text', models.TextField()),
+                ('content_hash', models.CharField(max_length=64)),
+                ('terms', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('assignment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='courses.assignment')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='courses.course')),
+            ],
+            options={
+                'db_table': 'course_chunks',
+                'ordering': ['course', 'position'],
+                'indexes': [models.Index(fields=['course', 'content_hash'], name='course_chun_course__e06107_idx')],
+            },
+        ),
+    ]
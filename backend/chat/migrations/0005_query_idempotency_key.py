@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_chat_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='query',
+            name='idempotency_key',
+            field=models.CharField(blank=True, help_text='Client-supplied Idempotency-Key header; retries replay this query.', max_length=255, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='query',
+            constraint=models.UniqueConstraint(condition=models.Q(('idempotency_key__isnull', False)), fields=('user', 'idempotency_key'), name='unique_query_idempotency_key'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_conversation_memory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='query',
+            index=models.Index(fields=['user', 'timestamp', 'id'], name='queries_user_ts_id_idx'),
+        ),
+    ]
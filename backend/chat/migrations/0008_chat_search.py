@@ -0,0 +1,60 @@
+from django.db import migrations
+
+# Full-text index for chat.search; the schema depends on the database.
+
+POSTGRES_FORWARD = [
+    "ALTER TABLE queries ADD COLUMN search_vector tsvector",
+    "CREATE INDEX queries_search_vector_idx ON queries USING GIN (search_vector)",
+    """
+    UPDATE queries q SET search_vector =
+        setweight(to_tsvector('english', q.content), 'A') ||
+        setweight(to_tsvector('english', coalesce(
+            (SELECT r.response_text FROM responses r WHERE r.query_id = q.id), ''
+        )), 'B')
+    """,
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS queries_search_vector_idx",
+    "ALTER TABLE queries DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE chat_search USING fts5("
+    "question, answer, user_id UNINDEXED, tokenize='porter unicode61')",
+    """
+    INSERT INTO chat_search(rowid, question, answer, user_id)
+    SELECT q.id, q.content, coalesce(r.response_text, ''), q.user_id
+    FROM queries q LEFT JOIN responses r ON r.query_id = q.id
+    """,
+]
+SQLITE_BACKWARD = [
+    "DROP TABLE IF EXISTS chat_search",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        connection = schema_editor.connection
+        statements = statements_by_vendor.get(connection.vendor, [])
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+                if not cursor.fetchone()[0]:
+                    return   # chat.search falls back to a scan
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_query_history_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
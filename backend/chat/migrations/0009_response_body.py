@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:12
+
+import hashlib
+import zlib
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def move_texts_to_bodies(apps, schema_editor):
+    Response = apps.get_model('chat', 'Response')
+    ResponseBody = apps.get_model('chat', 'ResponseBody')
+    threshold = settings.CHAT_RESPONSE_STORE['COMPRESS_MIN_BYTES']
+    bodies = {}
+    for response in Response.objects.only('id', 'response_text').iterator(chunk_size=2000):
+        raw = response.response_text.encode()
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest not in bodies:
+            data, compressed = raw, False
+            if len(raw) >= threshold:
+                packed = zlib.compress(raw, 6)
+                if len(packed) < len(raw):
+                    data, compressed = packed, True
+            body, _ = ResponseBody.objects.get_or_create(digest=digest, defaults={
+                'data': data, 'compressed': compressed, 'size': len(raw),
+            })
+            bodies[digest] = body.pk
+        Response.objects.filter(pk=response.pk).update(body_id=bodies[digest])
+
+
+def move_bodies_to_texts(apps, schema_editor):
+    Response = apps.get_model('chat', 'Response')
+    for response in Response.objects.select_related('body').iterator(chunk_size=2000):
+        data = bytes(response.body.data)
+        text = (zlib.decompress(data) if response.body.compressed else data).decode()
+        Response.objects.filter(pk=response.pk).update(response_text=text)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_chat_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResponseBody',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('data', models.BinaryField()),
+                ('compressed', models.BooleanField(default=False)),
+                ('size', models.PositiveIntegerField(help_text='Uncompressed size in bytes.')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'response_bodies',
+            },
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='body',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='responses', to='chat.responsebody'),
+        ),
+        migrations.AlterField(
+            model_name='response',
+            name='response_text',
+            field=models.TextField(default=''),
+        ),
+        migrations.RunPython(move_texts_to_bodies, move_bodies_to_texts),
+        migrations.RemoveField(
+            model_name='response',
+            name='response_text',
+        ),
+        migrations.AlterField(
+            model_name='response',
+            name='body',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='responses', to='chat.responsebody'),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0009_response_body'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatUsageDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('model', models.CharField(blank=True, max_length=100)),
+                ('source', models.CharField(blank=True, choices=[('llm', 'LLM'), ('coalesced', 'Shared LLM call'), ('cache', 'Answer cache'), ('routed', 'Intent router'), ('fallback', 'Fallback (LLM unavailable)'), ('demo', 'Demo (no API key)')], max_length=10)),
+                ('responses', models.PositiveIntegerField(default=0)),
+                ('partial', models.PositiveIntegerField(default=0)),
+                ('prompt_tokens', models.BigIntegerField(default=0)),
+                ('completion_tokens', models.BigIntegerField(default=0)),
+                ('context_tokens', models.BigIntegerField(default=0)),
+                ('llm_calls', models.PositiveIntegerField(default=0, help_text='Responses with a measured latency.')),
+                ('latency_ms', models.BigIntegerField(default=0, help_text='Sum over llm_calls.')),
+                ('max_latency_ms', models.PositiveIntegerField(default=0)),
+                ('streamed', models.PositiveIntegerField(default=0, help_text='Responses with a measured TTFT.')),
+                ('ttft_ms', models.BigIntegerField(default=0, help_text='Sum over streamed.')),
+            ],
+            options={
+                'db_table': 'chat_usage_daily',
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='completion_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='context_tokens',
+            field=models.PositiveIntegerField(blank=True, help_text='Estimated prompt size sent to the provider.', null=True),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='latency_ms',
+            field=models.PositiveIntegerField(blank=True, help_text='Provider call duration (whole stream for streamed answers).', null=True),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='model',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='prompt_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='source',
+            field=models.CharField(blank=True, choices=[('llm', 'LLM'), ('coalesced', 'Shared LLM call'), ('cache', 'Answer cache'), ('routed', 'Intent router'), ('fallback', 'Fallback (LLM unavailable)'), ('demo', 'Demo (no API key)')], max_length=10),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='ttft_ms',
+            field=models.PositiveIntegerField(blank=True, help_text='Time to first token (streamed answers).', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['timestamp'], name='responses_timestamp_idx'),
+        ),
+        migrations.AddField(
+            model_name='chatusagedaily',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='chat_usage', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='chatusagedaily',
+            index=models.Index(fields=['day', 'model'], name='chat_usage__day_29b8e7_idx'),
+        ),
+    ]
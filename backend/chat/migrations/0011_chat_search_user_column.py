@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# SQLite only: index chat_search.user_id so a search can restrict MATCH to
+# the caller's rows instead of filtering every user's matches afterwards.
+
+REBUILD = [
+    "CREATE VIRTUAL TABLE chat_search_new USING fts5("
+    "question, answer, {user_id}, tokenize='porter unicode61')",
+    """
+    INSERT INTO chat_search_new(rowid, question, answer, user_id)
+    SELECT rowid, question, answer, user_id FROM chat_search
+    """,
+    "DROP TABLE chat_search",
+    "ALTER TABLE chat_search_new RENAME TO chat_search",
+]
+
+
+def _rebuild(user_id):
+    def run(apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor != 'sqlite':
+            return
+        if 'chat_search' not in connection.introspection.table_names():
+            return   # no FTS5: chat.search falls back to a scan
+        for sql in REBUILD:
+            schema_editor.execute(sql.format(user_id=user_id))
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_response_telemetry'),
+    ]
+
+    operations = [
+        migrations.RunPython(_rebuild('user_id'), _rebuild('user_id UNINDEXED')),
+    ]
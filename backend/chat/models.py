@@ -2,8 +2,12 @@
 Models for the Chat/AI system — Query & Response.
 """
 
+import hashlib
+import zlib
+
 from django.db import models
 from django.conf import settings
+from django.utils.functional import cached_property
 
 
 class Query(models.Model):
@@ -14,30 +18,310 @@ class Query(models.Model):
         related_name='queries',
     )
     content = models.TextField()
+    idempotency_key = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        help_text='Client-supplied Idempotency-Key header; retries replay this query.',
+    )
     timestamp = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = 'queries'
         ordering = ['-timestamp']
         verbose_name_plural = 'queries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False),
+                name='unique_query_idempotency_key',
+            ),
+        ]
+        indexes = [
+            # Keyset pagination of a user's history (chat.pagination)
+            models.Index(fields=['user', 'timestamp', 'id'], name='queries_user_ts_id_idx'),
+        ]
 
     def __str__(self):
         return f"Q: {self.content[:60]}..."
 
 
+class ResponseBodyManager(models.Manager):
+
+    def for_text(self, text):
+        """The stored body for this exact text, created on first use."""
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        body = self.filter(digest=digest).first()
+        if body is None:
+            data, compressed = ResponseBody.encode(text)
+            body, _ = self.get_or_create(digest=digest, defaults={
+                'data': data, 'compressed': compressed, 'size': len(text.encode()),
+            })
+        body.text = text
+        return body
+
+
+class ResponseBody(models.Model):
+    """
+    Deduplicated answer text, keyed by its SHA-256. Fixed replies (help,
+    greeting, fallbacks) and cached LLM answers are stored once however
+    many Response rows use them; bodies above COMPRESS_MIN_BYTES are
+    zlib-compressed.
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    data = models.BinaryField()
+    compressed = models.BooleanField(default=False)
+    size = models.PositiveIntegerField(help_text='Uncompressed size in bytes.')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ResponseBodyManager()
+
+    class Meta:
+        db_table = 'response_bodies'
+
+    def __str__(self):
+        return f"Body {self.digest[:12]} ({self.size} B)"
+
+    @staticmethod
+    def encode(text):
+        raw = text.encode()
+        if len(raw) >= settings.CHAT_RESPONSE_STORE['COMPRESS_MIN_BYTES']:
+            packed = zlib.compress(raw, 6)
+            if len(packed) < len(raw):
+                return packed, True
+        return raw, False
+
+    @staticmethod
+    def decode(data, compressed):
+        data = bytes(data)
+        return (zlib.decompress(data) if compressed else data).decode()
+
+    @cached_property
+    def text(self):
+        return self.decode(self.data, self.compressed)
+
+
+def with_answers(rows):
+    """
+    Decode answer bodies in values() rows selected with `answer_data` and
+    `answer_compressed` (see ResponseBody), replacing them with `answer`.
+    """
+    for row in rows:
+        data = row.pop('answer_data')
+        compressed = row.pop('answer_compressed')
+        row['answer'] = None if data is None else ResponseBody.decode(data, compressed)
+        yield row
+
+
 class Response(models.Model):
-    """The AI-generated response to a Query."""
+    """
+    The AI-generated response to a Query, with the telemetry of how it was
+    produced (see chat.telemetry). LLM fields stay empty for answers that
+    did not call the provider.
+    """
+
+    class Source(models.TextChoices):
+        LLM = 'llm', 'LLM'
+        COALESCED = 'coalesced', 'Shared LLM call'
+        CACHE = 'cache', 'Answer cache'
+        ROUTED = 'routed', 'Intent router'
+        FALLBACK = 'fallback', 'Fallback (LLM unavailable)'
+        DEMO = 'demo', 'Demo (no API key)'
+
     query = models.OneToOneField(
         Query,
         on_delete=models.CASCADE,
         related_name='response',
     )
-    response_text = models.TextField()
+    body = models.ForeignKey(
+        ResponseBody,
+        on_delete=models.PROTECT,
+        related_name='responses',
+    )
+    is_partial = models.BooleanField(
+        default=False,
+        help_text='Set when a streamed answer was cut off by a client disconnect or an LLM failure.',
+    )
+    source = models.CharField(max_length=10, choices=Source.choices, blank=True)
+    model = models.CharField(max_length=100, blank=True)
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
+    latency_ms = models.PositiveIntegerField(
+        null=True, blank=True, help_text='Provider call duration (whole stream for streamed answers).',
+    )
+    ttft_ms = models.PositiveIntegerField(
+        null=True, blank=True, help_text='Time to first token (streamed answers).',
+    )
+    context_tokens = models.PositiveIntegerField(
+        null=True, blank=True, help_text='Estimated prompt size sent to the provider.',
+    )
     timestamp = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = 'responses'
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp'], name='responses_timestamp_idx'),
+        ]
 
     def __str__(self):
         return f"A: {self.response_text[:60]}..."
+
+    _pending_text = None
+
+    @property
+    def response_text(self):
+        """The answer text, read from (and written through) the body store."""
+        if self._pending_text is not None:
+            return self._pending_text
+        return self.body.text if self.body_id else ''
+
+    @response_text.setter
+    def response_text(self, value):
+        self._pending_text = value
+
+    def save(self, *args, **kwargs):
+        if self._pending_text is not None:
+            self.body = ResponseBody.objects.for_text(self._pending_text)
+            self._pending_text = None
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'response_text' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'body'} - {'response_text'}
+        super().save(*args, **kwargs)
+
+
+class CourseChunk(models.Model):
+    """
+    A retrievable chunk of course material (syllabus, description or
+    assignment text) with its pre-tokenized BM25 term counts. Maintained
+    incrementally by chat.indexing: only chunks whose hash changed are
+    re-processed.
+    """
+    course = models.ForeignKey(
+        'courses.Course',
+        on_delete=models.CASCADE,
+        related_name='chunks',
+    )
+    assignment = models.ForeignKey(
+        'courses.Assignment',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='chunks',
+    )
+    kind = models.CharField(max_length=20)
+    position = models.PositiveIntegerField()
+    text = models.TextField()
+    content_hash = models.CharField(max_length=64)
+    terms = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'course_chunks'
+        ordering = ['course', 'position']
+        indexes = [
+            models.Index(fields=['course', 'content_hash']),
+        ]
+
+    def __str__(self):
+        return f"{self.course_id}:{self.kind}#{self.position}"
+
+
+class ChatJob(models.Model):
+    """
+    Database-backed queue entry for a chat answer generated off the request
+    path (job mode). Workers claim pending rows with a conditional UPDATE,
+    so no external broker is needed.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    query = models.OneToOneField(
+        Query,
+        on_delete=models.CASCADE,
+        related_name='job',
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=64, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'chat_jobs'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Job {self.query_id} ({self.status})"
+
+
+class ConversationMemory(models.Model):
+    """
+    Per-user rolling summary of chat turns that have left the verbatim
+    window. Folded forward when a follow-up question loads memory;
+    `summarized_through` is the last Query id already in the summary.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='chat_memory',
+    )
+    summary = models.TextField(blank=True)
+    summarized_through = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'conversation_memories'
+
+    def __str__(self):
+        return f"Memory for user {self.user_id}"
+
+
+class ChatUsageDaily(models.Model):
+    """
+    Daily rollup of responses per user, model and source, rebuilt by
+    `manage.py rollup_chat_usage`. Cost and capacity reports read these rows
+    instead of the raw chat tables (which retention eventually purges).
+    """
+    day = models.DateField()
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='chat_usage',
+    )
+    model = models.CharField(max_length=100, blank=True)
+    source = models.CharField(max_length=10, choices=Response.Source.choices, blank=True)
+    responses = models.PositiveIntegerField(default=0)
+    partial = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.BigIntegerField(default=0)
+    completion_tokens = models.BigIntegerField(default=0)
+    context_tokens = models.BigIntegerField(default=0)
+    llm_calls = models.PositiveIntegerField(default=0, help_text='Responses with a measured latency.')
+    latency_ms = models.BigIntegerField(default=0, help_text='Sum over llm_calls.')
+    max_latency_ms = models.PositiveIntegerField(default=0)
+    streamed = models.PositiveIntegerField(default=0, help_text='Responses with a measured TTFT.')
+    ttft_ms = models.BigIntegerField(default=0, help_text='Sum over streamed.')
+
+    class Meta:
+        db_table = 'chat_usage_daily'
+        ordering = ['-day']
+        indexes = [
+            models.Index(fields=['day', 'model']),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.user_id} {self.model or self.source}: {self.responses}"
@@ -0,0 +1,167 @@
+"""
+Pagination for chat history and history search.
+
+History pages are addressed by an opaque cursor encoding a (timestamp, id)
+position instead of an offset, so every page — and every `since=` delta
+sync — is one index range scan on (user, timestamp, id), whatever the
+history length.
+"""
+
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .jobs import in_flight
+
+
+def encode_cursor(timestamp, pk):
+    raw = f'{timestamp.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise NotFound('Invalid cursor.')
+
+
+class ChatHistoryPagination(BasePagination):
+    """
+    ?before=<cursor>  older turns (default: the newest page)
+    ?since=<cursor>   turns after the cursor, for delta sync
+    ?limit=N          page size
+
+    Results are always in chat order (oldest first). `cursor` marks the end
+    of the settled turns in the page: pass it as `since` to fetch only what
+    is new, including turns whose answer is still in flight. Failed or
+    abandoned turns do not hold the cursor back. Rows need `job` and
+    `response` selected.
+    """
+    page_size = 50
+    max_page_size = 200
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.page_size))
+        except ValueError:
+            limit = self.page_size
+        return max(1, min(limit, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        limit = self.get_limit(request)
+        since = request.query_params.get('since')
+        before = request.query_params.get('before')
+
+        if since:
+            timestamp, pk = decode_cursor(since)
+            rows = list(queryset.filter(
+                Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk)
+            ).order_by('timestamp', 'id')[:limit + 1])
+            self.has_newer = len(rows) > limit
+            rows = rows[:limit]
+            self.has_older = True
+            self.start = (timestamp, pk)
+        else:
+            if before:
+                timestamp, pk = decode_cursor(before)
+                queryset = queryset.filter(
+                    Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk)
+                )
+            rows = list(queryset.order_by('-timestamp', '-id')[:limit + 1])
+            self.has_older = len(rows) > limit
+            rows = rows[:limit][::-1]
+            self.has_newer = bool(before)
+            self.start = None
+        self.rows = rows
+        return rows
+
+    def sync_cursor(self):
+        """Position just before the first turn in flight (or after the last)."""
+        position = self.start
+        now = timezone.now()
+        for row in self.rows:
+            if getattr(row, 'response', None) is None and in_flight(row, now):
+                # (timestamp, id - 1) resumes at this row, inclusive
+                return encode_cursor(row.timestamp, row.id - 1)
+            position = (row.timestamp, row.id)
+        return encode_cursor(*position) if position else None
+
+    def get_paginated_response(self, data):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(remove_query_param(url, 'since'), 'before')
+        previous = next_url = None
+        if self.rows and self.has_older:
+            first = self.rows[0]
+            previous = replace_query_param(url, 'before', encode_cursor(first.timestamp, first.id))
+        if self.rows and self.has_newer:
+            last = self.rows[-1]
+            next_url = replace_query_param(url, 'since', encode_cursor(last.timestamp, last.id))
+        return Response({
+            'previous': previous,
+            'next': next_url,
+            'cursor': self.sync_cursor(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'cursor': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class SearchPagination(BasePagination):
+    """
+    ?page=N&page_size=M over ranked search results. Fetches one extra hit to
+    know whether there is a next page instead of counting all matches.
+    """
+    page_size = 20
+    max_page_size = 50
+
+    def _int_param(self, request, name, default):
+        try:
+            return max(1, int(request.query_params.get(name, default)))
+        except ValueError:
+            return default
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page = self._int_param(request, 'page', 1)
+        size = min(self._int_param(request, 'page_size', self.page_size), self.max_page_size)
+        start = (self.page - 1) * size
+        hits = queryset[start:start + size + 1]
+        self.has_next = len(hits) > size
+        return hits[:size]
+
+    def get_paginated_response(self, data):
+        url = self.request.build_absolute_uri()
+        return Response({
+            'previous': replace_query_param(url, 'page', self.page - 1) if self.page > 1 else None,
+            'next': replace_query_param(url, 'page', self.page + 1) if self.has_next else None,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,203 @@
+"""
+Token-budget-aware prompt assembly.
+
+Sections are admitted in priority order (system prompt and question first,
+then courses the question mentions, upcoming assignments, other relevant
+material, and the course roster) until the configured budget is spent.
+Sections that do not fit whole are truncated at a line boundary or dropped,
+and the assembler reports how many tokens were left out.
+"""
+
+import re
+from collections import namedtuple
+
+from django.utils import timezone
+
+# Rough BPE behaviour: short words are one token, long words ~4 chars/token,
+# punctuation and symbols are one token each.
+_PIECE_RE = re.compile(r'\w+|[^\w\s]', re.UNICODE)
+
+# Per-message framing overhead of the chat completions format
+MESSAGE_OVERHEAD = 4
+
+# Sections are not worth truncating below this many tokens
+MIN_TRUNCATED_TOKENS = 24
+
+TRUNCATION_MARK = ' …[truncated]'
+
+# Section priorities (lower is more important)
+PRIORITY_MENTIONED = 10
+PRIORITY_UPCOMING = 20
+PRIORITY_RELEVANT = 30
+PRIORITY_ROSTER = 40
+
+Prompt = namedtuple('Prompt', ['messages', 'report'])
+PromptReport = namedtuple(
+    'PromptReport', ['budget', 'used_tokens', 'dropped_tokens', 'dropped', 'truncated'],
+)
+
+
+def estimate_tokens(text):
+    """Fast local token estimate, within ~10-15% of tiktoken for English."""
+    count = 0
+    for piece in _PIECE_RE.findall(text):
+        count += (len(piece) + 3) // 4 if len(piece) > 4 else 1
+    return count
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Keep whole lines of text while they fit in max_tokens."""
+    budget = max_tokens - estimate_tokens(TRUNCATION_MARK)
+    kept, used = [], 0
+    for line in text.splitlines():
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            if not kept:
+                # A single long line: cut by characters
+                kept.append(line[:max(budget, 0) * 4])
+            break
+        kept.append(line)
+        used += cost
+    return '\n'.join(kept) + TRUNCATION_MARK
+
+
+class PromptAssembler:
+    """Collects prompt sections and fits them into a token budget."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self._sections = []
+
+    def add(self, name, text, priority, required=False):
+        if text:
+            self._sections.append((name, text, priority, required))
+
+    def assemble(self):
+        """Return (included texts in insertion order, PromptReport)."""
+        order = sorted(
+            range(len(self._sections)),
+            key=lambda i: (not self._sections[i][3], self._sections[i][2]),
+        )
+        included = {}
+        used = dropped_tokens = 0
+        dropped, truncated = [], []
+        for i in order:
+            name, text, _, required = self._sections[i]
+            cost = estimate_tokens(text)
+            remaining = self.budget - used
+            if required or cost <= remaining:
+                included[i] = text
+                used += cost
+            elif remaining >= MIN_TRUNCATED_TOKENS:
+                text = truncate_to_tokens(text, remaining)
+                included[i] = text
+                kept = estimate_tokens(text)
+                used += kept
+                dropped_tokens += max(cost - kept, 0)
+                truncated.append(name)
+            else:
+                dropped_tokens += cost
+                dropped.append(name)
+        texts = [included[i] for i in sorted(included)]
+        report = PromptReport(self.budget, used, dropped_tokens, dropped, truncated)
+        return texts, report
+
+
+def _memory_messages(memory):
+    if memory is None:
+        return []
+    messages = []
+    if memory.summary:
+        messages.append({"role": "system", "content": f"Earlier in this conversation:\n{memory.summary}"})
+    for question, answer in memory.turns:
+        messages.append({"role": "user", "content": question})
+        messages.append({"role": "assistant", "content": answer})
+    return messages
+
+
+def _messages(system_prompt, context, user_message, memory=None):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": f"Course Context:\n{context}"},
+        *_memory_messages(memory),
+        {"role": "user", "content": user_message},
+    ]
+
+
+def _fixed_cost(system_prompt, user_message, memory=None):
+    history = _memory_messages(memory)
+    return (
+        estimate_tokens(system_prompt) + estimate_tokens(user_message)
+        + estimate_tokens("Course Context:") + 3 * MESSAGE_OVERHEAD
+        + sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD for m in history)
+    )
+
+
+def assemble_text_prompt(system_prompt, user_message, context, budget, memory=None):
+    """Fit a pre-rendered context (build_context output) into the budget."""
+    assembler = PromptAssembler(budget - _fixed_cost(system_prompt, user_message, memory))
+    assembler.add('context', context, PRIORITY_RELEVANT)
+    texts, report = assembler.assemble()
+    report = report._replace(
+        budget=budget, used_tokens=report.used_tokens + budget - assembler.budget,
+    )
+    return Prompt(_messages(system_prompt, '\n'.join(texts), user_message, memory), report)
+
+
+def assemble_prompt(system_prompt, user_message, index, budget, top_k=6, memory=None):
+    """
+    Build the messages for one completion from a student's retrieval index
+    (chat.retrieval.BM25Index), prioritising what the question is about.
+    With conversation memory (chat.memory.Memory), the previous question
+    also steers retrieval, so follow-ups find the course being discussed.
+    """
+    if not index.courses:
+        return assemble_text_prompt(
+            system_prompt, user_message,
+            "The student is not currently enrolled in any courses.", budget, memory,
+        )
+
+    search_text = user_message
+    if memory is not None and memory.turns:
+        search_text = f"{memory.turns[-1][0]} {user_message}"
+
+    assembler = PromptAssembler(budget - _fixed_cost(system_prompt, user_message, memory))
+    assembler.add(
+        'roster',
+        "=== Student's Enrolled Courses ===\n" + '\n'.join(index.roster),
+        PRIORITY_ROSTER,
+    )
+    mentioned = index.mentioned_courses(user_message) or index.mentioned_courses(search_text)
+
+    hits = [chunk for _, chunk in index.search(search_text, top_k)]
+    if mentioned:
+        # Everything the index holds for the mentioned courses ranks first
+        for code in mentioned:
+            material = [
+                f"[{c.course_code} · {c.kind}] {c.text}"
+                for c in index.chunks_for(code)
+            ]
+            assembler.add(f'course:{code}', '\n'.join(material), PRIORITY_MENTIONED)
+        hits = [c for c in hits if c.course_code not in mentioned]
+
+    now = timezone.now()
+    upcoming = [
+        f"- {code}: {title} (Due: {due.strftime('%Y-%m-%d %H:%M')})"
+        for due, code, title in index.deadlines if due >= now
+    ]
+    if upcoming:
+        assembler.add(
+            'upcoming', "Upcoming assignments:\n" + '\n'.join(upcoming), PRIORITY_UPCOMING,
+        )
+
+    for rank, chunk in enumerate(hits):
+        assembler.add(
+            f'chunk:{rank}', f"[{chunk.course_code} · {chunk.kind}] {chunk.text}",
+            PRIORITY_RELEVANT + rank,
+        )
+
+    texts, report = assembler.assemble()
+    report = report._replace(
+        budget=budget, used_tokens=report.used_tokens + budget - assembler.budget,
+    )
+    return Prompt(_messages(system_prompt, '\n\n'.join(texts), user_message, memory), report)
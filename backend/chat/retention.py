@@ -0,0 +1,145 @@
+"""
+Retention for the queries/responses tables.
+
+Chats older than the retention horizon are written to a compressed JSONL
+archive and deleted in small keyset batches (ascending id), each in its own
+short transaction, so locks and WAL bursts stay small. A state file next to
+the archive records the last id archived; a run that stops between
+archiving and deleting a batch resumes by deleting those rows without
+archiving them twice.
+"""
+
+import gzip
+import json
+import os
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from unibot_backend.export import ndjson_lines
+
+from .models import ChatJob, Query, Response, ResponseBody, with_answers
+from .search import remove_queries
+
+BatchStats = namedtuple('BatchStats', ['first_id', 'last_id', 'archived', 'deleted', 'bytes', 'seconds'])
+
+ARCHIVE_FIELDS = dict(
+    query_id=F('id'),
+    username=F('user__username'),
+    question=F('content'),
+    asked_at=F('timestamp'),
+    answer_data=F('response__body__data'),
+    answer_compressed=F('response__body__compressed'),
+    is_partial=F('response__is_partial'),
+    answered_at=F('response__timestamp'),
+)
+
+
+class Archive:
+    """
+    Append-only gzip JSONL files, one per month of archiving (each batch is
+    its own gzip member), plus the resume state shared by all of them.
+    """
+
+    def __init__(self, directory, name='chat-history'):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / f"{name}-{timezone.now():%Y-%m}.jsonl.gz"
+        self.state_path = self.directory / f'{name}.state.json'
+
+    @property
+    def archived_through(self):
+        try:
+            return json.loads(self.state_path.read_text())['archived_through']
+        except (FileNotFoundError, ValueError, KeyError):
+            return 0
+
+    def append(self, rows, last_id):
+        """Durably append rows, then record last_id as archived."""
+        data = ''.join(ndjson_lines(rows)).encode()
+        with open(self.path, 'ab') as f:
+            f.write(gzip.compress(data))
+            f.flush()
+            os.fsync(f.fileno())
+        tmp = self.state_path.with_suffix('.tmp')
+        tmp.write_text(json.dumps({'archived_through': last_id}))
+        os.replace(tmp, self.state_path)
+        return len(data)
+
+
+# Ids per IN (...) list, under SQLite's default limit on bound variables
+IN_LIST_SIZE = 500
+
+
+def _delete(ids):
+    """Delete a batch of queries and their dependants in one transaction."""
+    deleted = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(ids), IN_LIST_SIZE):
+            deleted += _delete_chunk(cursor, ids[start:start + IN_LIST_SIZE])
+    return deleted
+
+
+def _delete_chunk(cursor, ids):
+    placeholders = ', '.join(['%s'] * len(ids))
+    bodies, responses = ResponseBody._meta.db_table, Response._meta.db_table
+    cursor.execute(
+        f'SELECT DISTINCT body_id FROM {responses} WHERE query_id IN ({placeholders})', ids,
+    )
+    body_ids = [row[0] for row in cursor.fetchall()]
+    # Plain DELETEs: the ORM would load every row to send signals
+    for model in (ChatJob, Response):
+        cursor.execute(
+            f'DELETE FROM {model._meta.db_table} WHERE query_id IN ({placeholders})', ids,
+        )
+    cursor.execute(
+        f'DELETE FROM {Query._meta.db_table} WHERE id IN ({placeholders})', ids,
+    )
+    deleted = cursor.rowcount
+    if body_ids:
+        # Bodies are shared between responses: drop only the new orphans
+        cursor.execute(
+            f'DELETE FROM {bodies} WHERE id IN ({", ".join(["%s"] * len(body_ids))}) '
+            f'AND NOT EXISTS (SELECT 1 FROM {responses} r WHERE r.body_id = {bodies}.id)',
+            body_ids,
+        )
+    remove_queries(ids)
+    return deleted
+
+
+def purge(cutoff, archive=None, batch_size=500, pause=0.0, max_seconds=None):
+    """
+    Archive (when `archive` is given) and delete queries older than cutoff.
+    Yields BatchStats per batch; stops early after max_seconds.
+    """
+    started = time.monotonic()
+    archived_through = archive.archived_through if archive else 0
+    last_id = 0
+    old = Query.objects.filter(timestamp__lt=cutoff).order_by('id')
+    while True:
+        batch_started = time.monotonic()
+        ids = list(old.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return
+        last_id = ids[-1]
+        to_archive = [pk for pk in ids if pk > archived_through]
+        written = 0
+        if archive and to_archive:
+            # The batch's id range, not an IN list of every id
+            rows = old.filter(id__gte=to_archive[0], id__lte=to_archive[-1]).values(
+                'user_id', **ARCHIVE_FIELDS,
+            )
+            written = archive.append(with_answers(rows), to_archive[-1])
+        deleted = _delete(ids)
+        yield BatchStats(
+            ids[0], last_id, len(to_archive) if archive else 0, deleted, written,
+            time.monotonic() - batch_started,
+        )
+        if max_seconds is not None and time.monotonic() - started >= max_seconds:
+            return
+        if pause:
+            time.sleep(pause)
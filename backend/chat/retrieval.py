@@ -0,0 +1,185 @@
+"""
+Local BM25 retrieval over a student's course material.
+
+Course descriptions, syllabi and assignments are split into small chunks and
+indexed per student, so the prompt only carries the chunks relevant to the
+question instead of every syllabus in full. Chunk term counts are persisted
+by chat.indexing, so building a student's index is mostly a lookup.
+"""
+
+import hashlib
+import math
+import re
+import zlib
+from collections import Counter, namedtuple
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Most recent assignments per course that reach the context and the index
+CONTEXT_ASSIGNMENTS_PER_COURSE = 5
+
+# Upper bound on chunk size; boundaries are otherwise content-defined
+CHUNK_CHARS = 400
+# A line ends a chunk when its hash is divisible by this (~4 lines per chunk)
+CHUNK_BOUNDARY_MODULUS = 4
+
+STOPWORDS = frozenset({
+    'a', 'an', 'the', 'is', 'are', 'of', 'for', 'to', 'in', 'on', 'at', 'and',
+    'or', 'my', 'me', 'i', 'what', 'when', 'which', 'do', 'does', 'about',
+    'can', 'you', 'please', 'tell', 'show', 'with', 'it', 'this', 'that',
+})
+
+Chunk = namedtuple(
+    'Chunk', ['course_code', 'kind', 'text', 'assignment_id'], defaults=[None],
+)
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def chunk_terms(chunk):
+    """Term frequencies BM25 indexes for a chunk."""
+    return Counter(tokenize(f'{chunk.course_code} {chunk.kind} {chunk.text}'))
+
+
+def split_text(text, max_chars=CHUNK_CHARS):
+    """
+    Group non-empty lines into chunks with content-defined boundaries: a chunk
+    ends after a line whose hash hits the boundary modulus (or at max_chars).
+    Editing one line therefore only changes the chunk containing it, instead
+    of shifting every boundary after it.
+    """
+    chunks, current = [], ''
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if current and len(current) + len(line) + 1 > max_chars:
+            chunks.append(current)
+            current = ''
+        current = f'{current}\n{line}' if current else line
+        if zlib.crc32(line.encode()) % CHUNK_BOUNDARY_MODULUS == 0:
+            chunks.append(current)
+            current = ''
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_course(course, assignments):
+    """Split one course (and its assignments) into retrievable chunks."""
+    faculty_name = course.faculty.get_full_name() if course.faculty else 'TBA'
+    chunks = [Chunk(
+        course.code, 'overview',
+        f'{course.name}. Department: {course.department}. '
+        f'Faculty: {faculty_name}. {course.description}',
+    )]
+    for text in split_text(course.syllabus):
+        chunks.append(Chunk(course.code, 'syllabus', text))
+    for a in assignments:
+        due = a.due_date.strftime('%Y-%m-%d %H:%M') if a.due_date else 'No due date'
+        for text in split_text(a.content) or ['']:
+            chunks.append(Chunk(
+                course.code, 'assignment',
+                f'{a.title} (Due: {due}). {text}', a.pk,
+            ))
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over a small, immutable list of chunks."""
+
+    def __init__(self, chunks, roster=(), term_freqs=None, courses=(),
+                 deadlines=(), k1=1.5, b=0.75):
+        self.chunks = list(chunks)
+        self.roster = list(roster)
+        self.courses = list(courses)            # (code, name)
+        self.deadlines = sorted(deadlines)      # (due_date, code, title)
+        self.k1 = k1
+        self.b = b
+        if term_freqs is None:
+            term_freqs = [chunk_terms(chunk) for chunk in self.chunks]
+        self._term_freqs = []
+        self._lengths = []
+        doc_freq = Counter()
+        for terms in term_freqs:
+            self._term_freqs.append(terms)
+            self._lengths.append(sum(terms.values()))
+            doc_freq.update(terms.keys())
+        n = len(self.chunks)
+        self._avg_length = (sum(self._lengths) / n) if n else 0.0
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+        self.fingerprint = hashlib.sha256(
+            '\x1e'.join(
+                [*self.roster, *(f'{c.course_code}\x1f{c.kind}\x1f{c.text}' for c in self.chunks)]
+            ).encode()
+        ).hexdigest()
+
+    def search(self, query, k=6):
+        """Return up to k (score, chunk) pairs with a positive score."""
+        terms = set(tokenize(query)) & self._idf.keys()
+        if not terms:
+            return []
+        scored = []
+        for i, freqs in enumerate(self._term_freqs):
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / self._avg_length)
+            score = 0.0
+            for term in terms:
+                tf = freqs.get(term)
+                if tf:
+                    score += self._idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            if score > 0:
+                scored.append((score, i))
+        scored.sort(reverse=True)
+        return [(score, self.chunks[i]) for score, i in scored[:k]]
+
+    def mentioned_courses(self, query):
+        """Codes of enrolled courses named in the query (by code or name)."""
+        squashed = re.sub(r'[^a-z0-9]', '', query.lower())
+        lowered = query.lower()
+        return [
+            code for code, name in self.courses
+            if re.sub(r'[^a-z0-9]', '', code.lower()) in squashed
+            or name.lower() in lowered
+        ]
+
+    def chunks_for(self, course_code):
+        return [c for c in self.chunks if c.course_code == course_code]
+
+
+def build_index(enrollments, stored_chunks=None):
+    """
+    BM25 index over the courses in context_enrollments() results.
+
+    stored_chunks maps course id -> persisted CourseChunk rows; courses that
+    have not been indexed yet are chunked on the fly from their prefetched
+    recent assignments.
+    """
+    stored_chunks = stored_chunks or {}
+    chunks, term_freqs, roster, courses, deadlines = [], [], [], [], []
+    for enrollment in enrollments:
+        course = enrollment.course
+        faculty_name = course.faculty.get_full_name() if course.faculty else 'TBA'
+        roster.append(f"📚 {course.code} — {course.name} (Faculty: {faculty_name})")
+        courses.append((course.code, course.name))
+        deadlines.extend(
+            (a.due_date, course.code, a.title)
+            for a in course.recent_assignments if a.due_date
+        )
+        rows = stored_chunks.get(course.pk)
+        if rows:
+            for row in rows:
+                chunks.append(Chunk(course.code, row.kind, row.text, row.assignment_id))
+                term_freqs.append(row.terms)
+        else:
+            for chunk in chunk_course(course, course.recent_assignments):
+                chunks.append(chunk)
+                term_freqs.append(chunk_terms(chunk))
+    return BM25Index(
+        chunks, roster=roster, term_freqs=term_freqs,
+        courses=courses, deadlines=deadlines,
+    )
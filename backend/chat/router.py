@@ -0,0 +1,297 @@
+"""
+Deterministic intent router.
+
+Structured questions ("what courses am I enrolled in", "show CS101
+syllabus", "assignments due?") have exact answers in the database. The
+router runs before the LLM on every request: a single precompiled pattern
+detects intents, course codes and names are resolved through a dictionary
+and token trie built from all Course rows, and high-confidence intents are
+answered directly. The same machinery drives the no-API-key fallback.
+"""
+
+import re
+import threading
+import time
+from collections import namedtuple
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from courses.models import Assignment, Course, Enrollment
+
+RoutedAnswer = namedtuple('RoutedAnswer', ['intent', 'text'])
+
+# Checked in this order by the fallback responder
+INTENT_PATTERNS = {
+    'courses': r'courses?|enrolled|classes|subjects',
+    'syllabus': r'syllabus|syllabi|curriculum|topics',
+    'assignments': r'assignments?|homework|due|deadlines?',
+    'greeting': r'hello|hi|hey|good',
+    'help': r'help|what\s+can\s+you\s+do|features',
+}
+
+_INTENT_RE = re.compile(
+    '|'.join(f'(?P<{name}>\\b(?:{pattern})\\b)' for name, pattern in INTENT_PATTERNS.items()),
+    re.IGNORECASE,
+)
+
+# Questions asking for explanation or advice always go to the LLM
+_OPEN_ENDED_RE = re.compile(
+    r'\b(?:why|how|explain|understand|difference|example|compare|should|could|would)\b',
+    re.IGNORECASE,
+)
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Direct answers are only given to short, unambiguous messages
+MAX_ROUTED_WORDS = 12
+MAX_GREETING_WORDS = 4
+
+# A deadline question is routed only if, besides course mentions, it has
+# no words outside this list ("what's due for CS101?", "my deadlines");
+# "what happens if I miss a deadline?" goes to the LLM
+DEADLINE_QUESTION_WORDS = frozenset({
+    'what', 'whats', 's', 'which', 'when', 'any', 'are', 'is', 'there', 'do',
+    'i', 'have', 'my', 'me', 'show', 'list', 'tell', 'please', 'all', 'the',
+    'a', 'for', 'in', 'of', 'this', 'next', 'week', 'upcoming', 'pending',
+    'coming', 'up', 'soon', 'due', 'deadline', 'deadlines', 'assignment',
+    'assignments', 'homework', 'course', 'courses',
+})
+
+# Rebuild the course matcher at least this often (edits in other processes)
+MATCHER_TTL = 300
+
+
+def detect_intents(message):
+    """Set of intent names the message matches, in one regex pass."""
+    return {m.lastgroup for m in _INTENT_RE.finditer(message)}
+
+
+def _squash(text):
+    return ''.join(_TOKEN_RE.findall(text.lower()))
+
+
+class CourseMatcher:
+    """
+    Resolves course mentions in free text. Codes are looked up in a dict
+    (also across two adjacent tokens, so "cs 101" finds CS101); names are
+    matched longest-first through a token trie.
+    """
+    _END = object()
+
+    def __init__(self, courses):
+        self.codes = {}
+        self.trie = {}
+        for course_id, code, name in courses:
+            self.codes[_squash(code)] = course_id
+            node = self.trie
+            for token in _TOKEN_RE.findall(name.lower()):
+                node = node.setdefault(token, {})
+            node[self._END] = course_id
+
+    def find(self, message):
+        """Ids of the courses mentioned in the message."""
+        return {course_id for course_id, _, _ in self.mentions(_TOKEN_RE.findall(message.lower()))}
+
+    def mentions(self, tokens):
+        """(course id, start, stop) token spans of the course mentions."""
+        for i, token in enumerate(tokens):
+            if token in self.codes:
+                yield self.codes[token], i, i + 1
+            elif i + 1 < len(tokens) and token + tokens[i + 1] in self.codes:
+                yield self.codes[token + tokens[i + 1]], i, i + 2
+            node, match = self.trie, None
+            for stop, following in enumerate(tokens[i:], i + 1):
+                node = node.get(following)
+                if node is None:
+                    break
+                if self._END in node:
+                    match = node[self._END], i, stop
+            if match is not None:
+                yield match
+
+
+_matcher = None
+_matcher_built_at = 0.0
+_matcher_generation = 0
+_matcher_lock = threading.Lock()
+
+
+def get_course_matcher():
+    global _matcher, _matcher_built_at
+    with _matcher_lock:
+        matcher, built_at, generation = _matcher, _matcher_built_at, _matcher_generation
+    if matcher is not None and time.monotonic() - built_at <= MATCHER_TTL:
+        return matcher
+    # Built outside the lock so lookups are not held up by the query
+    matcher = CourseMatcher(Course.objects.values_list('id', 'code', 'name'))
+    with _matcher_lock:
+        if _matcher_generation == generation:
+            # (a reset while we built means our rows may predate the edit)
+            _matcher, _matcher_built_at = matcher, time.monotonic()
+    return matcher
+
+
+def reset_course_matcher():
+    """Drop the matcher so the next lookup rebuilds it (course edits)."""
+    global _matcher, _matcher_generation
+    with _matcher_lock:
+        _matcher = None
+        _matcher_generation += 1
+
+
+# ─── Answers ─────────────────────────────────────────────────────
+
+def _enrollments(user):
+    return list(Enrollment.objects.filter(student=user).select_related('course'))
+
+
+def answer_courses(enrollments):
+    if enrollments:
+        course_list = "\n".join(
+            f"📚 **{e.course.code}** — {e.course.name}"
+            for e in enrollments
+        )
+        return (
+            f"Here are your enrolled courses:\n\n{course_list}\n\n"
+            f"Would you like to know more about any specific course?"
+        )
+    return "You don't seem to be enrolled in any courses yet. Please contact your department for enrollment."
+
+
+def answer_syllabus(course):
+    return (
+        f"📋 **Syllabus for {course.code} — {course.name}:**\n\n"
+        f"{course.syllabus or 'Syllabus not yet uploaded by faculty.'}"
+    )
+
+
+def answer_assignments(user, course_ids=None):
+    assignments = Assignment.objects.filter(
+        Q(due_date__gte=timezone.now()) | Q(due_date__isnull=True),
+        course__enrollments__student=user,
+    )
+    if course_ids:
+        assignments = assignments.filter(course_id__in=course_ids)
+    assignments = assignments.select_related('course').order_by(
+        F('due_date').asc(nulls_last=True)
+    )[:5]
+    if assignments:
+        assignment_list = "\n".join(
+            f"📝 **{a.title}** ({a.course.code}) — Due: {a.due_date.strftime('%b %d, %Y') if a.due_date else 'TBA'}"
+            for a in assignments
+        )
+        return f"Here are your upcoming assignments:\n\n{assignment_list}"
+    return "No assignments found for your enrolled courses."
+
+
+def answer_greeting(user):
+    name = user.first_name or user.username
+    return (
+        f"Hey {name}! 👋 I'm UNIBOT, your university assistant.\n\n"
+        f"I can help you with:\n"
+        f"• 📚 Course information & syllabi\n"
+        f"• 📝 Assignment deadlines\n"
+        f"• 🗓️ Schedules & procedures\n\n"
+        f"What would you like to know?"
+    )
+
+
+def answer_help():
+    return (
+        "I'm **UNIBOT** — your 24/7 university assistant! Here's what I can do:\n\n"
+        "1. 📚 **Course Info** — Ask about your enrolled courses\n"
+        "2. 📋 **Syllabi** — View course syllabi updated by faculty\n"
+        "3. 📝 **Assignments** — Check upcoming deadlines\n"
+        "4. 🏫 **Campus Info** — Administrative procedures\n\n"
+        "Try asking: *\"What courses am I enrolled in?\"* or *\"Show me the syllabus for CS101\"*"
+    )
+
+
+GENERIC_ANSWER = (
+    "I'd be happy to help! You can ask me about:\n"
+    "• Your enrolled courses\n"
+    "• Course syllabi and content\n"
+    "• Assignment deadlines\n"
+    "• Campus procedures\n\n"
+    "Try being more specific, and I'll give you a detailed answer! 😊"
+)
+
+
+# ─── Routing ─────────────────────────────────────────────────────
+
+def route(message, user):
+    """
+    Answer a structured question straight from the database, or return
+    None when the message should go to the LLM.
+    """
+    if _OPEN_ENDED_RE.search(message):
+        return None
+    words = len(message.split())
+    if words > MAX_ROUTED_WORDS:
+        return None
+
+    intents = detect_intents(message)
+    if len(intents) > 1:
+        intents.discard('greeting')
+    if not intents:
+        return None
+
+    tokens = _TOKEN_RE.findall(message.lower())
+    spans = []
+    if intents & {'syllabus', 'assignments', 'courses'}:
+        spans = list(get_course_matcher().mentions(tokens))
+    mentioned = {course_id for course_id, _, _ in spans}
+
+    if 'syllabus' in intents and not intents & {'assignments'}:
+        enrolled = [e.course for e in _enrollments(user) if e.course_id in mentioned]
+        if len(enrolled) == 1:
+            return RoutedAnswer('syllabus', answer_syllabus(enrolled[0]))
+        return None
+
+    if 'assignments' in intents and not intents & {'syllabus', 'help'}:
+        in_course = {i for _, start, stop in spans for i in range(start, stop)}
+        other = [t for i, t in enumerate(tokens) if i not in in_course]
+        if all(t in DEADLINE_QUESTION_WORDS for t in other):
+            return RoutedAnswer('assignments', answer_assignments(user, mentioned))
+        return None
+
+    if intents == {'courses'} and not mentioned:
+        return RoutedAnswer('courses', answer_courses(_enrollments(user)))
+
+    if intents == {'greeting'} and words <= MAX_GREETING_WORDS:
+        return RoutedAnswer('greeting', answer_greeting(user))
+
+    if intents == {'help'}:
+        return RoutedAnswer('help', answer_help())
+
+    return None
+
+
+def fallback_answer(message, user):
+    """
+    Best-effort answer without the LLM (no API key, breaker open, errors):
+    the first matching intent wins, in INTENT_PATTERNS order.
+    """
+    intents = detect_intents(message)
+
+    if 'courses' in intents:
+        return answer_courses(_enrollments(user))
+
+    if 'syllabus' in intents:
+        mentioned = get_course_matcher().find(message)
+        for enrollment in _enrollments(user):
+            if enrollment.course_id in mentioned:
+                return answer_syllabus(enrollment.course)
+        return "Please specify which course's syllabus you'd like to see. You can mention the course code or name."
+
+    if 'assignments' in intents:
+        return answer_assignments(user)
+
+    if 'greeting' in intents:
+        return answer_greeting(user)
+
+    if 'help' in intents:
+        return answer_help()
+
+    return GENERIC_ANSWER
@@ -0,0 +1,266 @@
+"""
+Full-text search over a user's chat history (questions and answers).
+
+PostgreSQL keeps a weighted tsvector on each query row (question = A,
+answer = B) behind a GIN index; SQLite keeps an FTS5 table keyed by query
+id. Both are written from here when a Response is saved; SQLite also
+indexes the question as soon as it is asked, while PostgreSQL, where each
+vector write rewrites the query row, waits for the answer. Ranked,
+highlighted matches are read back with one indexed lookup. Other
+databases fall back to an unranked icontains scan.
+"""
+
+import html
+import re
+from collections import namedtuple
+
+from django.db import connection
+from .models import Query, Response
+
+SearchHit = namedtuple('SearchHit', ['query_id', 'question', 'answer', 'rank', 'timestamp'])
+
+# Highlight markers used inside the database, swapped for <mark> after
+# the text is HTML-escaped
+_START, _STOP = '\x02', '\x03'
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+SNIPPET_WORDS = 24
+
+
+def search_terms(text):
+    return _TERM_RE.findall(text.lower())[:16]
+
+
+def render_highlight(text):
+    """HTML-escape database text and turn the markers into <mark> tags."""
+    return html.escape(text or '').replace(_START, '<mark>').replace(_STOP, '</mark>')
+
+
+# Backends' search() returns rows of
+# (query id, highlighted question, highlighted answer, rank)
+
+class PostgresSearch:
+    index_unanswered = False   # one row rewrite per chat, once answered
+
+    def index(self, cursor, query_id, user_id, question, answer):
+        cursor.execute(
+            "UPDATE queries SET search_vector = "
+            "setweight(to_tsvector('english', %s), 'A') || "
+            "setweight(to_tsvector('english', %s), 'B') WHERE id = %s",
+            [question, answer, query_id],
+        )
+
+    def index_many(self, cursor, rows):
+        cursor.executemany(
+            "UPDATE queries SET search_vector = "
+            "setweight(to_tsvector('english', %s), 'A') || "
+            "setweight(to_tsvector('english', %s), 'B') WHERE id = %s",
+            [(question, answer, query_id) for query_id, _, question, answer in rows],
+        )
+
+    def remove(self, cursor, query_ids):
+        pass   # the vector lives on the query row itself
+
+    def search(self, cursor, user_id, text, limit, offset):
+        options = f'StartSel={_START}, StopSel={_STOP}'
+        # Rank and page first; headlines are only computed for the page
+        cursor.execute(
+            """
+            SELECT page.id, ts_headline('english', page.content, page.tsq, %s), page.rank
+            FROM (
+                SELECT q.id, q.content, tsq,
+                       ts_rank_cd(q.search_vector, tsq) AS rank
+                FROM queries q, websearch_to_tsquery('english', %s) tsq
+                WHERE q.user_id = %s AND q.search_vector @@ tsq
+                ORDER BY rank DESC, q.id DESC
+                LIMIT %s OFFSET %s
+            ) page
+            ORDER BY page.rank DESC, page.id DESC
+            """,
+            [options + ', HighlightAll=true', text, user_id, limit, offset],
+        )
+        page = cursor.fetchall()
+        if not page:
+            return []
+        # Answers live (possibly compressed) in the body store, so their
+        # snippets are computed over the decoded texts
+        answers = _answers([pk for pk, _, _ in page])
+        cursor.execute(
+            """
+            SELECT ts_headline('english', t.answer, websearch_to_tsquery('english', %s), %s)
+            FROM unnest(%s::text[]) WITH ORDINALITY AS t(answer, n)
+            ORDER BY t.n
+            """,
+            [text, options + f', MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}',
+             [answers.get(pk, '') for pk, _, _ in page]],
+        )
+        snippets = [row[0] for row in cursor.fetchall()]
+        return [(pk, question, snippet, rank)
+                for (pk, question, rank), snippet in zip(page, snippets)]
+
+
+class SQLiteFTSSearch:
+    index_unanswered = True
+
+    def index(self, cursor, query_id, user_id, question, answer):
+        cursor.execute(
+            "INSERT OR REPLACE INTO chat_search(rowid, question, answer, user_id) "
+            "VALUES (%s, %s, %s, %s)",
+            [query_id, question, answer, user_id],
+        )
+
+    def index_many(self, cursor, rows):
+        cursor.executemany(
+            "INSERT OR REPLACE INTO chat_search(rowid, question, answer, user_id) "
+            "VALUES (%s, %s, %s, %s)",
+            [(query_id, question, answer, user_id) for query_id, user_id, question, answer in rows],
+        )
+
+    def remove(self, cursor, query_ids):
+        placeholders = ', '.join(['%s'] * len(query_ids))
+        cursor.execute(f"DELETE FROM chat_search WHERE rowid IN ({placeholders})", query_ids)
+
+    def search(self, cursor, user_id, text, limit, offset):
+        terms = search_terms(text)
+        if not terms:
+            return []
+        # Quoted terms (implicit AND) in the text columns, the last one as a
+        # prefix; the user is part of the MATCH, so only their rows are
+        # visited however much history other users have
+        words = ' '.join(f'"{t}"' for t in terms) + '*'
+        match = f'user_id : "{int(user_id)}" AND {{question answer}} : ({words})'
+        cursor.execute(
+            f"""
+            SELECT rowid,
+                   highlight(chat_search, 0, %s, %s),
+                   snippet(chat_search, 1, %s, %s, '…', {SNIPPET_WORDS}),
+                   -bm25(chat_search, 2.0, 1.0, 0.0)
+            FROM chat_search
+            WHERE chat_search MATCH %s
+            ORDER BY bm25(chat_search, 2.0, 1.0, 0.0), rowid DESC
+            LIMIT %s OFFSET %s
+            """,
+            [_START, _STOP, _START, _STOP, match, limit, offset],
+        )
+        return cursor.fetchall()
+
+
+class ScanSearch:
+    """Unindexed fallback for databases without a full-text backend."""
+    index_unanswered = False
+
+    def index(self, cursor, query_id, user_id, question, answer):
+        pass
+
+    def index_many(self, cursor, rows):
+        pass
+
+    def remove(self, cursor, query_ids):
+        pass
+
+    def search(self, cursor, user_id, text, limit, offset):
+        terms = search_terms(text)
+        if not terms:
+            return []
+        # Answers are stored compressed, so they are matched after decoding
+        queries = Query.objects.filter(user_id=user_id).select_related('response__body')
+        pattern = re.compile('|'.join(re.escape(t) for t in terms), re.IGNORECASE)
+        mark = lambda s: pattern.sub(lambda m: f'{_START}{m.group(0)}{_STOP}', s)
+        rows = []
+        for query in queries.order_by('-timestamp', '-id').iterator(chunk_size=500):
+            answer = query.response.response_text if hasattr(query, 'response') else ''
+            haystack = f'{query.content}\n{answer}'.lower()
+            if not all(term in haystack for term in terms):
+                continue
+            if offset:
+                offset -= 1
+                continue
+            rows.append((query.id, mark(query.content), mark(answer), 0.0))
+            if len(rows) == limit:
+                break
+        return rows
+
+
+def _answers(query_ids):
+    """{query id: answer text} for queries that have a response."""
+    responses = Response.objects.filter(query_id__in=query_ids).select_related('body')
+    return {r.query_id: r.response_text for r in responses}
+
+
+_fts_tables = {}   # database name -> chat_search table exists
+
+
+def get_backend():
+    if connection.vendor == 'postgresql':
+        return PostgresSearch()
+    if connection.vendor == 'sqlite':
+        name = connection.settings_dict['NAME']
+        if name not in _fts_tables:
+            _fts_tables[name] = 'chat_search' in connection.introspection.table_names()
+        if _fts_tables[name]:
+            return SQLiteFTSSearch()
+    return ScanSearch()
+
+
+def index_query(query_id, user_id, question, answer=''):
+    """Write (or rewrite) one query's entry in the full-text index."""
+    with connection.cursor() as cursor:
+        get_backend().index(cursor, query_id, user_id, question, answer or '')
+
+
+def index_question(query_id, user_id, question):
+    """Index a newly asked query, if the backend indexes unanswered ones."""
+    backend = get_backend()
+    if backend.index_unanswered:
+        with connection.cursor() as cursor:
+            backend.index(cursor, query_id, user_id, question, '')
+
+
+def index_queries(rows):
+    """
+    Index many queries at once: rows of (query id, user id, question,
+    answer). For bulk loads, which bypass the save signals.
+    """
+    if rows:
+        with connection.cursor() as cursor:
+            get_backend().index_many(cursor, rows)
+
+
+def remove_queries(query_ids):
+    """Drop index entries for deleted queries."""
+    if query_ids:
+        with connection.cursor() as cursor:
+            get_backend().remove(cursor, list(query_ids))
+
+
+def search_history(user, text, limit=20, offset=0):
+    """Ranked matches in the user's history, best first."""
+    if not text.strip():
+        return []
+    with connection.cursor() as cursor:
+        rows = get_backend().search(cursor, user.pk, text, limit, offset)
+    timestamps = dict(
+        Query.objects.filter(pk__in=[row[0] for row in rows]).values_list('id', 'timestamp')
+    )
+    return [
+        SearchHit(pk, render_highlight(question), render_highlight(answer), rank, timestamps.get(pk))
+        for pk, question, answer, rank in rows
+    ]
+
+
+class SearchResults:
+    """
+    Lazy, sliceable search results, so DRF pagination can page through
+    them without counting every match.
+    """
+
+    def __init__(self, user, text):
+        self.user = user
+        self.text = text
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice) or item.step is not None:
+            raise TypeError('SearchResults only supports [start:stop] slicing')
+        start = item.start or 0
+        return search_history(self.user, self.text, limit=item.stop - start, offset=start)
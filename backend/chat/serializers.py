@@ -3,18 +3,24 @@ Serializers for the chat app.
 """
 
 from rest_framework import serializers
+from .jobs import job_status
 from .models import Query, Response
 
 
 class ChatRequestSerializer(serializers.Serializer):
     """Incoming chat message from a student."""
     message = serializers.CharField(max_length=2000)
+    mode = serializers.ChoiceField(
+        choices=['sync', 'job'],
+        required=False,
+        help_text="'job' returns 202 at once; poll /api/chat/<query_id>/ for the answer.",
+    )
 
 
 class ResponseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Response
-        fields = ['id', 'response_text', 'timestamp']
+        fields = ['id', 'response_text', 'is_partial', 'timestamp']
 
 
 class QuerySerializer(serializers.ModelSerializer):
@@ -33,3 +39,27 @@ class ChatHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Query
         fields = ['id', 'content', 'response', 'timestamp']
+
+
+class ChatStatusSerializer(serializers.ModelSerializer):
+    """A single chat query with its answer status (job mode polling)."""
+    query_id = serializers.IntegerField(source='id', read_only=True)
+    message = serializers.CharField(source='content', read_only=True)
+    status = serializers.SerializerMethodField()
+    response = ResponseSerializer(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Query
+        fields = ['query_id', 'message', 'status', 'response', 'timestamp']
+
+    def get_status(self, obj):
+        return job_status(obj)
+
+
+class ChatSearchResultSerializer(serializers.Serializer):
+    """A search hit; question/answer are HTML-escaped with <mark> highlights."""
+    query_id = serializers.IntegerField()
+    question = serializers.CharField()
+    answer = serializers.CharField()
+    rank = serializers.FloatField()
+    timestamp = serializers.DateTimeField()
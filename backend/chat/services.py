@@ -3,8 +3,26 @@ OpenAI service for generating chatbot responses with course context.
 """
 
 import logging
+import time
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from courses.models import Course, Enrollment
+from django.db.models import Prefetch
+from courses.models import Assignment, Course, Enrollment
+from unibot_backend.metrics import STAGE_SECONDS, timed
+from .admission import get_admission_controller
+from .answer_cache import context_fingerprint, get_answer_cache
+from .coalesce import coalesce_key, get_single_flight
+from .context_cache import get_context_cache
+from .indexing import stored_chunks
+from .llm import LLMUnavailable, get_llm
+from .memory import is_follow_up, load_memory, memory_fingerprint
+from .metrics import ANSWERS, llm_call, record_usage
+from .telemetry import note, note_usage
+from .prompt import assemble_prompt, assemble_text_prompt
+from .router import fallback_answer, route
+from .retrieval import CONTEXT_ASSIGNMENTS_PER_COURSE, build_index
 
 logger = logging.getLogger(__name__)
 
@@ -22,48 +40,321 @@ Always be encouraging and supportive of students' academic journeys.
 """
 
 
+def context_enrollments(user):
+    """
+    Enrollments with everything the context needs, in a constant number of
+    queries regardless of how many courses the student takes: one joined
+    query for enrollments/courses/faculty, and one windowed prefetch that
+    fetches only the top-N assignments of every course at once.
+    """
+    recent_assignments = Assignment.objects.order_by('-created_at')[
+        :CONTEXT_ASSIGNMENTS_PER_COURSE
+    ]
+    return Enrollment.objects.filter(
+        student=user
+    ).select_related(
+        'course', 'course__faculty'
+    ).prefetch_related(
+        Prefetch(
+            'course__assignments',
+            queryset=recent_assignments,
+            to_attr='recent_assignments',
+        )
+    )
+
+
 def build_context(user):
     """
     Build course context from the student's enrolled courses and their syllabi.
     This ensures the bot retrieves the latest data updated by Faculty.
     """
-    context_parts = []
+    return _format_context(list(context_enrollments(user)))
+
+
+async def abuild_context(user):
+    """
+    Async variant of build_context() using the async ORM, so the event loop
+    is never blocked while the context is assembled.
+    """
+    return _format_context([e async for e in context_enrollments(user)])
+
+
+def _format_context(enrollments):
+    if not enrollments:
+        return "The student is not currently enrolled in any courses."
+
+    context_parts = ["=== Student's Enrolled Courses ==="]
+    for enrollment in enrollments:
+        course = enrollment.course
+        context_parts.append(_format_course(course))
+        context_parts.extend(_format_assignments(course.recent_assignments))
+    return "\n".join(context_parts)
+
+
+def get_course_context(user):
+    """
+    Cached build_context(): repeat messages skip the context queries until
+    the student's courses, assignments or enrollments change.
+    """
+    return _cached(user, 'context', build_context)
+
+
+async def aget_course_context(user):
+    """Async variant of get_course_context()."""
+    return await _acached(user, 'context', abuild_context)
+
+
+def get_retrieval_index(user):
+    """Cached BM25 index over the student's course material."""
+    def build(u):
+        enrollments = list(context_enrollments(u))
+        chunks = {}
+        for row in stored_chunks([e.course_id for e in enrollments]):
+            chunks.setdefault(row.course_id, []).append(row)
+        return build_index(enrollments, chunks)
+    return _cached(user, 'index', build)
+
+
+async def aget_retrieval_index(user):
+    """Async variant of get_retrieval_index()."""
+    async def abuild(u):
+        enrollments = [e async for e in context_enrollments(u)]
+        chunks = {}
+        async for row in stored_chunks([e.course_id for e in enrollments]):
+            chunks.setdefault(row.course_id, []).append(row)
+        return build_index(enrollments, chunks)
+    return await _acached(user, 'index', abuild)
+
+
+def _cached(user, namespace, builder):
+    cache = get_context_cache()
+    version = cache.version(user.pk)
+    value = cache.get(user.pk, version, namespace)
+    if value is None:
+        value = builder(user)
+        cache.set(user.pk, version, value, namespace)
+    return value
 
-    enrollments = Enrollment.objects.filter(
-        student=user
-    ).select_related('course', 'course__faculty')
-
-    if enrollments.exists():
-        context_parts.append("=== Student's Enrolled Courses ===")
-        for enrollment in enrollments:
-            course = enrollment.course
-            faculty_name = (
-                course.faculty.get_full_name()
-                if course.faculty else 'TBA'
-            )
-            context_parts.append(
-                f"\n📚 {course.code} — {course.name}\n"
-                f"   Department: {course.department}\n"
-                f"   Faculty: {faculty_name}\n"
-                f"   Description: {course.description}\n"
-                f"   Syllabus: {course.syllabus}\n"
-            )
 
-            # Include assignments
-            assignments = course.assignments.all()[:5]
-            if assignments:
-                context_parts.append("   Assignments:")
-                for a in assignments:
-                    due = a.due_date.strftime('%Y-%m-%d %H:%M') if a.due_date else 'No due date'
-                    context_parts.append(
-                        f"   - {a.title} (Due: {due})"
-                    )
+async def _acached(user, namespace, builder):
+    cache = get_context_cache()
+    version = await cache.aversion(user.pk)
+    value = await cache.aget(user.pk, version, namespace)
+    if value is None:
+        value = await builder(user)
+        await cache.aset(user.pk, version, value, namespace)
+    return value
+
+
+def get_prompt(user_message: str, user):
+    """
+    Messages for one completion, fitted to CHAT_PROMPT TOKEN_BUDGET, plus a
+    key identifying the underlying course data (for the answer cache).
+    Follow-up questions also carry the conversation memory.
+    """
+    memory = None
+    if _uses_memory(user_message):
+        with timed('memory'):
+            memory = load_memory(user)
+    with timed('context'):
+        source = _prompt_source(user)
+    return _assemble(user_message, *source, memory)
+
+
+async def aget_prompt(user_message: str, user):
+    """Async variant of get_prompt()."""
+    memory = None
+    if _uses_memory(user_message):
+        with timed('memory'):
+            memory = await _aload_memory(user)
+    with timed('context'):
+        source = await _aprompt_source(user)
+    return _assemble(user_message, *source, memory)
+
+
+def _uses_memory(user_message: str) -> bool:
+    return settings.CHAT_MEMORY['ENABLED'] and is_follow_up(user_message)
+
+
+def _prompt_source(user):
+    if settings.CHAT_RETRIEVAL['ENABLED']:
+        return get_retrieval_index(user), None
+    return None, get_course_context(user)
+
+
+async def _aprompt_source(user):
+    if settings.CHAT_RETRIEVAL['ENABLED']:
+        return await aget_retrieval_index(user), None
+    return None, await aget_course_context(user)
+
+
+def _assemble(user_message, index, context, memory=None):
+    with timed('prompt'):
+        return _assemble_prompt(user_message, index, context, memory)
+
+
+def _assemble_prompt(user_message, index, context, memory):
+    budget = settings.CHAT_PROMPT['TOKEN_BUDGET']
+    if index is not None:
+        prompt = assemble_prompt(
+            SYSTEM_PROMPT, user_message, index, budget,
+            top_k=settings.CHAT_RETRIEVAL['TOP_K'], memory=memory,
+        )
+        context_key = index.fingerprint
     else:
-        context_parts.append(
-            "The student is not currently enrolled in any courses."
+        prompt = assemble_text_prompt(SYSTEM_PROMPT, user_message, context, budget, memory)
+        context_key = context_fingerprint(context)
+    if memory is not None:
+        # Answers to follow-ups depend on the conversation, not just the question
+        context_key = f'{context_key}:{memory_fingerprint(memory)}'
+    if prompt.report.dropped_tokens:
+        logger.info(
+            f"Prompt over budget: dropped {prompt.report.dropped_tokens} tokens "
+            f"(dropped={prompt.report.dropped}, truncated={prompt.report.truncated})"
         )
+    return prompt, context_key
+
+
+def _format_course(course):
+    faculty_name = (
+        course.faculty.get_full_name()
+        if course.faculty else 'TBA'
+    )
+    return (
+        f"\n📚 {course.code} — {course.name}\n"
+        f"   Department: {course.department}\n"
+        f"   Faculty: {faculty_name}\n"
+        f"   Description: {course.description}\n"
+        f"   Syllabus: {course.syllabus}\n"
+    )
+
+
+def _format_assignments(assignments):
+    if not assignments:
+        return []
+    lines = ["   Assignments:"]
+    for a in assignments:
+        due = a.due_date.strftime('%Y-%m-%d %H:%M') if a.due_date else 'No due date'
+        lines.append(f"   - {a.title} (Due: {due})")
+    return lines
+
+
+def _llm_configured() -> bool:
+    # A custom BASE_URL (a self-hosted model or perf's llm_stub) may not need a key
+    if settings.CHAT_LLM['BASE_URL']:
+        return True
+    api_key = settings.OPENAI_API_KEY
+    return bool(api_key) and api_key != 'your-openai-api-key-here'
+
+
+def _lookup_answer(user_message: str, context_key: str):
+    cache = get_answer_cache()
+    if cache is None:
+        return None
+    with timed('answer_cache'):
+        answer = cache.lookup(user_message, context_key)
+    if answer is not None:
+        _answered('cache')
+    return answer
+
+
+def _store_answer(user_message: str, context_key: str, answer: str):
+    cache = get_answer_cache()
+    if cache is not None and answer:
+        cache.store(user_message, context_key, answer)
 
-    return "\n".join(context_parts)
+
+def _answered(source: str):
+    ANSWERS.inc(source)
+    note(source=source)
+
+
+def _record_completion(response, prompt, started):
+    record_usage(response.usage)
+    note_usage(response.model or settings.CHAT_LLM['MODEL'], response.usage)
+    note(latency_ms=round((time.perf_counter() - started) * 1000),
+         context_tokens=prompt.report.used_tokens)
+
+
+def _complete(user_message: str, context_key: str, prompt, user) -> str:
+    with _llm_slot(user), timed('llm'), llm_call():
+        started = time.perf_counter()
+        response = get_llm().complete(
+            model=settings.CHAT_LLM['MODEL'],
+            messages=prompt.messages,
+            max_tokens=800,
+            temperature=0.7,
+        )
+    _record_completion(response, prompt, started)
+    answer = response.choices[0].message.content.strip()
+    _store_answer(user_message, context_key, answer)
+    return answer
+
+
+async def _acomplete(user_message: str, context_key: str, prompt, user) -> str:
+    async with _allm_slot(user):
+        with timed('llm'), llm_call():
+            started = time.perf_counter()
+            response = await get_llm().acomplete(
+                model=settings.CHAT_LLM['MODEL'],
+                messages=prompt.messages,
+                max_tokens=800,
+                temperature=0.7,
+            )
+    _record_completion(response, prompt, started)
+    answer = response.choices[0].message.content.strip()
+    _store_answer(user_message, context_key, answer)
+    return answer
+
+
+def _llm_slot(user):
+    """Admission-control slot for one LLM call (raises LoadShed when full)."""
+    controller = get_admission_controller()
+    return controller.slot(user) if controller else nullcontext()
+
+
+def _allm_slot(user):
+    controller = get_admission_controller()
+    return controller.aslot(user) if controller else nullcontext()
+
+
+def _coalesced_answer(user_message: str, context_key: str, prompt, user) -> str:
+    """
+    Identical concurrent questions share one completion. The caller that
+    made the call is recorded as 'llm', the ones that shared it as
+    'coalesced' (they cost no tokens).
+    """
+    flight = get_single_flight()
+    if flight is None:
+        answer = _complete(user_message, context_key, prompt, user)
+        _answered('llm')
+        return answer
+    led = []
+
+    def lead():
+        led.append(True)
+        return _complete(user_message, context_key, prompt, user)
+
+    answer = flight.do(coalesce_key(user_message, context_key), lead)
+    _answered('llm' if led else 'coalesced')
+    return answer
+
+
+async def _acoalesced_answer(user_message: str, context_key: str, prompt, user) -> str:
+    flight = get_single_flight()
+    if flight is None:
+        answer = await _acomplete(user_message, context_key, prompt, user)
+        _answered('llm')
+        return answer
+    led = []
+
+    def lead():
+        led.append(True)
+        return _acomplete(user_message, context_key, prompt, user)
+
+    answer = await flight.ado(coalesce_key(user_message, context_key), lead)
+    _answered('llm' if led else 'coalesced')
+    return answer
 
 
 def get_ai_response(user_message: str, user) -> str:
@@ -72,34 +363,135 @@ def get_ai_response(user_message: str, user) -> str:
     Returns the AI-generated response text.
     """
     try:
-        from openai import OpenAI
+        routed = None if _uses_memory(user_message) else _timed_route(user_message, user)
+        if routed is not None:
+            _answered('routed')
+            return routed.text
 
-        api_key = settings.OPENAI_API_KEY
-        if not api_key or api_key == 'your-openai-api-key-here':
+        if not _llm_configured():
             # Fallback for demo/development without API key
+            _answered('demo')
             return _demo_response(user_message, user)
 
-        client = OpenAI(api_key=api_key)
-        context = build_context(user)
+        prompt, context_key = get_prompt(user_message, user)
+        cached = _lookup_answer(user_message, context_key)
+        if cached is not None:
+            return cached
 
-        messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "system", "content": f"Course Context:\n{context}"},
-            {"role": "user", "content": user_message},
-        ]
+        return _coalesced_answer(user_message, context_key, prompt, user)
 
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            max_tokens=800,
-            temperature=0.7,
-        )
+    except LLMUnavailable as e:
+        logger.warning(f"OpenAI unavailable, using fallback: {e}")
+        _answered('fallback')
+        return _demo_response(user_message, user)
+    except Exception as e:
+        logger.error(f"OpenAI API error: {e}")
+        _answered('fallback')
+        return _demo_response(user_message, user)
+
+
+async def aget_ai_response(user_message: str, user) -> str:
+    """
+    Async variant of get_ai_response() backed by AsyncOpenAI.
+    The worker is released while the completion is in flight, so a single
+    ASGI process can serve many concurrent chats.
+    """
+    try:
+        routed = None if _uses_memory(user_message) else await _aroute(user_message, user)
+        if routed is not None:
+            _answered('routed')
+            return routed.text
+
+        if not _llm_configured():
+            _answered('demo')
+            return await _ademo_response(user_message, user)
+
+        prompt, context_key = await aget_prompt(user_message, user)
+        cached = _lookup_answer(user_message, context_key)
+        if cached is not None:
+            return cached
 
-        return response.choices[0].message.content.strip()
+        return await _acoalesced_answer(user_message, context_key, prompt, user)
 
+    except LLMUnavailable as e:
+        logger.warning(f"OpenAI unavailable, using fallback: {e}")
+        _answered('fallback')
+        return await _ademo_response(user_message, user)
     except Exception as e:
         logger.error(f"OpenAI API error: {e}")
-        return _demo_response(user_message, user)
+        _answered('fallback')
+        return await _ademo_response(user_message, user)
+
+
+async def astream_ai_response(user_message: str, user):
+    """
+    Async generator yielding the completion text as it is produced.
+    Falls back to the demo response (as a single chunk) when OpenAI is not
+    configured or fails before the first token; a failure after it is
+    re-raised, so the caller can keep the partial answer as such.
+    """
+    started = False
+    try:
+        routed = None if _uses_memory(user_message) else await _aroute(user_message, user)
+        if routed is not None:
+            _answered('routed')
+            yield routed.text
+            return
+
+        if not _llm_configured():
+            _answered('demo')
+            yield await _ademo_response(user_message, user)
+            return
+
+        prompt, context_key = await aget_prompt(user_message, user)
+        cached = _lookup_answer(user_message, context_key)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        async with _allm_slot(user):
+            with timed('llm'), llm_call():
+                requested = time.perf_counter()
+                usage = model = None
+                stream = await get_llm().acomplete(
+                    model=settings.CHAT_LLM['MODEL'],
+                    messages=prompt.messages,
+                    max_tokens=800,
+                    temperature=0.7,
+                    stream=True,
+                    stream_options={'include_usage': True},
+                )
+
+                async for chunk in stream:
+                    model = getattr(chunk, 'model', None) or model
+                    if not chunk.choices:
+                        # The final chunk carries only token usage
+                        usage = getattr(chunk, 'usage', None) or usage
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if not started:
+                            ttft = time.perf_counter() - requested
+                            STAGE_SECONDS.observe(ttft, 'llm_first_token')
+                            note(ttft_ms=round(ttft * 1000))
+                        started = True
+                        parts.append(delta)
+                        yield delta
+
+        record_usage(usage)
+        note_usage(model or settings.CHAT_LLM['MODEL'], usage)
+        note(latency_ms=round((time.perf_counter() - requested) * 1000),
+             context_tokens=prompt.report.used_tokens)
+        _answered('llm')
+        _store_answer(user_message, context_key, ''.join(parts).strip())
+
+    except Exception as e:
+        logger.error(f"OpenAI streaming error: {e}")
+        if started:
+            raise
+        _answered('fallback')
+        yield await _ademo_response(user_message, user)
 
 
 def _demo_response(message: str, user) -> str:
@@ -107,73 +499,14 @@ def _demo_response(message: str, user) -> str:
     Fallback response when OpenAI API is not configured.
     Provides meaningful responses based on available course data.
     """
-    message_lower = message.lower()
+    return fallback_answer(message, user)
 
-    enrollments = Enrollment.objects.filter(
-        student=user
-    ).select_related('course')
 
-    if any(word in message_lower for word in ['course', 'enrolled', 'classes', 'subjects']):
-        if enrollments.exists():
-            course_list = "\n".join(
-                f"📚 **{e.course.code}** — {e.course.name}"
-                for e in enrollments
-            )
-            return (
-                f"Here are your enrolled courses:\n\n{course_list}\n\n"
-                f"Would you like to know more about any specific course?"
-            )
-        return "You don't seem to be enrolled in any courses yet. Please contact your department for enrollment."
-
-    if any(word in message_lower for word in ['syllabus', 'curriculum', 'topics']):
-        for enrollment in enrollments:
-            if enrollment.course.code.lower() in message_lower or \
-               enrollment.course.name.lower() in message_lower:
-                return (
-                    f"📋 **Syllabus for {enrollment.course.code} — {enrollment.course.name}:**\n\n"
-                    f"{enrollment.course.syllabus or 'Syllabus not yet uploaded by faculty.'}"
-                )
-        return "Please specify which course's syllabus you'd like to see. You can mention the course code or name."
-
-    if any(word in message_lower for word in ['assignment', 'homework', 'due', 'deadline']):
-        from courses.models import Assignment
-        assignments = Assignment.objects.filter(
-            course__enrollments__student=user
-        ).order_by('due_date')[:5]
-        if assignments:
-            assignment_list = "\n".join(
-                f"📝 **{a.title}** ({a.course.code}) — Due: {a.due_date.strftime('%b %d, %Y') if a.due_date else 'TBA'}"
-                for a in assignments
-            )
-            return f"Here are your upcoming assignments:\n\n{assignment_list}"
-        return "No assignments found for your enrolled courses."
-
-    if any(word in message_lower for word in ['hello', 'hi', 'hey', 'good']):
-        name = user.first_name or user.username
-        return (
-            f"Hey {name}! 👋 I'm UNIBOT, your university assistant.\n\n"
-            f"I can help you with:\n"
-            f"• 📚 Course information & syllabi\n"
-            f"• 📝 Assignment deadlines\n"
-            f"• 🗓️ Schedules & procedures\n\n"
-            f"What would you like to know?"
-        )
+def _timed_route(user_message: str, user):
+    with timed('route'):
+        return route(user_message, user)
 
-    if any(word in message_lower for word in ['help', 'what can you do', 'features']):
-        return (
-            "I'm **UNIBOT** — your 24/7 university assistant! Here's what I can do:\n\n"
-            "1. 📚 **Course Info** — Ask about your enrolled courses\n"
-            "2. 📋 **Syllabi** — View course syllabi updated by faculty\n"
-            "3. 📝 **Assignments** — Check upcoming deadlines\n"
-            "4. 🏫 **Campus Info** — Administrative procedures\n\n"
-            "Try asking: *\"What courses am I enrolled in?\"* or *\"Show me the syllabus for CS101\"*"
-        )
 
-    return (
-        "I'd be happy to help! You can ask me about:\n"
-        "• Your enrolled courses\n"
-        "• Course syllabi and content\n"
-        "• Assignment deadlines\n"
-        "• Campus procedures\n\n"
-        "Try being more specific, and I'll give you a detailed answer! 😊"
-    )
+_ademo_response = sync_to_async(_demo_response)
+_aroute = sync_to_async(_timed_route)
+_aload_memory = sync_to_async(load_memory)
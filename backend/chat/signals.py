@@ -0,0 +1,87 @@
+"""
+Signal receivers that keep chat-side caches in step with course data, and
+the history search index in step with saved chats. (Conversation memory
+is folded lazily by chat.memory.load_memory.)
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from courses.models import Assignment, Course, Enrollment
+from .context_cache import invalidate_students
+from .indexing import schedule_reindex
+from .models import Query, Response
+from .router import reset_course_matcher
+from .search import index_query, index_question, remove_queries
+
+
+def _students_of(course_id):
+    return list(Enrollment.objects.filter(
+        course_id=course_id
+    ).values_list('student_id', flat=True))
+
+
+def _invalidate_on_commit(user_ids):
+    # Bump versions only once the new data is visible to other requests,
+    # otherwise a concurrent rebuild could cache pre-commit text.
+    transaction.on_commit(lambda: invalidate_students(user_ids))
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_context(sender, instance, **kwargs):
+    _invalidate_on_commit(_students_of(instance.pk))
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def invalidate_assignment_context(sender, instance, **kwargs):
+    _invalidate_on_commit(_students_of(instance.course_id))
+
+
+@receiver(post_save, sender=Course)
+def reindex_course_content(sender, instance, **kwargs):
+    schedule_reindex(instance.pk)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def refresh_course_matcher(sender, instance, **kwargs):
+    transaction.on_commit(reset_course_matcher)
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def reindex_assignment_content(sender, instance, **kwargs):
+    schedule_reindex(instance.course_id)
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def invalidate_enrollment_context(sender, instance, **kwargs):
+    _invalidate_on_commit([instance.student_id])
+
+
+@receiver(post_save, sender=Query)
+def index_query_text(sender, instance, created, **kwargs):
+    if created:
+        # The Response save indexes it again, with its answer
+        index_question(instance.pk, instance.user_id, instance.content)
+        return
+    response = Response.objects.filter(query=instance).select_related('body').first()
+    answer = response.response_text if response else ''
+    index_query(instance.pk, instance.user_id, instance.content, answer)
+
+
+@receiver(post_save, sender=Response)
+@receiver(post_delete, sender=Response)
+def index_response_text(sender, instance, **kwargs):
+    query = instance.query
+    answer = '' if kwargs['signal'] is post_delete else instance.response_text
+    index_query(query.pk, query.user_id, query.content, answer)
+
+
+@receiver(post_delete, sender=Query)
+def unindex_query(sender, instance, **kwargs):
+    remove_queries([instance.pk])
@@ -0,0 +1,61 @@
+"""
+Per-answer LLM telemetry: which model produced an answer, how (LLM, cache,
+router, fallback), the tokens it cost and how long the provider took.
+
+Views and the job runner open `collect()` around answer generation; the
+services layer fills in the current Telemetry as it goes, and the fields
+are stored on the Response row. Nothing is recorded outside collect().
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+class Telemetry:
+    __slots__ = (
+        'source', 'model', 'prompt_tokens', 'completion_tokens',
+        'latency_ms', 'ttft_ms', 'context_tokens',
+    )
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, None)
+
+    def fields(self):
+        """Response model fields for what was recorded."""
+        return {
+            name: value for name in self.__slots__
+            if (value := getattr(self, name)) is not None
+        }
+
+
+_current = ContextVar('chat_telemetry', default=None)
+
+
+@contextmanager
+def collect():
+    telemetry = Telemetry()
+    token = _current.set(telemetry)
+    try:
+        yield telemetry
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            pass   # closed from another context (an async generator's finalizer)
+
+
+def note(**values):
+    """Record values on the current Telemetry, if one is being collected."""
+    telemetry = _current.get()
+    if telemetry is not None:
+        for name, value in values.items():
+            setattr(telemetry, name, value)
+
+
+def note_usage(model, usage):
+    if usage is not None:
+        note(model=model, prompt_tokens=usage.prompt_tokens,
+             completion_tokens=usage.completion_tokens)
+    else:
+        note(model=model)
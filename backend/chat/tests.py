@@ -1,3 +1,1148 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import tempfile
+from datetime import timedelta
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import openai
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from unibot_backend.metrics import REQUEST_DB_QUERIES, Histogram, STAGE_SECONDS
+from unibot_backend.streaming import sync_iterator
+from courses.models import Assignment, Course, Enrollment
+from .admission import AdmissionController, LoadShed
+from .answer_cache import AnswerCache
+from .coalesce import SingleFlight, coalesce_key
+from .context_cache import DjangoContextCache, LocalContextCache, get_context_cache
+from .indexing import reindex_course, stale_course_ids
+from .jobs import claim_jobs, run_job
+from .llm import CircuitBreaker, LLMClient, LLMUnavailable
+from .memory import is_follow_up, load_memory
+from .metrics import ANSWERS
+from .models import (
+    ChatJob, ChatUsageDaily, ConversationMemory, CourseChunk, Query, Response, ResponseBody,
+)
+from .pagination import decode_cursor
+from .retention import Archive, purge
+from .search import PostgresSearch, search_history
+from .usage import rollup_day, usage_report
+from .views import ChatStreamView, ChatView
+from .prompt import PromptAssembler, estimate_tokens
+from .retrieval import CONTEXT_ASSIGNMENTS_PER_COURSE
+from .router import detect_intents, reset_course_matcher, route
+from .services import (
+    abuild_context,
+    build_context,
+    get_course_context,
+    get_prompt,
+)
+
+
+@override_settings(CHAT_INDEXING={'BACKGROUND': False})
+class ChatTestCase(TestCase):
+    """Shared fixtures: one student enrolled in one course."""
+
+    def setUp(self):
+        get_context_cache().clear()
+        reset_course_matcher()
+        self.faculty = User.objects.create_user(
+            'prof', password='x', role='faculty',
+            first_name='Priya', last_name='Sharma',
+        )
+        self.student = User.objects.create_user(
+            'student', password='x', first_name='Ansh',
+        )
+        self.course = Course.objects.create(
+            code='CS101', name='Introduction to Computer Science',
+            syllabus='Week 1-2: Python', faculty=self.faculty,
+        )
+        Enrollment.objects.create(
+            student=self.student, course=self.course, enrollment_num='ENR-1',
+        )
+
+    def auth_headers(self, user):
+        return {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+
+class ContextCacheTests(ChatTestCase):
+
+    def test_repeat_lookups_skip_queries(self):
+        get_course_context(self.student)
+        with self.assertNumQueries(0):
+            get_course_context(self.student)
+
+    def test_syllabus_update_invalidates(self):
+        get_course_context(self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.syllabus = 'Week 1-2: Rust'
+            self.course.save()
+        self.assertIn('Rust', get_course_context(self.student))
+
+    def test_new_assignment_invalidates(self):
+        get_course_context(self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            Assignment.objects.create(
+                course=self.course, faculty=self.faculty,
+                title='Python Basics Lab', content='Exercises 1-10',
+            )
+        self.assertIn('Python Basics Lab', get_course_context(self.student))
+
+    def test_local_cache_is_bounded_lru(self):
+        cache = LocalContextCache(max_entries=2, ttl=60)
+        for user_id in (1, 2, 3):
+            cache.set(user_id, 0, f'ctx-{user_id}')
+        self.assertIsNone(cache.get(1, 0))
+        self.assertEqual(cache.get(3, 0), 'ctx-3')
+
+    def test_local_cache_drops_sets_racing_an_invalidation(self):
+        cache = LocalContextCache()
+        version = cache.version(1)
+        cache.invalidate([1])
+        cache.set(1, version, 'stale')
+        self.assertIsNone(cache.get(1, cache.version(1)))
+
+    def test_django_cache_clear_leaves_other_keys(self):
+        cache = DjangoContextCache()
+        cache.set(1, cache.version(1), 'ctx-1')
+        caches['default'].set('unrelated', 'kept')
+        cache.clear()
+        self.assertIsNone(cache.get(1, cache.version(1)))
+        self.assertEqual(caches['default'].get('unrelated'), 'kept')
+
+
+class BuildContextQueryTests(ChatTestCase):
+
+    def enroll_in(self, count):
+        for i in range(count):
+            course = Course.objects.create(
+                code=f'EXTRA{i}', name=f'Elective {i}', faculty=self.faculty,
+            )
+            Enrollment.objects.create(
+                student=self.student, course=course, enrollment_num=f'ENR-X{i}',
+            )
+            for j in range(7):
+                Assignment.objects.create(
+                    course=course, faculty=self.faculty,
+                    title=f'Elective {i} task {j}', content='...',
+                )
+
+    def test_query_count_is_flat_in_enrollments(self):
+        with self.assertNumQueries(2):
+            build_context(self.student)
+        self.enroll_in(8)
+        with self.assertNumQueries(2):
+            context = build_context(self.student)
+        self.assertIn('EXTRA7', context)
+
+    def test_only_top_assignments_per_course(self):
+        self.enroll_in(1)
+        context = build_context(self.student)
+        self.assertIn('Elective 0 task 6', context)
+        self.assertIn('Elective 0 task 2', context)
+        self.assertNotIn('Elective 0 task 1', context)
+
+    async def test_async_builder_matches_sync(self):
+        await sync_to_async(self.enroll_in)(3)
+        expected = await sync_to_async(build_context)(self.student)
+        self.assertEqual(await abuild_context(self.student), expected)
+
+
+class AnswerCacheTests(TestCase):
+
+    def setUp(self):
+        self.cache = AnswerCache()
+        self.cache.store('When is the CS101 assignment due?', 'ctx', 'Friday')
+
+    def test_near_duplicate_hits(self):
+        self.assertEqual(self.cache.lookup('cs101 deadline?', 'ctx'), 'Friday')
+
+    def test_different_course_or_topic_misses(self):
+        self.assertIsNone(self.cache.lookup('cs201 deadline?', 'ctx'))
+        self.assertIsNone(self.cache.lookup('when is the cs101 exam due', 'ctx'))
+
+    def test_different_context_misses(self):
+        self.assertIsNone(self.cache.lookup('cs101 deadline?', 'other-ctx'))
+
+    def test_stats(self):
+        self.cache.lookup('cs101 deadline?', 'ctx')
+        self.cache.lookup('cs201 deadline?', 'ctx')
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+
+class RetrievalTests(ChatTestCase):
+
+    def setUp(self):
+        super().setUp()
+        math = Course.objects.create(
+            code='MATH101', name='Calculus I',
+            syllabus='Week 1-2: Limits and Continuity\nWeek 3-4: Derivatives',
+        )
+        Enrollment.objects.create(
+            student=self.student, course=math, enrollment_num='ENR-2',
+        )
+
+    def test_prompt_carries_only_relevant_chunks(self):
+        prompt, _ = get_prompt('when do we cover derivatives?', self.student)
+        context = prompt.messages[1]['content']
+        self.assertIn('Derivatives', context)
+        self.assertNotIn('Python', context)
+        # The roster of enrolled courses is always present
+        self.assertIn('CS101', context)
+
+    def test_mentioned_course_material_is_included(self):
+        prompt, _ = get_prompt('show me the cs101 syllabus', self.student)
+        self.assertIn('Week 1-2: Python', prompt.messages[1]['content'])
+
+
+class PromptAssemblerTests(TestCase):
+
+    def test_sections_fit_budget_in_priority_order(self):
+        assembler = PromptAssembler(budget=100)
+        assembler.add('low', 'word ' * 50, priority=30)
+        assembler.add('high', 'important ' * 20, priority=10)
+        texts, report = assembler.assemble()
+        self.assertEqual(texts[-1], 'important ' * 20)
+        self.assertEqual(report.truncated, ['low'])
+        self.assertLessEqual(report.used_tokens, 100)
+        self.assertGreater(report.dropped_tokens, 0)
+
+    def test_required_sections_are_always_kept(self):
+        assembler = PromptAssembler(budget=5)
+        assembler.add('question', 'a question that is too long', 0, required=True)
+        assembler.add('extra', 'x ' * 40, 50)
+        texts, report = assembler.assemble()
+        self.assertEqual(texts, ['a question that is too long'])
+        self.assertEqual(report.dropped, ['extra'])
+
+
+class IncrementalIndexingTests(ChatTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.course.syllabus = '\n'.join(
+            f'Week {i}: Topic number {i}' for i in range(1, 25)
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.save()
+
+    def test_one_line_edit_reprocesses_few_chunks(self):
+        total = CourseChunk.objects.filter(course=self.course).count()
+        self.course.syllabus = self.course.syllabus.replace(
+            'Topic number 12', 'Binary search trees'
+        )
+        self.course.save()
+        stats = reindex_course(self.course.pk)
+        # The edited chunk, plus at most a neighbour if its boundary moved
+        self.assertLessEqual(stats.added, 2)
+        self.assertLessEqual(stats.removed, 2)
+        self.assertGreaterEqual(stats.unchanged + stats.moved, total - 2)
+        self.assertTrue(CourseChunk.objects.filter(text__contains='Binary search').exists())
+
+    def test_new_assignment_is_indexed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Assignment.objects.create(
+                course=self.course, faculty=self.faculty,
+                title='Lab report', content='Write up the sorting lab.',
+            )
+        prompt, _ = get_prompt('lab report', self.student)
+        self.assertIn('sorting lab', prompt.messages[1]['content'])
+
+    def test_only_recent_assignments_are_indexed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(CONTEXT_ASSIGNMENTS_PER_COURSE + 2):
+                Assignment.objects.create(
+                    course=self.course, faculty=self.faculty, title=f'Lab {i}', content='Lab work.',
+                )
+        indexed = set(CourseChunk.objects.filter(assignment__isnull=False).values_list(
+            'assignment__title', flat=True,
+        ))
+        self.assertEqual(indexed, {f'Lab {i}' for i in range(2, CONTEXT_ASSIGNMENTS_PER_COURSE + 2)})
+
+    def test_edits_missed_by_the_background_reindex_are_stale(self):
+        self.assertNotIn(self.course.pk, stale_course_ids())
+        self.course.syllabus += '\nWeek 25: Review'
+        self.course.save()   # its on-commit re-index never runs
+        self.assertIn(self.course.pk, stale_course_ids())
+        call_command('reindex_courses', '--stale', stdout=io.StringIO())
+        self.assertNotIn(self.course.pk, stale_course_ids())
+        self.assertTrue(CourseChunk.objects.filter(text__contains='Week 25').exists())
+
+
+class LLMClientTests(TestCase):
+
+    def make_client(self, side_effect):
+        llm = LLMClient({
+            **settings.CHAT_LLM,
+            'MAX_RETRIES': 2, 'BACKOFF_BASE': 0, 'BREAKER_THRESHOLD': 3,
+        })
+        fake = mock.Mock()
+        fake.chat.completions.create.side_effect = side_effect
+        llm._sync_client = fake
+        return llm, fake.chat.completions.create
+
+    def connection_error(self):
+        return openai.APIConnectionError.__new__(openai.APIConnectionError)
+
+    def test_transient_errors_are_retried(self):
+        llm, create = self.make_client([self.connection_error(), 'ok'])
+        self.assertEqual(llm.complete(model='m', messages=[]), 'ok')
+        self.assertEqual(create.call_count, 2)
+
+    def test_breaker_opens_and_short_circuits(self):
+        llm, create = self.make_client(self.connection_error())
+        with self.assertRaises(openai.APIConnectionError):
+            llm.complete(model='m', messages=[])
+        self.assertEqual(llm.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(LLMUnavailable):
+            llm.complete(model='m', messages=[])
+        self.assertEqual(create.call_count, 3)
+
+    def test_half_open_probe_closes_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    async def test_cancelled_probe_is_released(self):
+        llm = LLMClient({**settings.CHAT_LLM, 'BREAKER_THRESHOLD': 1, 'BREAKER_RESET': 0})
+        llm.breaker.record_failure()
+        started = asyncio.Event()
+
+        async def hang(**kwargs):
+            started.set()
+            await asyncio.sleep(60)
+
+        fake = mock.Mock()
+        fake.chat.completions.create = hang
+        llm._async_clients[asyncio.get_running_loop()] = fake
+        task = asyncio.create_task(llm.acomplete(model='m', messages=[]))
+        await started.wait()
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertTrue(llm.breaker.allow())
+
+    def test_stream_outcome_is_recorded_after_consumption(self):
+        def broken():
+            yield 'first'
+            raise self.connection_error()
+
+        llm, _ = self.make_client([broken()])
+        llm.breaker.failure_threshold = 1
+        stream = llm.complete(model='m', messages=[], stream=True)
+        self.assertEqual(llm.breaker.state, CircuitBreaker.CLOSED)
+        with self.assertRaises(openai.APIConnectionError):
+            list(stream)
+        self.assertEqual(llm.breaker.state, CircuitBreaker.OPEN)
+
+
+class IntentRouterTests(ChatTestCase):
+
+    def test_enrolled_courses(self):
+        routed = route('What courses am I enrolled in?', self.student)
+        self.assertEqual(routed.intent, 'courses')
+        self.assertIn('CS101', routed.text)
+
+    def test_syllabus_by_code_or_name(self):
+        for message in ('show cs 101 syllabus',
+                        'introduction to computer science syllabus'):
+            routed = route(message, self.student)
+            self.assertEqual(routed.intent, 'syllabus')
+            self.assertIn('Week 1-2: Python', routed.text)
+
+    def test_deadline_questions(self):
+        for message in ("What's due for CS101?", 'my deadlines', 'any assignments due this week?',
+                        'introduction to computer science homework'):
+            self.assertEqual(route(message, self.student).intent, 'assignments', message)
+        for message in ('is the exam due date changed?', 'what happens if I miss a deadline?'):
+            self.assertIsNone(route(message, self.student), message)
+
+    def test_open_ended_questions_go_to_llm(self):
+        self.assertIsNone(route('why is the CS101 syllabus so hard?', self.student))
+        self.assertIsNone(route('tell me about recursion', self.student))
+
+    def test_intents_match_whole_words(self):
+        self.assertEqual(detect_intents('this is nothing'), set())
+
+
+class SingleFlightTests(TestCase):
+
+    def test_concurrent_threads_share_one_call(self):
+        flight, release, calls = SingleFlight(), threading.Event(), []
+
+        def work():
+            calls.append(1)
+            release.wait(5)
+            return 'answer'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do('k', work)))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        while flight.followers < 3:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['answer'] * 4)
+        self.assertEqual(len(calls), 1)
+
+    def test_concurrent_coroutines_share_one_call(self):
+        flight, calls = SingleFlight(), []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'answer'
+
+        async def main():
+            return await asyncio.gather(*(flight.ado('k', work) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), ['answer'] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        flight, calls = SingleFlight(), []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05 if len(calls) > 1 else 5)
+            return 'answer'
+
+        async def main():
+            leader = asyncio.create_task(flight.ado('k', work))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(flight.ado('k', work))
+            await asyncio.sleep(0.01)
+            self.assertEqual(flight.followers, 1)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+        self.assertEqual(asyncio.run(main()), 'answer')
+        self.assertEqual(len(calls), 2)
+
+    def test_cross_process_follower_reads_leaders_result(self):
+        flight = SingleFlight(cross_process=True, wait_timeout=1, poll_interval=0.01)
+        lock_key, result_key = flight._keys('k')
+        flight.cache.set(lock_key, 'other-process')
+        flight.cache.set(result_key, 'from leader')
+        try:
+            self.assertEqual(flight.do('k', lambda: 'recomputed'), 'from leader')
+        finally:
+            flight.cache.delete_many([lock_key, result_key])
+
+    def test_key_ignores_phrasing_but_not_context(self):
+        self.assertEqual(coalesce_key('When is CS101 due?', 'a'),
+                         coalesce_key('when is cs101 due', 'a'))
+        self.assertNotEqual(coalesce_key('When is CS101 due?', 'a'),
+                            coalesce_key('When is CS101 due?', 'b'))
+
+
+class AsyncAPIViewTests(ChatTestCase):
+
+    async def test_throttles_are_checked(self):
+        class Closed(BaseThrottle):
+            def allow_request(self, request, view):
+                return False
+
+            def wait(self):
+                return 7
+
+        headers = await sync_to_async(self.auth_headers)(self.student)
+        with mock.patch.object(ChatView, 'throttle_classes', [Closed]):
+            response = await self.async_client.post(
+                '/api/chat/', {'message': 'hello'}, content_type='application/json', headers=headers,
+            )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '7')
+        self.assertFalse(await Query.objects.aexists())
+
+
+class ChatJobTests(ChatTestCase):
+
+    async def test_job_mode_returns_202_and_queues(self):
+        headers = await sync_to_async(self.auth_headers)(self.student)
+        response = await self.async_client.post(
+            '/api/chat/', {'message': 'hello'}, content_type='application/json',
+            headers={**headers, 'Prefer': 'respond-async'},
+        )
+        self.assertEqual(response.status_code, 202)
+        body = response.json()
+        self.assertEqual(body['status'], 'pending')
+        self.assertEqual(response['Location'], f"/api/chat/{body['query_id']}/")
+        self.assertTrue(await ChatJob.objects.filter(query_id=body['query_id']).aexists())
+
+    def test_worker_answers_and_status_endpoint_reports_it(self):
+        query = Query.objects.create(user=self.student, content='What courses am I enrolled in?')
+        ChatJob.objects.create(query=query)
+        url = f'/api/chat/{query.id}/'
+        headers = self.auth_headers(self.student)
+        self.assertEqual(self.client.get(url, headers=headers).json()['status'], 'pending')
+
+        claimed = claim_jobs('w1', 5)
+        self.assertEqual(claimed, [query.job.id])
+        self.assertEqual(claim_jobs('w2', 5), [])
+        run_job(claimed[0])
+
+        body = self.client.get(url, headers=headers).json()
+        self.assertEqual(body['status'], 'done')
+        self.assertIn('CS101', body['response']['response_text'])
+
+    def test_status_is_private_to_owner(self):
+        query = Query.objects.create(user=self.student, content='hi')
+        response = self.client.get(f'/api/chat/{query.id}/', headers=self.auth_headers(self.faculty))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(CHAT_JOBS={**settings.CHAT_JOBS, 'LEASE': 0, 'MAX_ATTEMPTS': 3})
+    def test_expired_lease_is_reclaimed(self):
+        query = Query.objects.create(user=self.student, content='hi')
+        ChatJob.objects.create(query=query)
+        self.assertEqual(len(claim_jobs('w1', 1)), 1)
+        self.assertEqual(len(claim_jobs('w2', 1)), 1)
+        self.assertEqual(ChatJob.objects.get().attempts, 2)
+        # A job that keeps killing its worker is given up after MAX_ATTEMPTS
+        self.assertEqual(len(claim_jobs('w3', 1)), 1)
+        self.assertEqual(claim_jobs('w4', 1), [])
+        job = ChatJob.objects.get()
+        self.assertEqual((job.status, job.attempts), (ChatJob.Status.FAILED, 3))
+
+
+class ChatStreamTests(ChatTestCase):
+
+    @staticmethod
+    def events(body):
+        """(event, data) pairs of an SSE body."""
+        parsed = []
+        for frame in body.decode().split('\n\n'):
+            if frame:
+                event, data = frame.split('\n')
+                parsed.append((event.removeprefix('event: '), json.loads(data.removeprefix('data: '))))
+        return parsed
+
+    async def stream(self, message):
+        response = await self.async_client.post(
+            '/api/chat/stream/', {'message': message}, content_type='application/json',
+            headers=await sync_to_async(self.auth_headers)(self.student),
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return self.events(b''.join([chunk async for chunk in response.streaming_content]))
+
+    async def test_events_are_framed_and_answer_stored(self):
+        events = await self.stream('tell me about recursion')
+        self.assertEqual([name for name, _ in events], ['query', 'delta', 'done'])
+        query_id = events[0][1]['query_id']
+        self.assertEqual(events[2][1]['query_id'], query_id)
+        self.assertEqual(events[2][1]['source'], 'demo')
+        response = await Response.objects.select_related('body').aget(query_id=query_id)
+        self.assertEqual(response.response_text, events[1][1]['content'])
+        self.assertFalse(response.is_partial)
+
+    @override_settings(OPENAI_API_KEY='sk-test')
+    async def test_provider_failure_mid_answer_is_partial(self):
+        async def broken():
+            yield SimpleNamespace(model='m', choices=[
+                SimpleNamespace(delta=SimpleNamespace(content='Recursion is')),
+            ])
+            raise ConnectionResetError('provider went away')
+
+        with mock.patch('chat.services.get_llm') as get_llm:
+            get_llm.return_value.acomplete = mock.AsyncMock(return_value=broken())
+            events = await self.stream('tell me about recursion')
+        self.assertEqual([name for name, _ in events], ['query', 'delta', 'error'])
+        response = await Response.objects.select_related('body').aget()
+        self.assertEqual((response.response_text, response.is_partial), ('Recursion is', True))
+        self.assertEqual(events[2][1]['response_id'], response.id)
+
+    async def test_client_disconnect_stores_partial_answer(self):
+        query = await Query.objects.acreate(user=self.student, content='tell me about recursion')
+        stream = ChatStreamView().event_stream(query, self.student)
+        self.assertEqual(self.events(await anext(stream))[0][0], 'query')
+        self.assertEqual(self.events(await anext(stream))[0][0], 'delta')
+        await stream.aclose()   # the client went away before "done"
+        response = await Response.objects.select_related('body').aget(query=query)
+        self.assertTrue(response.is_partial)
+        self.assertTrue(response.response_text)
+
+    def test_wsgi_gets_a_sync_iterator(self):
+        async def events(view, query, user):
+            yield view.sse('query', {'query_id': query.id})
+            yield view.sse('done', {'query_id': query.id})
+
+        with mock.patch.object(ChatStreamView, 'event_stream', events):
+            response = self.client.post(
+                '/api/chat/stream/', {'message': 'hi'}, content_type='application/json',
+                headers=self.auth_headers(self.student),
+            )
+            self.assertFalse(response.is_async)
+            body = b''.join(response.streaming_content)
+        self.assertEqual([name for name, _ in self.events(body)], ['query', 'done'])
+
+
+class SyncIteratorTests(TestCase):
+
+    def test_items_are_handed_over_as_produced(self):
+        second = threading.Event()
+        closed = []
+
+        async def produce():
+            try:
+                yield 1
+                await sync_to_async(second.wait)(5)
+                yield 2
+                yield 3
+            finally:
+                closed.append(True)
+
+        items = sync_iterator(produce())
+        self.assertEqual(next(items), 1)   # before the second item exists
+        second.set()
+        self.assertEqual(next(items), 2)
+        items.close()
+        for _ in range(50):
+            if closed:
+                break
+            time.sleep(0.01)
+        self.assertEqual(closed, [True])
+
+    def test_errors_are_raised_to_the_consumer(self):
+        async def produce():
+            yield 1
+            raise ValueError('boom')
+
+        items = sync_iterator(produce())
+        self.assertEqual(next(items), 1)
+        with self.assertRaises(ValueError):
+            next(items)
+
+
+class AdmissionControlTests(TestCase):
+
+    def user(self, pk, role='student'):
+        return User(pk=pk, username=f'u{pk}', role=role)
+
+    def test_faculty_and_other_students_go_before_a_burst(self):
+        controller = AdmissionController(max_concurrent=1, per_user=5, slo=5)
+        burst, other, prof = self.user(1), self.user(2), self.user(3, 'faculty')
+        holder = controller.acquire(burst)
+        order = []
+
+        def wait(user):
+            user_id = controller.acquire(user)
+            order.append(user.username)
+            controller.release(user_id, None)
+
+        threads = []
+        for user in (burst, burst, other, prof):
+            thread = threading.Thread(target=wait, args=(user,))
+            thread.start()
+            threads.append(thread)
+            while controller.stats()['queue_depth'] < len(threads):
+                threading.Event().wait(0.005)
+        controller.release(holder, None)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, ['u3', 'u1', 'u2', 'u1'])
+
+    def test_per_user_cap(self):
+        controller = AdmissionController(max_concurrent=4, per_user=1, slo=0.05)
+        student = self.user(1)
+        controller.acquire(student)
+        with self.assertRaises(LoadShed):
+            controller.acquire(student)
+        controller.acquire(self.user(2))
+        self.assertEqual(controller.stats()['shed'], 1)
+
+    def test_sheds_when_expected_wait_exceeds_slo(self):
+        controller = AdmissionController(max_concurrent=1, per_user=1, slo=1)
+        controller._service_time = 5
+        controller.acquire(self.user(1))
+        with self.assertRaises(LoadShed):
+            controller.acquire(self.user(2))
+        self.assertEqual(controller.stats()['queue_depth'], 0)
+
+    def test_async_waiter_is_granted_on_release(self):
+        controller = AdmissionController(max_concurrent=1, per_user=1, slo=5)
+
+        async def main():
+            async with controller.aslot(self.user(1)):
+                waiting = asyncio.create_task(controller.aacquire(self.user(2)))
+                await asyncio.sleep(0.01)
+                self.assertEqual(controller.stats()['queue_depth'], 1)
+            return await waiting
+
+        self.assertEqual(asyncio.run(main()), 2)
+        self.assertEqual(controller.stats()['in_flight'], 1)
+
+
+class IdempotencyTests(ChatTestCase):
+
+    async def post(self, message, key, **headers):
+        auth = await sync_to_async(self.auth_headers)(self.student)
+        return await self.async_client.post(
+            '/api/chat/', {'message': message}, content_type='application/json',
+            headers={**auth, 'Idempotency-Key': key, **headers},
+        )
+
+    async def test_retry_replays_stored_answer(self):
+        with mock.patch('chat.views.aget_ai_response', return_value='Answer') as generate:
+            first = await self.post('tell me about recursion', 'k1')
+            second = await self.post('tell me about recursion', 'k1')
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(await Query.objects.acount(), 1)
+
+    async def test_key_reused_for_other_message_is_rejected(self):
+        await self.post('hello', 'k2')
+        response = await self.post('something else', 'k2')
+        self.assertEqual(response.status_code, 422)
+
+    @override_settings(CHAT_IDEMPOTENCY={'WINDOW': 60, 'WAIT': 0, 'POLL_INTERVAL': 0})
+    async def test_queued_retry_gets_202(self):
+        query = await Query.objects.acreate(user=self.student, content='hello', idempotency_key='k3')
+        await ChatJob.objects.acreate(query=query)
+        response = await self.post('hello', 'k3')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(await Query.objects.acount(), 1)
+
+    @override_settings(CHAT_IDEMPOTENCY={'WINDOW': 60, 'WAIT': 5, 'POLL_INTERVAL': 0})
+    async def test_abandoned_query_is_answered_by_retry(self):
+        query = await Query.objects.acreate(user=self.student, content='hello', idempotency_key='k5')
+        await Query.objects.filter(pk=query.pk).aupdate(
+            timestamp=timezone.now() - timedelta(seconds=10),
+        )
+        with mock.patch('chat.views.aget_ai_response', return_value='Answer') as generate:
+            response = await self.post('hello', 'k5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['response'], 'Answer')
+        self.assertEqual(generate.call_count, 1)
+        stored = await Response.objects.select_related('body').aget(query=query)
+        self.assertEqual(stored.response_text, 'Answer')
+
+    @override_settings(CHAT_IDEMPOTENCY={'WINDOW': 0, 'WAIT': 0, 'POLL_INTERVAL': 0})
+    async def test_expired_key_starts_a_new_query(self):
+        await self.post('hello', 'k4')
+        response = await self.post('hello', 'k4')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await Query.objects.acount(), 2)
+
+
+@override_settings(CHAT_MEMORY={'ENABLED': True, 'TURNS': 2, 'TURN_TOKENS': 50, 'SUMMARY_TOKENS': 60})
+class ConversationMemoryTests(ChatTestCase):
+
+    def chat(self, question, answer):
+        with self.captureOnCommitCallbacks(execute=True):
+            query = Query.objects.create(user=self.student, content=question)
+            Response.objects.create(query=query, response_text=answer)
+
+    def test_recent_turns_verbatim_older_folded_into_summary(self):
+        for i in range(4):
+            self.chat(f'question {i} about CS101', f'Answer {i}. More detail follows.')
+        memory = load_memory(self.student)
+        self.assertEqual([q for q, _ in memory.turns],
+                         ['question 2 about CS101', 'question 3 about CS101'])
+        self.assertIn('Asked: question 1 about CS101 | Answered: Answer 1.', memory.summary)
+        self.assertNotIn('More detail', memory.summary)
+        self.assertEqual(ConversationMemory.objects.get().summarized_through,
+                         Query.objects.get(content='question 1 about CS101').id)
+
+    def test_summary_stays_within_budget(self):
+        for i in range(30):
+            self.chat(f'question number {i}', f'Answer number {i}. Details.')
+        self.assertFalse(ConversationMemory.objects.exists())   # nothing folded until needed
+        summary = load_memory(self.student).summary
+        self.assertEqual(ConversationMemory.objects.get().summary, summary)
+        self.assertLessEqual(estimate_tokens(summary), 60)
+        self.assertIn('question number 27', summary)
+
+    def test_follow_up_detection(self):
+        for message in ['and when is that due?', 'what does that mean?', 'Who teaches it?',
+                        'what about CS102?', 'Can you expand on your last answer please, with examples?']:
+            self.assertTrue(is_follow_up(message), message)
+        for message in ['hi there', 'is there an assignment due this week?',
+                        'What is due this week in CS101?',
+                        'Can you explain how recursion works and why it matters for algorithms?']:
+            self.assertFalse(is_follow_up(message), message)
+
+    def test_follow_up_prompt_carries_history(self):
+        self.chat('Tell me about the CS101 lab report', 'It is due Friday.')
+        self.assertTrue(is_follow_up('and when is that due?'))
+        self.assertFalse(is_follow_up('When is the CS101 lab report due?'))
+        prompt, key = get_prompt('and when is that due?', self.student)
+        contents = [m['content'] for m in prompt.messages]
+        self.assertIn('Tell me about the CS101 lab report', contents)
+        _, standalone_key = get_prompt('When is the CS101 lab report due?', self.student)
+        self.assertNotEqual(key, standalone_key)
+
+
+class ChatHistoryPaginationTests(ChatTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.headers = self.auth_headers(self.student)
+        for i in range(5):
+            query = Query.objects.create(user=self.student, content=f'q{i}')
+            Response.objects.create(query=query, response_text=f'a{i}')
+
+    def get(self, **params):
+        return self.client.get('/api/chat/history/', params, headers=self.headers).json()
+
+    def test_newest_page_then_older(self):
+        page = self.get(limit=2)
+        self.assertEqual([r['content'] for r in page['results']], ['q3', 'q4'])
+        self.assertIsNone(page['next'])
+        older = self.client.get(page['previous'], headers=self.headers).json()
+        self.assertEqual([r['content'] for r in older['results']], ['q1', 'q2'])
+
+    def test_since_returns_only_new_turns(self):
+        cursor = self.get()['cursor']
+        self.assertEqual(self.get(since=cursor)['results'], [])
+        pending = Query.objects.create(user=self.student, content='q5')
+        delta = self.get(since=cursor)
+        self.assertEqual([r['content'] for r in delta['results']], ['q5'])
+        # Unanswered turns are fetched again on the next sync
+        Response.objects.create(query=pending, response_text='a5')
+        again = self.get(since=delta['cursor'])
+        self.assertEqual(again['results'][0]['response']['response_text'], 'a5')
+
+    def test_failed_and_abandoned_turns_do_not_pin_cursor(self):
+        failed = Query.objects.create(user=self.student, content='q5')
+        ChatJob.objects.create(query=failed, status=ChatJob.Status.FAILED)
+        abandoned = Query.objects.create(user=self.student, content='q6')
+        Query.objects.filter(pk=abandoned.pk).update(timestamp=timezone.now() - timedelta(hours=1))
+        queued = Query.objects.create(user=self.student, content='q7')
+        ChatJob.objects.create(query=queued)
+        cursor = self.get()['cursor']
+        self.assertEqual([r['content'] for r in self.get(since=cursor)['results']], ['q7'])
+
+    def test_page_cost_is_independent_of_history_length(self):
+        cursor = self.get(limit=1)['cursor']
+        with self.assertNumQueries(2):   # auth user + one keyset scan
+            self.get(since=cursor, limit=2)
+        self.assertEqual(decode_cursor(cursor)[1], Query.objects.order_by('id').last().id)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/chat/history/', {'since': 'nope'}, headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+
+class ChatSearchTests(ChatTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.chat('How do I format the lab report?', 'Use the <IEEE> template for every lab report.')
+        self.chat('When is the CS101 quiz?', 'The quiz is on Monday.')
+        other = Query.objects.create(user=self.faculty, content='lab report rubric')
+        Response.objects.create(query=other, response_text='See the handbook.')
+
+    def chat(self, question, answer):
+        query = Query.objects.create(user=self.student, content=question)
+        Response.objects.create(query=query, response_text=answer)
+        return query
+
+    def test_ranked_highlighted_and_private(self):
+        hits = search_history(self.student, 'lab reports')
+        self.assertEqual(len(hits), 1)
+        self.assertIn('<mark>lab</mark> <mark>report</mark>', hits[0].question)
+        self.assertIn('&lt;IEEE&gt;', hits[0].answer)
+        self.assertIsNotNone(hits[0].timestamp)
+        # The user id is matched as a column, never as a search term
+        self.assertEqual(search_history(self.student, str(self.student.id)), [])
+
+    def test_matches_answers_and_tracks_edits(self):
+        self.assertEqual(len(search_history(self.student, 'monday')), 1)
+        response = Response.objects.get(query__content__contains='quiz')
+        response.response_text = 'The quiz moved to Tuesday.'
+        response.save()
+        self.assertEqual(search_history(self.student, 'monday'), [])
+        response.query.delete()
+        self.assertEqual(search_history(self.student, 'tuesday'), [])
+
+    def test_endpoint_paginates(self):
+        for i in range(3):
+            self.chat(f'exam question {i}', 'answer')
+        headers = self.auth_headers(self.student)
+        page = self.client.get('/api/chat/search/', {'q': 'exam', 'page_size': 2}, headers=headers).json()
+        self.assertEqual(len(page['results']), 2)
+        last = self.client.get(page['next'], headers=headers).json()
+        self.assertEqual(len(last['results']), 1)
+        self.assertIsNone(last['next'])
+        missing = self.client.get('/api/chat/search/', headers=headers)
+        self.assertEqual(missing.status_code, 400)
+
+    def test_postgres_indexes_each_chat_once(self):
+        backend = mock.Mock(spec=PostgresSearch, index_unanswered=PostgresSearch.index_unanswered)
+        with mock.patch('chat.search.get_backend', return_value=backend):
+            self.chat('When is the lab due?', 'Friday.')
+        backend.index.assert_called_once_with(mock.ANY, mock.ANY, self.student.id,
+                                              'When is the lab due?', 'Friday.')
+
+
+class ChatExportTests(ChatTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            query = Query.objects.create(user=self.student, content=f'q{i}')
+            Response.objects.create(query=query, response_text=f'a, "{i}"')
+        Query.objects.create(user=self.faculty, content='not mine')
+
+    def export(self, requester, **params):
+        response = self.client.get('/api/chat/export/', params, headers=self.auth_headers(requester))
+        return response, b''.join(response.streaming_content)
+
+    def test_ndjson_streams_own_rows(self):
+        response, body = self.export(self.student)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([r['question'] for r in rows], ['q0', 'q1', 'q2'])
+        self.assertEqual(rows[1]['answer'], 'a, "1"')
+
+    def test_gzipped_csv(self):
+        response, body = self.export(self.student, output='csv', gzip='1')
+        self.assertIn('.csv.gz', response['Content-Disposition'])
+        lines = gzip.decompress(body).decode().splitlines()
+        self.assertTrue(lines[0].startswith('query_id,user_id,username,question'))
+        self.assertEqual(len(lines), 4)
+        self.assertIn('"a, ""0"""', lines[1])
+
+    def test_admin_exports_everyone(self):
+        admin = User.objects.create_user('admin', password='x', role='admin')
+        _, body = self.export(admin)
+        self.assertEqual(len(body.decode().splitlines()), 4)
+        _, body = self.export(admin, user=self.faculty.id)
+        self.assertEqual(len(body.decode().splitlines()), 1)
+        invalid = self.client.get('/api/chat/export/', {'user': 'abc'}, headers=self.auth_headers(admin))
+        self.assertEqual(invalid.status_code, 400)
+
+    def test_csv_neutralizes_formulas(self):
+        Query.objects.create(user=self.student, content='=HYPERLINK("http://x")')
+        Query.objects.create(user=self.student, content='-2+3')
+        _, body = self.export(self.student, output='csv')
+        lines = body.decode().splitlines()
+        self.assertIn("'=HYPERLINK(", lines[4])
+        self.assertIn(",'-2+3,", lines[5])
+
+    async def test_asgi_streams_async_iterator(self):
+        headers = await sync_to_async(self.auth_headers)(self.student)
+        response = await self.async_client.get('/api/chat/export/', headers=headers)
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([r['question'] for r in rows], ['q0', 'q1', 'q2'])
+
+
+class RetentionTests(ChatTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for i in range(5):
+            query = Query.objects.create(user=self.student, content=f'old {i}')
+            Response.objects.create(query=query, response_text=f'answer {i}')
+        Query.objects.update(timestamp=timezone.now() - timedelta(days=400))
+        Query.objects.create(user=self.student, content='recent')
+        self.cutoff = timezone.now() - timedelta(days=365)
+
+    def test_archives_then_deletes_in_batches(self):
+        archive = Archive(self.tmp.name)
+        batches = list(purge(self.cutoff, archive, batch_size=2))
+        self.assertEqual([b.deleted for b in batches], [2, 2, 1])
+        self.assertEqual(list(Query.objects.values_list('content', flat=True)), ['recent'])
+        self.assertFalse(Response.objects.exists())
+        with gzip.open(archive.path, 'rt') as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([r['question'] for r in rows], [f'old {i}' for i in range(5)])
+        self.assertEqual(rows[0]['answer'], 'answer 0')
+        self.assertEqual(search_history(self.student, 'old'), [])
+
+    def test_resume_does_not_archive_twice(self):
+        archive = Archive(self.tmp.name)
+        first_ids = list(Query.objects.order_by('id').values_list('id', flat=True)[:2])
+        # A previous run archived this batch but died before deleting it
+        archive.append([{'query_id': pk} for pk in first_ids], first_ids[-1])
+        list(purge(self.cutoff, archive, batch_size=2))
+        with gzip.open(archive.path, 'rt') as f:
+            archived = [json.loads(line)['query_id'] for line in f]
+        self.assertEqual(len(archived), len(set(archived)))
+        self.assertEqual(Query.objects.count(), 1)
+
+    def test_batches_larger_than_an_in_list(self):
+        with mock.patch('chat.retention.IN_LIST_SIZE', 2):
+            batches = list(purge(self.cutoff, Archive(self.tmp.name), batch_size=5))
+        self.assertEqual([b.deleted for b in batches], [5])
+        self.assertFalse(ResponseBody.objects.exists())
+
+    def test_command_reports_throughput(self):
+        out = io.StringIO()
+        call_command('purge_chat_history', archive_dir=self.tmp.name, batch_size=2, stdout=out)
+        self.assertIn('Purged 5 queries (5 archived', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+
+
+class ResponseBodyTests(ChatTestCase):
+
+    @override_settings(CHAT_RESPONSE_STORE={'COMPRESS_MIN_BYTES': 64})
+    def test_identical_answers_share_one_compressed_body(self):
+        text = 'Office hours are Tuesdays 2-4pm in room 101. ' * 10
+        for i in range(3):
+            query = Query.objects.create(user=self.student, content=f'office hours {i}')
+            Response.objects.create(query=query, response_text=text)
+        body = ResponseBody.objects.get()
+        self.assertTrue(body.compressed)
+        self.assertLess(len(bytes(body.data)), body.size)
+        self.assertEqual(body.size, len(text.encode()))
+        self.assertEqual(Response.objects.select_related('body').first().response_text, text)
+
+    def test_serialized_history_is_unchanged(self):
+        query = Query.objects.create(user=self.student, content='hi')
+        Response.objects.create(query=query, response_text='Hello!')
+        res = self.client.get('/api/chat/history/', headers=self.auth_headers(self.student))
+        self.assertEqual(res.json()['results'][0]['response']['response_text'], 'Hello!')
+        self.assertFalse(ResponseBody.objects.get().compressed)
+
+    def test_purge_keeps_shared_bodies(self):
+        old = Query.objects.create(user=self.student, content='old')
+        Response.objects.create(query=old, response_text='Same answer.')
+        Response.objects.create(
+            query=Query.objects.create(user=self.student, content='new'),
+            response_text='Same answer.',
+        )
+        Response.objects.create(
+            query=Query.objects.create(user=self.student, content='other'),
+            response_text='Unique answer.',
+        )
+        Query.objects.exclude(content='new').update(timestamp=timezone.now() - timedelta(days=400))
+        list(purge(timezone.now() - timedelta(days=365)))
+        self.assertEqual(list(ResponseBody.objects.values_list('size', flat=True)), [12])
+
+    def test_admin_change_form_does_not_list_every_body(self):
+        query = Query.objects.create(user=self.student, content='hi')
+        response = Response.objects.create(query=query, response_text='Hello!')
+        admin = User.objects.create_superuser('root', password='x', role='admin')
+        self.client.force_login(admin)
+        page = self.client.get(f'/admin/chat/response/{response.pk}/change/')
+        self.assertEqual(page.status_code, 200)
+        self.assertNotContains(page, '<select name="body"')
+        self.assertContains(page, 'name="body"')
+
+
+class MetricsTests(ChatTestCase):
+
+    def test_chat_request_is_instrumented(self):
+        routed = ANSWERS.value('routed')
+        chats = REQUEST_DB_QUERIES.value('chat')[0]
+        res = self.client.post(
+            '/api/chat/', {'message': 'hello'}, content_type='application/json',
+            headers=self.auth_headers(self.student),
+        )
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(ANSWERS.value('routed'), routed + 1)
+        count, queries = REQUEST_DB_QUERIES.value('chat')
+        self.assertEqual(count, chats + 1)
+        self.assertGreater(queries, 0)
+        self.assertGreater(STAGE_SECONDS.value('save_response')[0], 0)
+
+    def test_endpoint_is_admin_only_prometheus_text(self):
+        res = self.client.get('/api/metrics/', headers=self.auth_headers(self.student))
+        self.assertEqual(res.status_code, 403)
+        admin = User.objects.create_user('admin', password='x', role='admin')
+        res = self.client.get('/api/metrics/', headers=self.auth_headers(admin))
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = res.content.decode()
+        self.assertIn('# TYPE unibot_http_request_seconds histogram', body)
+        self.assertIn('unibot_admission_in_flight ', body)
+        self.assertIn('unibot_answer_cache_hits_total ', body)
+
+    def test_histogram_exposition(self):
+        histogram = Histogram('test_seconds', 'Test.', ['stage'], buckets=(0.1, 1))
+        histogram.observe(0.05, 'a')
+        histogram.observe(0.5, 'a')
+        self.assertEqual(histogram.samples(), [
+            'test_seconds_bucket{stage="a",le="0.1"} 1',
+            'test_seconds_bucket{stage="a",le="1.0"} 2',
+            'test_seconds_bucket{stage="a",le="+Inf"} 2',
+            'test_seconds_sum{stage="a"} 0.55',
+            'test_seconds_count{stage="a"} 2',
+        ])
+
+
+class UsageTelemetryTests(ChatTestCase):
+
+    @override_settings(OPENAI_API_KEY='sk-test')
+    def test_llm_answer_records_telemetry(self):
+        completion = mock.Mock(
+            model='gpt-3.5-turbo-0125',
+            usage=mock.Mock(prompt_tokens=120, completion_tokens=30),
+            choices=[mock.Mock(message=mock.Mock(content='Recursion is ...'))],
+        )
+        with mock.patch('chat.services.get_llm') as get_llm:
+            get_llm.return_value.acomplete = mock.AsyncMock(return_value=completion)
+            res = self.client.post(
+                '/api/chat/', {'message': 'Explain recursion with an example'},
+                content_type='application/json', headers=self.auth_headers(self.student),
+            )
+        self.assertEqual(res.json()['response'], 'Recursion is ...')
+        response = Response.objects.get()
+        self.assertEqual(response.source, Response.Source.LLM)
+        self.assertEqual(response.model, 'gpt-3.5-turbo-0125')
+        self.assertEqual((response.prompt_tokens, response.completion_tokens), (120, 30))
+        self.assertIsNotNone(response.latency_ms)
+        self.assertGreater(response.context_tokens, 0)
+
+    def test_daily_rollup_and_report(self):
+        for latency in (100, 300):
+            Response.objects.create(
+                query=Query.objects.create(user=self.student, content='q'),
+                response_text='a', source='llm', model='gpt-3.5-turbo-0125',
+                prompt_tokens=1000, completion_tokens=500, latency_ms=latency,
+            )
+        Response.objects.create(
+            query=Query.objects.create(user=self.student, content='hi'),
+            response_text='Hello!', source='routed',
+        )
+        today = timezone.localdate()
+        self.assertEqual(rollup_day(today), 2)
+        self.assertEqual(rollup_day(today), 2)   # idempotent
+        self.assertEqual(ChatUsageDaily.objects.count(), 2)
+
+        [llm] = usage_report(today, today, ['model', 'source'])[1:]
+        self.assertEqual(llm['responses'], 2)
+        self.assertEqual(llm['avg_latency_ms'], 200)
+        self.assertEqual(llm['max_latency_ms'], 300)
+        # 2000 prompt tokens at $0.5/M + 1000 completion tokens at $1.5/M
+        self.assertEqual(llm['estimated_cost'], 0.0025)
+
+        res = self.client.get('/api/chat/usage/', headers=self.auth_headers(self.student))
+        self.assertEqual(res.status_code, 403)
+        admin = User.objects.create_user('admin', password='x', role='admin')
+        res = self.client.get(
+            '/api/chat/usage/', {'group_by': 'user'}, headers=self.auth_headers(admin),
+        )
+        self.assertEqual(res.json()['results'][0]['responses'], 3)
+        res = self.client.get(
+            '/api/chat/usage/', {'group_by': 'course'}, headers=self.auth_headers(admin),
+        )
+        self.assertEqual(res.status_code, 400)
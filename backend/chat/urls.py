@@ -3,5 +3,10 @@ from . import views
 
 urlpatterns = [
     path('', views.ChatView.as_view(), name='chat'),
+    path('stream/', views.ChatStreamView.as_view(), name='chat-stream'),
+    path('<int:pk>/', views.ChatDetailView.as_view(), name='chat-detail'),
     path('history/', views.ChatHistoryView.as_view(), name='chat-history'),
+    path('search/', views.ChatSearchView.as_view(), name='chat-search'),
+    path('export/', views.ChatExportView.as_view(), name='chat-export'),
+    path('usage/', views.ChatUsageView.as_view(), name='chat-usage'),
 ]
@@ -0,0 +1,138 @@
+"""
+Daily usage rollups and cost reports.
+
+rollup_day() aggregates one local day of responses into ChatUsageDaily
+with a single grouped query over the responses timestamp index, replacing
+whatever that day had before, so reruns are idempotent. Reports only read
+the rollup rows.
+
+Raw rows older than the retention horizon may already be purged, so days
+before it are never rebuilt (their rollups are kept as they are).
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ChatUsageDaily, Response
+
+REPORT_DIMENSIONS = ('day', 'user', 'model', 'source')
+
+_TOTALS = (
+    'responses', 'partial', 'prompt_tokens', 'completion_tokens', 'context_tokens',
+    'llm_calls', 'latency_ms', 'streamed', 'ttft_ms',
+)
+
+
+def day_bounds(day):
+    """[start, end) of a calendar day in the project time zone."""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def oldest_rebuildable_day():
+    horizon = timezone.localtime() - timedelta(days=settings.CHAT_RETENTION['DAYS'])
+    return horizon.date() + timedelta(days=1)
+
+
+def rollup_day(day):
+    """Rebuild the rollup rows for one day; returns how many were written."""
+    start, end = day_bounds(day)
+    groups = Response.objects.filter(timestamp__gte=start, timestamp__lt=end).values(
+        'model', 'source', owner=F('query__user_id'),
+    ).annotate(
+        n_responses=Count('id'),
+        n_partial=Count('id', filter=Q(is_partial=True)),
+        sum_prompt=Coalesce(Sum('prompt_tokens'), 0),
+        sum_completion=Coalesce(Sum('completion_tokens'), 0),
+        sum_context=Coalesce(Sum('context_tokens'), 0),
+        n_llm=Count('latency_ms'),
+        sum_latency=Coalesce(Sum('latency_ms'), 0),
+        max_latency=Coalesce(Max('latency_ms'), 0),
+        n_streamed=Count('ttft_ms'),
+        sum_ttft=Coalesce(Sum('ttft_ms'), 0),
+    ).order_by()
+    rows = [
+        ChatUsageDaily(
+            day=day, user_id=g['owner'], model=g['model'], source=g['source'],
+            responses=g['n_responses'], partial=g['n_partial'],
+            prompt_tokens=g['sum_prompt'], completion_tokens=g['sum_completion'],
+            context_tokens=g['sum_context'], llm_calls=g['n_llm'],
+            latency_ms=g['sum_latency'], max_latency_ms=g['max_latency'],
+            streamed=g['n_streamed'], ttft_ms=g['sum_ttft'],
+        )
+        for g in groups
+    ]
+    with transaction.atomic():
+        ChatUsageDaily.objects.filter(day=day).delete()
+        ChatUsageDaily.objects.bulk_create(rows)
+    return len(rows)
+
+
+def rollup(first_day, last_day):
+    """Rebuild every day in [first_day, last_day]; yields (day, rows)."""
+    day = max(first_day, oldest_rebuildable_day())
+    while day <= last_day:
+        yield day, rollup_day(day)
+        day += timedelta(days=1)
+
+
+def estimated_cost(model, prompt_tokens, completion_tokens):
+    """
+    USD from CHAT_USAGE PRICES (per million tokens), or None if unpriced.
+    Dated snapshots ("gpt-3.5-turbo-0125") use the price of the longest
+    configured name they start with.
+    """
+    prices = settings.CHAT_USAGE['PRICES']
+    price = prices.get(model)
+    if price is None:
+        matches = [name for name in prices if model.startswith(name)]
+        if not matches:
+            return None
+        price = prices[max(matches, key=len)]
+    prompt_price, completion_price = price
+    return round((prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6, 6)
+
+
+def usage_report(first_day, last_day, group_by=('day', 'model')):
+    """Totals per group over rollup rows, with averages and estimated cost."""
+    fields = ['user_id' if d == 'user' else d for d in group_by]
+    rows = ChatUsageDaily.objects.filter(day__gte=first_day, day__lte=last_day)
+    # Tokens are priced per model, so groups are split by model and merged below
+    keys = fields if 'model' in fields else [*fields, 'model']
+    groups = rows.values(*keys).annotate(
+        **{f'total_{name}': Sum(name) for name in _TOTALS},
+        peak_latency_ms=Max('max_latency_ms'),
+    ).order_by(*keys)
+
+    report = {}
+    for g in groups:
+        key = tuple(g[f] for f in fields)
+        entry = report.get(key)
+        if entry is None:
+            entry = report[key] = {
+                **{('user' if f == 'user_id' else f): g[f] for f in fields},
+                **{name: 0 for name in _TOTALS},
+                'max_latency_ms': 0,
+                'estimated_cost': None,
+            }
+        for name in _TOTALS:
+            entry[name] += g[f'total_{name}'] or 0
+        entry['max_latency_ms'] = max(entry['max_latency_ms'], g['peak_latency_ms'] or 0)
+        cost = estimated_cost(g['model'], g['total_prompt_tokens'] or 0,
+                              g['total_completion_tokens'] or 0)
+        if cost is not None:
+            entry['estimated_cost'] = round((entry['estimated_cost'] or 0) + cost, 6)
+
+    results = []
+    for entry in report.values():
+        entry['avg_latency_ms'] = (
+            round(entry['latency_ms'] / entry['llm_calls']) if entry['llm_calls'] else None
+        )
+        entry['avg_ttft_ms'] = round(entry['ttft_ms'] / entry['streamed']) if entry['streamed'] else None
+        results.append(entry)
+    return results
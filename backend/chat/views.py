@@ -2,64 +2,484 @@
 Views for the chat API.
 """
 
-from rest_framework import permissions, status, generics
+import asyncio
+import time
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, permissions, status, generics
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
 from rest_framework.response import Response as DRFResponse
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
-from .models import Query, Response
+from unibot_backend.export import ITERATOR_CHUNK_SIZE, export_options, export_response
+from unibot_backend.metrics import IsAdminOrStaff, timed
+from unibot_backend.streaming import is_asgi, sync_iterator
+
+from .jobs import aenqueue_job
+from .models import ChatJob, Query, Response, with_answers
+from .pagination import ChatHistoryPagination, SearchPagination
+from .search import SearchResults
 from .serializers import (
     ChatRequestSerializer,
     ChatHistorySerializer,
+    ChatSearchResultSerializer,
+    ChatStatusSerializer,
 )
-from .services import get_ai_response
+from .services import aget_ai_response, astream_ai_response
+from .telemetry import collect
+from .usage import REPORT_DIMENSIONS, usage_report
+
 
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAPIView(View):
+    """
+    Minimal async counterpart of DRF's APIView.
 
-class ChatView(APIView):
+    DRF dispatch is synchronous, so native async handlers run on a plain
+    Django View. Authentication, permissions, throttling and parsing still
+    go through the configured DRF classes (in a thread, since they may hit
+    the DB), and responses are rendered with DRF's JSON renderer so the wire
+    format matches the rest of the API. Handlers receive the DRF Request.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+
+    async def dispatch(self, request, *args, **kwargs):
+        drf_request = Request(
+            request,
+            parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+            authenticators=[
+                auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+            ],
+        )
+        try:
+            with timed('auth'):
+                await sync_to_async(self.initial)(drf_request)
+            handler = getattr(
+                self, request.method.lower(), self.http_method_not_allowed
+            )
+            return await handler(drf_request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.handle_exception(drf_request, exc)
+
+    def initial(self, request):
+        for permission in [perm() for perm in self.permission_classes]:
+            if not permission.has_permission(request, self):
+                if request.authenticators and not request.successful_authenticator:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied()
+        self.check_throttles(request)
+
+    def check_throttles(self, request):
+        """Same as APIView.check_throttles."""
+        durations = [
+            throttle.wait() for throttle in [t() for t in self.throttle_classes]
+            if not throttle.allow_request(request, self)
+        ]
+        if durations:
+            durations = [d for d in durations if d is not None]
+            raise exceptions.Throttled(max(durations, default=None))
+
+    async def http_method_not_allowed(self, request, *args, **kwargs):
+        raise exceptions.MethodNotAllowed(request.method)
+
+    def handle_exception(self, request, exc):
+        """Mirror DRF's default exception handler for API exceptions."""
+        status_code = exc.status_code
+        auth_header = None
+        if isinstance(exc, (exceptions.NotAuthenticated,
+                            exceptions.AuthenticationFailed)):
+            if request.authenticators:
+                auth_header = request.authenticators[0].authenticate_header(request)
+            if not auth_header:
+                status_code = status.HTTP_403_FORBIDDEN
+
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {'detail': exc.detail}
+
+        response = self.render(data, status_code)
+        if auth_header:
+            response['WWW-Authenticate'] = auth_header
+        if getattr(exc, 'wait', None):
+            response['Retry-After'] = '%d' % exc.wait
+        return response
+
+    def render(self, data, status_code=status.HTTP_200_OK):
+        return HttpResponse(
+            JSONRenderer().render(data),
+            content_type='application/json',
+            status=status_code,
+        )
+
+
+class ChatView(AsyncAPIView):
     """
     POST /api/chat/
     Accepts a natural language message, sends it to OpenAI with course context,
     and returns the answer while persisting both Query and Response.
+
+    Fully async: served through unibot_backend/asgi.py, a single process
+    keeps many chats in flight while waiting on the LLM provider.
+
+    Job mode ("mode": "job" or a "Prefer: respond-async" header) only
+    queues the query and returns 202 with its id; the answer is generated
+    by `manage.py run_chat_workers` and polled at /api/chat/<query_id>/.
+
+    With an Idempotency-Key header, a repeat of the same request within
+    CHAT_IDEMPOTENCY['WINDOW'] replays the stored answer (waiting for it
+    if the first attempt is still generating) instead of calling the LLM
+    again; a query left unanswered for CHAT_IDEMPOTENCY['WAIT'] seconds
+    without a job is answered by the retry.
+
+    Freshly generated answers carry an X-Answer-Source header saying how
+    they were produced (llm, cache, routed, ...; see Response.Source).
     """
-    permission_classes = [permissions.IsAuthenticated]
 
-    def post(self, request):
+    async def post(self, request):
         serializer = ChatRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         user_message = serializer.validated_data['message']
+        key = self.idempotency_key(request)
+        if key is not None:
+            replayed = await self.replay(request.user, key, user_message)
+            if replayed is not None:
+                return replayed
 
         # 1. Save the student's query
-        query = Query.objects.create(
-            user=request.user,
-            content=user_message,
-        )
+        try:
+            with timed('save_query'):
+                query = await Query.objects.acreate(
+                    user=request.user,
+                    content=user_message,
+                    idempotency_key=key,
+                )
+        except IntegrityError:
+            # A concurrent retry with the same key got there first
+            replayed = await self.replay(request.user, key, user_message)
+            if replayed is None:
+                raise exceptions.APIException('Could not store the query; please retry.')
+            return replayed
 
+        if self.job_mode(request, serializer.validated_data):
+            await aenqueue_job(query)
+            return self.accepted(query)
+
+        return await self.answer(query, request.user)
+
+    async def answer(self, query, user):
         # 2. Get AI response (with course context)
-        ai_text = get_ai_response(user_message, request.user)
+        with collect() as telemetry:
+            ai_text = await aget_ai_response(query.content, user)
 
-        # 3. Save the response
-        response_obj = Response.objects.create(
-            query=query,
-            response_text=ai_text,
-        )
+        # 3. Save the response (unless a retry that took over the query
+        # already has)
+        with timed('save_response'):
+            await Response.objects.aget_or_create(query=query, defaults={
+                'response_text': ai_text,
+                **telemetry.fields(),
+            })
 
-        return DRFResponse({
+        response = self.answered(query, ai_text)
+        if telemetry.source:
+            response['X-Answer-Source'] = telemetry.source
+        return response
+
+    def answered(self, query, text):
+        return self.render({
+            'query_id': query.id,
+            'message': query.content,
+            'response': text,
+            'timestamp': query.timestamp,
+        }, status.HTTP_200_OK)
+
+    def accepted(self, query):
+        response = self.render({
             'query_id': query.id,
-            'message': user_message,
-            'response': ai_text,
+            'message': query.content,
+            'status': ChatJob.Status.PENDING,
             'timestamp': query.timestamp,
-        }, status=status.HTTP_200_OK)
+        }, status.HTTP_202_ACCEPTED)
+        response['Location'] = reverse('chat-detail', args=[query.id])
+        return response
+
+    @staticmethod
+    def job_mode(request, data):
+        mode = data.get('mode')
+        if mode is None and 'respond-async' in request.headers.get('Prefer', ''):
+            mode = 'job'
+        return (mode or settings.CHAT_JOBS['DEFAULT_MODE']) == 'job'
+
+    @staticmethod
+    def idempotency_key(request):
+        key = request.headers.get('Idempotency-Key')
+        if key is None:
+            return None
+        key = key.strip()
+        if not key or len(key) > Query._meta.get_field('idempotency_key').max_length:
+            raise exceptions.ValidationError(
+                {'Idempotency-Key': 'Must be 1-255 characters.'}
+            )
+        return key
+
+    async def replay(self, user, key, user_message):
+        """
+        The response for an earlier request with this key, or None if the
+        key is unused (or its window has passed, which frees it).
+        """
+        config = settings.CHAT_IDEMPOTENCY
+        query = await Query.objects.filter(user=user, idempotency_key=key).afirst()
+        if query is None:
+            return None
+        if query.timestamp < timezone.now() - timedelta(seconds=config['WINDOW']):
+            await Query.objects.filter(pk=query.pk).aupdate(idempotency_key=None)
+            return None
+        if query.content != user_message:
+            return self.render(
+                {'detail': 'Idempotency-Key was already used for a different message.'},
+                status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+
+        # The first attempt may still be generating: wait for it in sync
+        # mode; job-mode queries are polled by the client instead. A sync
+        # query still unanswered WAIT seconds after it was asked has been
+        # abandoned (its request was cancelled or died), so this retry
+        # answers it.
+        age = (timezone.now() - query.timestamp).total_seconds()
+        deadline = time.monotonic() + config['WAIT'] - age
+        is_job = await ChatJob.objects.filter(query=query).aexists()
+        while True:
+            stored = await Response.objects.filter(query=query).select_related('body').afirst()
+            if stored is not None:
+                response = self.answered(query, stored.response_text)
+                break
+            if is_job:
+                response = self.accepted(query)
+                break
+            if time.monotonic() >= deadline:
+                response = await self.answer(query, user)
+                break
+            await asyncio.sleep(config['POLL_INTERVAL'])
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+
+class ChatStreamView(AsyncAPIView):
+    """
+    POST /api/chat/stream/
+    Streaming variant of ChatView. Completion deltas are forwarded as
+    Server-Sent Events while the model is still generating:
+
+        event: query  -> {"query_id", "message", "timestamp"}
+        event: delta  -> {"content"}
+        event: done   -> {"query_id", "response_id", "source"}
+        event: error  -> {"query_id", "response_id", "detail"}
+
+    The Response row is written once the stream completes. If the provider
+    fails mid-answer (an "error" event instead of "done") or the client
+    disconnects first, whatever was generated so far is stored with
+    is_partial=True. Under WSGI the events are handed over through
+    unibot_backend.streaming.sync_iterator, so they still stream.
+    """
+
+    async def post(self, request):
+        serializer = ChatRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        user_message = serializer.validated_data['message']
+        query = await Query.objects.acreate(
+            user=request.user,
+            content=user_message,
+        )
+
+        events = self.event_stream(query, request.user)
+        response = StreamingHttpResponse(
+            events if is_asgi(request) else sync_iterator(events),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def event_stream(self, query, user):
+        chunks = []
+        stored = False   # set before saving, so a failed save is not retried
+
+        async def store(partial):
+            nonlocal stored
+            stored = True
+            return await Response.objects.acreate(
+                query=query,
+                response_text=''.join(chunks),
+                is_partial=partial,
+                **telemetry.fields(),
+            )
+
+        with collect() as telemetry:
+            try:
+                yield self.sse('query', {
+                    'query_id': query.id,
+                    'message': query.content,
+                    'timestamp': query.timestamp,
+                })
+
+                try:
+                    async for delta in astream_ai_response(query.content, user):
+                        chunks.append(delta)
+                        yield self.sse('delta', {'content': delta})
+                except Exception:
+                    # The provider failed mid-answer: keep what was sent
+                    response_obj = await store(partial=True)
+                    yield self.sse('error', {
+                        'query_id': query.id,
+                        'response_id': response_obj.id,
+                        'detail': 'The answer was interrupted; please retry.',
+                    })
+                    return
+
+                response_obj = await store(partial=False)
+                yield self.sse('done', {
+                    'query_id': query.id,
+                    'response_id': response_obj.id,
+                    'source': telemetry.source,
+                })
+            finally:
+                if not stored:
+                    # Client went away mid-stream: keep what we have
+                    await asyncio.shield(store(partial=True))
+
+    @staticmethod
+    def sse(event, data):
+        return b'event: ' + event.encode() + b'\ndata: ' + JSONRenderer().render(data) + b'\n\n'
+
+
+class ChatDetailView(generics.RetrieveAPIView):
+    """
+    GET /api/chat/<query_id>/
+    Status of one of the user's queries and, once ready, its response.
+    """
+    serializer_class = ChatStatusSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Query.objects.filter(
+            user=self.request.user
+        ).select_related('response__body', 'job')
 
 
 class ChatHistoryView(generics.ListAPIView):
     """
     GET /api/chat/history/
-    Returns the authenticated user's chat history.
+    Returns the authenticated user's chat history, newest page first,
+    keyset-paginated (see chat.pagination). `?since=<cursor>` returns only
+    turns added after a previous fetch.
     """
     serializer_class = ChatHistorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ChatHistoryPagination
 
     def get_queryset(self):
         return Query.objects.filter(
             user=self.request.user
-        ).select_related('response').order_by('timestamp')
+        ).select_related('response__body', 'job')
+
+
+class ChatSearchView(generics.ListAPIView):
+    """
+    GET /api/chat/search/?q=lab+report
+    Full-text search over the user's questions and answers, best match
+    first, with highlighted snippets (see chat.search).
+    """
+    serializer_class = ChatSearchResultSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SearchPagination
+
+    def get_queryset(self):
+        text = self.request.query_params.get('q', '').strip()
+        if not text:
+            raise exceptions.ValidationError({'q': 'This parameter is required.'})
+        return SearchResults(self.request.user, text)
+
+
+class ChatExportView(APIView):
+    """
+    GET /api/chat/export/?output=ndjson|csv&gzip=1
+    Streams the user's questions and answers as a download. Admins export
+    every user's chats, or one user's with ?user=<id>.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    fields = [
+        'query_id', 'user_id', 'username', 'question', 'asked_at',
+        'answer', 'is_partial', 'answered_at',
+    ]
+
+    def get(self, request):
+        output, compress = export_options(request)
+        queries = Query.objects.all()
+        if request.user.is_admin_role or request.user.is_staff:
+            user_id = request.query_params.get('user')
+            if user_id:
+                if not user_id.isdigit():
+                    raise exceptions.ValidationError({'user': 'Must be a user id.'})
+                queries = queries.filter(user_id=int(user_id))
+        else:
+            queries = queries.filter(user=request.user)
+        rows = queries.order_by('id').values(
+            'user_id',
+            query_id=F('id'),
+            username=F('user__username'),
+            question=F('content'),
+            asked_at=F('timestamp'),
+            answer_data=F('response__body__data'),
+            answer_compressed=F('response__body__compressed'),
+            is_partial=F('response__is_partial'),
+            answered_at=F('response__timestamp'),
+        ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        return export_response(
+            request, with_answers(rows), self.fields, 'chat-history', output, compress,
+        )
+
+
+class ChatUsageView(APIView):
+    """
+    GET /api/chat/usage/?from=YYYY-MM-DD&to=YYYY-MM-DD&group_by=day,model
+    Token, latency and estimated cost totals from the daily rollups
+    (`manage.py rollup_chat_usage`). Admins only. group_by takes any of
+    day, user, model, source; the default range is the last 30 days.
+    """
+    permission_classes = [IsAdminOrStaff]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            last = date.fromisoformat(params['to']) if 'to' in params else timezone.localdate()
+            first = (date.fromisoformat(params['from']) if 'from' in params
+                     else last - timedelta(days=29))
+        except ValueError:
+            raise exceptions.ValidationError({'detail': 'Dates must be YYYY-MM-DD.'})
+        group_by = [d for d in params.get('group_by', 'day,model').split(',') if d]
+        unknown = set(group_by) - set(REPORT_DIMENSIONS)
+        if unknown or not group_by:
+            raise exceptions.ValidationError(
+                {'group_by': f"Choose from: {', '.join(REPORT_DIMENSIONS)}."}
+            )
+        return DRFResponse({
+            'from': first,
+            'to': last,
+            'group_by': group_by,
+            'results': usage_report(first, last, group_by),
+        })
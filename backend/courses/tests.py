@@ -1,3 +1,31 @@
 from django.test import TestCase
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from accounts.models import User
+from .models import Feedback
+
+
+class FeedbackExportTests(TestCase):
+
+    def setUp(self):
+        self.student = User.objects.create_user('student', password='x')
+        self.admin = User.objects.create_user('admin', password='x', role='admin')
+        Feedback.objects.create(user=self.student, comment='Helpful', rating=5)
+        Feedback.objects.create(user=self.admin, comment='Fine', rating=4)
+
+    def export(self, user):
+        token = RefreshToken.for_user(user).access_token
+        response = self.client.get(
+            '/api/courses/feedback/export/', {'output': 'csv'},
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_students_export_their_own_feedback(self):
+        lines = self.export(self.student)
+        self.assertEqual(lines[0], 'id,user_id,username,rating,comment,created_at')
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Helpful', lines[1])
+
+    def test_admins_export_all_feedback(self):
+        self.assertEqual(len(self.export(self.admin)), 3)
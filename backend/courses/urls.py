@@ -8,4 +8,5 @@ urlpatterns = [
     path('faculty/update-syllabus/', views.UpdateSyllabusView.as_view(), name='update-syllabus'),
     path('faculty/assignments/', views.FacultyAssignmentsView.as_view(), name='faculty-assignments'),
     path('feedback/', views.FeedbackView.as_view(), name='feedback'),
+    path('feedback/export/', views.FeedbackExportView.as_view(), name='feedback-export'),
 ]
@@ -5,8 +5,11 @@ Views for courses, enrollment, assignments, and feedback.
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.db.models import F
 from django.shortcuts import get_object_or_404
 
+from unibot_backend.export import ITERATOR_CHUNK_SIZE, export_options, export_response
+
 from .models import Course, Enrollment, Assignment, Feedback
 from .serializers import (
     CourseSerializer,
@@ -123,3 +126,23 @@ class FeedbackView(generics.ListCreateAPIView):
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+
+
+class FeedbackExportView(APIView):
+    """
+    GET /api/courses/feedback/export/?output=ndjson|csv&gzip=1
+    Streams the user's feedback; admins export everyone's.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    fields = ['id', 'user_id', 'username', 'rating', 'comment', 'created_at']
+
+    def get(self, request):
+        output, compress = export_options(request)
+        feedback = Feedback.objects.all()
+        if not (request.user.is_admin_role or request.user.is_staff):
+            feedback = feedback.filter(user=request.user)
+        rows = feedback.order_by('id').values(
+            'id', 'user_id', 'rating', 'comment', 'created_at',
+            username=F('user__username'),
+        ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        return export_response(request, rows, self.fields, 'feedback', output, compress)
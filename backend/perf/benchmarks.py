@@ -0,0 +1,201 @@
+"""
+Endpoint benchmarks against whatever data is loaded (see generate_dataset).
+
+Each scenario is one request (or service call) made as a representative
+user through the in-process test client, so the whole Django stack runs —
+middleware, JWT auth, views, serializers — without network noise. A run
+reports latency percentiles, serial throughput and the number of SQL
+queries per call, and can be compared with a stored baseline: more queries
+than the baseline is always a regression, latency only beyond a tolerance.
+"""
+
+import json
+import platform
+import time
+from collections import namedtuple
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, reset_queries
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from chat.models import Query
+from chat.pagination import encode_cursor
+from chat.services import build_context
+from courses.models import Course, Enrollment
+
+Scenario = namedtuple('Scenario', ['name', 'actor', 'call'])
+Result = namedtuple('Result', ['name', 'iterations', 'p50', 'p95', 'p99', 'mean', 'rps', 'queries'])
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'perf' / 'baseline.json'
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class BenchmarkError(Exception):
+    """A scenario could not run (missing actors or a failing request)."""
+
+
+def pick_actors():
+    """
+    Representative users: the student with the most chats (longest history,
+    most courses), the faculty member teaching most courses, and a superuser
+    (the admin site needs model permissions).
+    """
+    student = (User.objects.filter(role='student')
+               .annotate(chats=Count('queries')).order_by('-chats').first())
+    faculty = (User.objects.filter(role='faculty')
+               .annotate(taught=Count('courses_taught')).order_by('-taught').first())
+    admin = User.objects.filter(is_superuser=True).first()
+    actors = {'student': student, 'faculty': faculty, 'admin': admin}
+    missing = [role for role, user in actors.items() if user is None]
+    if missing:
+        raise BenchmarkError(f"No {', '.join(missing)} user to benchmark with.")
+    return actors
+
+
+def _get(path, **params):
+    def call(client, user):
+        return client.get(path, params)
+    return call
+
+
+def _history_since(client, user):
+    # A delta sync from one hour ago
+    return client.get('/api/chat/history/', {
+        'since': encode_cursor(timezone.now() - timedelta(hours=1), 0),
+    })
+
+
+def _build_context(client, user):
+    return build_context(user)
+
+
+SCENARIOS = [
+    Scenario('courses.list.student', 'student', _get('/api/courses/')),
+    Scenario('courses.list.faculty', 'faculty', _get('/api/courses/')),
+    Scenario('courses.list.admin', 'admin', _get('/api/courses/')),
+    Scenario('courses.enrollments', 'student', _get('/api/courses/enrollments/')),
+    Scenario('chat.history', 'student', _get('/api/chat/history/')),
+    Scenario('chat.history.since', 'student', _history_since),
+    Scenario('chat.search', 'student', _get('/api/chat/search/', q='assignment due')),
+    Scenario('chat.usage', 'admin', _get('/api/chat/usage/')),
+    Scenario('services.build_context', 'student', _build_context),
+    Scenario('admin.queries', 'admin', _get('/admin/chat/query/')),
+    Scenario('admin.responses', 'admin', _get('/admin/chat/response/')),
+    Scenario('admin.enrollments', 'admin', _get('/admin/courses/enrollment/')),
+    Scenario('admin.users', 'admin', _get('/admin/accounts/user/')),
+]
+
+
+def _client_for(user):
+    client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+    if user.is_staff:
+        client.force_login(user)   # the admin site uses sessions
+    return client
+
+
+def _check(name, response):
+    status = getattr(response, 'status_code', 200)
+    if status >= 400:
+        raise BenchmarkError(f"{name}: HTTP {status}")
+    if getattr(response, 'streaming', False):
+        b''.join(response.streaming_content)
+
+
+def run_scenario(scenario, client, user, iterations=50, warmup=5):
+    for _ in range(warmup):
+        _check(scenario.name, scenario.call(client, user))
+    # Queries are counted on one extra call: capturing them slows the cursor.
+    # With DEBUG on the log may already be full, which would hide new entries.
+    reset_queries()
+    with CaptureQueriesContext(connection) as captured:
+        _check(scenario.name, scenario.call(client, user))
+    queries = len(captured)   # read now: later requests reset the log
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        _check(scenario.name, scenario.call(client, user))
+        latencies.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return Result(
+        scenario.name, iterations,
+        round(percentile(latencies, 50), 3),
+        round(percentile(latencies, 95), 3),
+        round(percentile(latencies, 99), 3),
+        round(sum(latencies) / len(latencies), 3),
+        round(iterations / elapsed, 1) if elapsed else 0.0,
+        queries,
+    )
+
+
+def run_benchmarks(iterations=50, warmup=5, only=None):
+    """Run every (or each named) scenario; yields a Result per scenario."""
+    actors = pick_actors()
+    clients = {role: _client_for(user) for role, user in actors.items()}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        for scenario in SCENARIOS:
+            if only and not any(scenario.name.startswith(prefix) for prefix in only):
+                continue
+            yield run_scenario(
+                scenario, clients[scenario.actor], actors[scenario.actor], iterations, warmup,
+            )
+
+
+def dataset_summary():
+    return {
+        'users': User.objects.count(),
+        'courses': Course.objects.count(),
+        'enrollments': Enrollment.objects.count(),
+        'queries': Query.objects.count(),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+    }
+
+
+def save_baseline(path, results):
+    data = {
+        'created': timezone.now().isoformat(),
+        'dataset': dataset_summary(),
+        'results': {r.name: r._asdict() for r in results},
+    }
+    Path(path).write_text(json.dumps(data, indent=2) + '\n')
+
+
+def load_baseline(path):
+    return json.loads(Path(path).read_text())
+
+
+def regressions(results, baseline, tolerance=0.25, min_delta_ms=1.0):
+    """
+    Human-readable regressions of results against a baseline: any increase
+    in queries, or a p95 more than `tolerance` (and min_delta_ms) slower.
+    """
+    found = []
+    for result in results:
+        base = baseline['results'].get(result.name)
+        if base is None:
+            continue
+        if result.queries > base['queries']:
+            found.append(f"{result.name}: {result.queries} queries (baseline {base['queries']})")
+        limit = base['p95'] * (1 + tolerance)
+        if result.p95 > limit and result.p95 - base['p95'] >= min_delta_ms:
+            found.append(
+                f"{result.name}: p95 {result.p95:.1f} ms (baseline {base['p95']:.1f} ms, "
+                f"limit {limit:.1f} ms)"
+            )
+    return found
@@ -0,0 +1,246 @@
+"""
+A local stand-in for the OpenAI chat-completions API, for load tests that
+must not pay for (or be rate limited by) real completions.
+
+It answers POST /v1/chat/completions, both plain and streamed (SSE,
+including the usage chunk when stream_options.include_usage is set), with
+provider-like timing: a time to first token drawn from a log-normal
+distribution, then tokens at a fixed generation speed. A share of requests
+can fail with 500s or be rejected with 429s, and requests beyond
+`max_concurrency` are rejected with 429 like a provider's concurrency limit.
+
+Point the backend at it with OPENAI_BASE_URL (see `manage.py llm_stub`).
+"""
+
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+StubConfig = namedtuple('StubConfig', [
+    'ttft_ms',             # median time to first token
+    'sigma',               # log-normal spread of the TTFT (0 = constant)
+    'tokens_per_second',   # generation speed after the first token
+    'completion_tokens',   # median answer length (uniform within ±50%)
+    'error_rate',          # share of requests failing with a 500
+    'rate_limit_rate',     # share of requests rejected with a 429
+    'max_concurrency',     # requests in flight beyond this get a 429 (0 = no limit)
+    'retry_after',         # Retry-After seconds sent with 429s
+    'seed',
+])
+StubConfig.__new__.__defaults__ = (400.0, 0.5, 80.0, 120, 0.0, 0.0, 0, 1, None)
+
+WORDS = (
+    'the course covers lectures problem sets and a final project students should '
+    'review the syllabus attend office hours and submit assignments before the deadline'
+).split()
+
+
+def _chunked(data):
+    return f'{len(data):x}\r\n'.encode() + data + b'\r\n'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # keep-alive, like the SDK's connection pool
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            return self._json(200, {'object': 'list', 'data': [
+                {'id': 'stub', 'object': 'model', 'owned_by': 'perf'},
+            ]})
+        self._error(404, 'not_found', f'Unknown path {self.path}')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            return self._error(404, 'not_found', f'Unknown path {self.path}')
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            return self._error(400, 'invalid_request_error', 'Body is not JSON.')
+
+        stub = self.server.stub
+        admitted, outcome = stub.admit()
+        try:
+            if outcome == 429:
+                return self._error(429, 'rate_limit_exceeded', 'Rate limit reached (stub).',
+                                   headers={'Retry-After': str(stub.config.retry_after)})
+            if outcome == 500:
+                time.sleep(stub.ttft() / 1000)
+                return self._error(500, 'server_error', 'The server had an error (stub).')
+            if request.get('stream'):
+                self._stream(stub, request)
+            else:
+                self._complete(stub, request)
+        finally:
+            if admitted:
+                stub.release()
+
+    # ─── Responses ───────────────────────────────────────────────
+
+    def _complete(self, stub, request):
+        model = request.get('model') or 'stub'
+        tokens = stub.answer_tokens()
+        time.sleep((stub.ttft() + stub.generation_ms(len(tokens))) / 1000)
+        self._json(200, {
+            'id': f'chatcmpl-{uuid.uuid4().hex}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': ''.join(tokens).strip()},
+                'finish_reason': 'stop',
+            }],
+            'usage': stub.usage(request, tokens),
+        })
+        stub.count(200)
+
+    def _stream(self, stub, request):
+        model = request.get('model') or 'stub'
+        tokens = stub.answer_tokens()
+        base = {
+            'id': f'chatcmpl-{uuid.uuid4().hex}',
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': model,
+        }
+        time.sleep(stub.ttft() / 1000)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def event(payload):
+            self.wfile.write(_chunked(f'data: {payload}\n\n'.encode()))
+            self.wfile.flush()
+
+        try:
+            event(json.dumps({**base, 'choices': [
+                {'index': 0, 'delta': {'role': 'assistant', 'content': ''}, 'finish_reason': None},
+            ]}))
+            gap = stub.generation_ms(1) / 1000
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(gap)
+                event(json.dumps({**base, 'choices': [
+                    {'index': 0, 'delta': {'content': token}, 'finish_reason': None},
+                ]}))
+            event(json.dumps({**base, 'choices': [
+                {'index': 0, 'delta': {}, 'finish_reason': 'stop'},
+            ]}))
+            if (request.get('stream_options') or {}).get('include_usage'):
+                event(json.dumps({**base, 'choices': [], 'usage': stub.usage(request, tokens)}))
+            event('[DONE]')
+            self.wfile.write(b'0\r\n\r\n')
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            stub.count('disconnected')
+            return
+        stub.count(200)
+
+    def _json(self, status, data, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, code, message, headers=None):
+        self._json(status, {'error': {'message': message, 'type': code, 'code': code}}, headers)
+        self.server.stub.count(status)
+
+
+class StubServer:
+    """The stub in a background thread; `url` is the OPENAI_BASE_URL to use."""
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.config = config or StubConfig()
+        self.rng = random.Random(self.config.seed)
+        self.stats = Counter()
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # ─── Behaviour ───────────────────────────────────────────────
+
+    def admit(self):
+        """(admitted, outcome): outcome is 429, 500 or None for a normal answer."""
+        with self._lock:
+            self.stats['requests'] += 1
+            limit = self.config.max_concurrency
+            if limit and self.in_flight >= limit:
+                return False, 429
+            roll = self.rng.random()
+            self.in_flight += 1
+        if roll < self.config.rate_limit_rate:
+            return True, 429
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            return True, 500
+        return True, None
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def count(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def ttft(self):
+        """Milliseconds to the first token."""
+        with self._lock:
+            if not self.config.sigma:
+                return self.config.ttft_ms
+            return self.config.ttft_ms * math.exp(self.rng.gauss(0, self.config.sigma))
+
+    def generation_ms(self, tokens):
+        return tokens * 1000 / self.config.tokens_per_second
+
+    def answer_tokens(self):
+        with self._lock:
+            median = self.config.completion_tokens
+            count = max(1, self.rng.randint(median // 2, median + median // 2))
+            return [' ' + self.rng.choice(WORDS) for _ in range(count)]
+
+    @staticmethod
+    def usage(request, tokens):
+        # ~4 characters per token, as for English text
+        prompt_chars = sum(len(str(m.get('content') or '')) for m in request.get('messages') or [])
+        prompt = max(1, prompt_chars // 4)
+        return {
+            'prompt_tokens': prompt,
+            'completion_tokens': len(tokens),
+            'total_tokens': prompt + len(tokens),
+        }
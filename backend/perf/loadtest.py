@@ -0,0 +1,213 @@
+"""
+Closed-loop load generator for the chat endpoints of a running backend.
+
+Unlike the in-process benchmarks, requests go over HTTP to a real server
+(runserver, gunicorn or an ASGI server), so the whole stack — server
+workers, middleware, JWT auth, the async chat view, the database and the
+LLM client — is under load. Run the backend against `manage.py llm_stub`
+to get realistic provider latency without paying for completions.
+
+Each concurrency level runs that many workers for a fixed duration; every
+worker repeatedly asks a question as one of the prepared users, over its
+own keep-alive connection, and the level reports latency percentiles,
+throughput and errors, overall and per answer source (X-Answer-Source:
+llm, routed, cache, ...), since routed and cached answers never wait on
+the LLM. Tokens are minted locally, so the target must share this
+checkout's SECRET_KEY and database.
+"""
+
+import http.client
+import json
+import random
+import threading
+import time
+from collections import Counter, namedtuple
+from urllib.parse import urlsplit
+
+from django.db.models import Count
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from courses.models import Course
+from .benchmarks import percentile
+from .synthetic import QUESTIONS, TOPICS
+
+Sample = namedtuple('Sample', ['status', 'seconds', 'ttft', 'error', 'source'])
+LevelResult = namedtuple('LevelResult', [
+    'concurrency', 'requests', 'errors', 'p50', 'p95', 'p99', 'mean', 'rps',
+    'ttft_p50', 'ttft_p95', 'statuses', 'sources',
+])
+SourceLatency = namedtuple('SourceLatency', ['requests', 'p50', 'p95'])
+Actor = namedtuple('Actor', ['user_id', 'token', 'courses'])
+
+
+def access_token(user):
+    return str(RefreshToken.for_user(user).access_token)
+
+
+def prepare_actors(count):
+    """Up to `count` students (most enrolled first) with tokens and course codes."""
+    students = list(
+        User.objects.filter(role='student', is_active=True)
+        .annotate(enrolled=Count('enrollments')).filter(enrolled__gt=0)
+        .order_by('-enrolled', 'id')[:count]
+    )
+    codes = {}
+    for student_id, code in Course.objects.filter(
+        enrollments__student__in=students,
+    ).values_list('enrollments__student_id', 'code'):
+        codes.setdefault(student_id, []).append(code)
+    return [Actor(s.pk, access_token(s), codes.get(s.pk, [])) for s in students]
+
+
+def question_for(actor, rng):
+    return rng.choice(QUESTIONS).format(
+        code=rng.choice(actor.courses) if actor.courses else 'my course',
+        topic=rng.choice(TOPICS),
+        week=rng.randint(1, 14),
+    )
+
+
+class ChatClient:
+    """One keep-alive HTTP connection to the target; not thread-safe."""
+
+    def __init__(self, base_url, timeout=60):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == 'https'
+        self.host = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.conn = None
+
+    def _connection(self):
+        if self.conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self.conn = cls(self.host, timeout=self.timeout)
+        return self.conn
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _post(self, path, data, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        conn = self._connection()
+        conn.request('POST', self.prefix + path, body=json.dumps(data), headers=headers)
+        return conn.getresponse()
+
+    def _done(self, response):
+        if response.getheader('Connection', '').lower() == 'close':
+            self.close()
+
+    def login(self, username, password):
+        """An access token from POST /api/auth/login/ (raises on failure)."""
+        response = self._post('/api/auth/login/', {'username': username, 'password': password})
+        body = response.read()
+        self._done(response)
+        if response.status != 200:
+            raise ValueError(f'Login as {username} failed: HTTP {response.status}')
+        return json.loads(body)['access']
+
+    def chat(self, token, message, stream=False):
+        """POST one question; returns (Sample, parsed JSON body or None)."""
+        started = time.perf_counter()
+        try:
+            if stream:
+                response = self._post('/api/chat/stream/', {'message': message}, token)
+            else:
+                response = self._post('/api/chat/', {'message': message, 'mode': 'sync'}, token)
+            ttft, data, source = None, None, response.getheader('X-Answer-Source')
+            if stream and response.status == 200:
+                event = None
+                for line in iter(response.readline, b''):
+                    if line.startswith(b'event: '):
+                        event = line[7:].strip()
+                        # The first delta is the user-visible first token
+                        if ttft is None and event == b'delta':
+                            ttft = time.perf_counter() - started
+                    elif event == b'done' and line.startswith(b'data: '):
+                        data = json.loads(line[6:])
+                        source = data.get('source')
+            else:
+                raw = response.read()
+                if response.status == 200:
+                    data = json.loads(raw)
+            self._done(response)
+            return Sample(response.status, time.perf_counter() - started, ttft, None, source), data
+        except (OSError, http.client.HTTPException, ValueError) as exc:
+            self.close()
+            return Sample(None, time.perf_counter() - started, None, type(exc).__name__, None), None
+
+
+def by_source(samples):
+    """SourceLatency per answer source of the successful samples."""
+    grouped = {}
+    for s in samples:
+        if s.status == 200:
+            grouped.setdefault(s.source, []).append(s.seconds * 1000)
+    return {
+        source: SourceLatency(
+            len(latencies),
+            round(percentile(sorted(latencies), 50), 1),
+            round(percentile(sorted(latencies), 95), 1),
+        )
+        for source, latencies in grouped.items()
+    }
+
+
+def summarize(concurrency, samples, elapsed):
+    latencies = sorted(s.seconds * 1000 for s in samples if s.status == 200)
+    ttfts = sorted(s.ttft * 1000 for s in samples if s.ttft is not None)
+    statuses = Counter(s.error or s.status for s in samples)
+    return LevelResult(
+        concurrency,
+        len(samples),
+        sum(1 for s in samples if s.status != 200),
+        round(percentile(latencies, 50), 1),
+        round(percentile(latencies, 95), 1),
+        round(percentile(latencies, 99), 1),
+        round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+        round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        round(percentile(ttfts, 50), 1) if ttfts else None,
+        round(percentile(ttfts, 95), 1) if ttfts else None,
+        dict(statuses),
+        by_source(samples),
+    )
+
+
+def run_level(base_url, actors, concurrency, duration, stream=False, seed=0, timeout=60):
+    """Run `concurrency` workers for `duration` seconds; returns a LevelResult."""
+    samples = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(index):
+        rng = random.Random(seed * 1_000_003 + index)
+        client = ChatClient(base_url, timeout)
+        mine = []
+        try:
+            while time.monotonic() < deadline:
+                actor = rng.choice(actors)
+                sample, _ = client.chat(actor.token, question_for(actor, rng), stream)
+                mine.append(sample)
+        finally:
+            client.close()
+            with lock:
+                samples.extend(mine)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(concurrency, samples, time.monotonic() - started)
+
+
+def run_load(base_url, actors, levels, duration, stream=False, seed=0, timeout=60):
+    """Yields a LevelResult per concurrency level, in increasing order."""
+    for concurrency in sorted(levels):
+        yield run_level(base_url, actors, concurrency, duration, stream, seed, timeout)
@@ -0,0 +1,56 @@
+"""
+Sample recorded chat queries into an anonymized traffic trace for replay.
+Run: python manage.py capture_traffic trace.jsonl.gz [--days 7] [--sample 0.1] [--limit N]
+
+Users are sampled as a whole (their follow-ups stay together) and replaced
+by pseudonyms; emails, URLs, long numbers and their names are masked.
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from perf.traffic import capture
+
+
+def _moment(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        raise CommandError(f'Invalid date/time: {value}')
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class Command(BaseCommand):
+    help = 'Capture an anonymized sample of recorded chat traffic into a trace file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Trace file to write (.jsonl, or .jsonl.gz to compress).')
+        parser.add_argument('--days', type=float, default=1,
+                            help='Capture the last N days (ignored with --since).')
+        parser.add_argument('--since', default=None, help='Start of the window (ISO date/time).')
+        parser.add_argument('--until', default=None, help='End of the window (ISO date/time).')
+        parser.add_argument('--sample', type=float, default=1.0,
+                            help='Share of users whose queries are captured (0-1].')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Stop after this many queries.')
+        parser.add_argument('--salt', default=None,
+                            help='Fixed salt for a reproducible user sample (random by default).')
+
+    def handle(self, *args, **options):
+        if not 0 < options['sample'] <= 1:
+            raise CommandError('--sample must be in (0, 1].')
+        until = _moment(options['until']) if options['until'] else None
+        if options['since']:
+            since = _moment(options['since'])
+        else:
+            since = (until or timezone.now()) - timedelta(days=options['days'])
+
+        written = capture(
+            options['path'], since=since, until=until,
+            sample=options['sample'], limit=options['limit'], salt=options['salt'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Captured {written:,} queries since {since:%Y-%m-%d %H:%M} into {options['path']}."
+        ))
@@ -0,0 +1,50 @@
+"""
+Serve a local OpenAI-compatible chat-completions stub for load tests.
+Run: python manage.py llm_stub [--port 8100] [--ttft-ms 400] [--error-rate 0.01] ...
+
+Then start the backend with OPENAI_BASE_URL=http://127.0.0.1:8100/v1 so
+get_ai_response() talks to the stub instead of OpenAI (no key needed).
+"""
+
+from django.core.management.base import BaseCommand
+
+from perf.llm_stub import StubConfig, StubServer
+
+
+class Command(BaseCommand):
+    help = 'Serve a local OpenAI-compatible stub with configurable latency and errors.'
+
+    def add_arguments(self, parser):
+        defaults = StubConfig()
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8100)
+        parser.add_argument('--ttft-ms', type=float, default=defaults.ttft_ms,
+                            help='Median time to first token.')
+        parser.add_argument('--sigma', type=float, default=defaults.sigma,
+                            help='Log-normal spread of the time to first token (0 = constant).')
+        parser.add_argument('--tokens-per-second', type=float, default=defaults.tokens_per_second)
+        parser.add_argument('--completion-tokens', type=int, default=defaults.completion_tokens,
+                            help='Median answer length in tokens.')
+        parser.add_argument('--error-rate', type=float, default=defaults.error_rate,
+                            help='Share of requests failing with HTTP 500.')
+        parser.add_argument('--rate-limit-rate', type=float, default=defaults.rate_limit_rate,
+                            help='Share of requests rejected with HTTP 429.')
+        parser.add_argument('--max-concurrency', type=int, default=defaults.max_concurrency,
+                            help='Reject requests beyond this many in flight with 429 (0 = no limit).')
+        parser.add_argument('--retry-after', type=int, default=defaults.retry_after)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        config = StubConfig(**{name: options[name] for name in StubConfig._fields})
+        stub = StubServer(config, options['host'], options['port'])
+        self.stdout.write(f"LLM stub listening; start the backend with OPENAI_BASE_URL={stub.url}")
+        try:
+            stub.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.stop()
+            self.stdout.write(
+                ', '.join(f'{k}={v}' for k, v in sorted(stub.stats.items(), key=str))
+                or 'No requests served.'
+            )
@@ -0,0 +1,92 @@
+"""
+Drive POST /api/chat/ (or /api/chat/stream/) on a running backend at
+increasing concurrency and report latency percentiles and throughput,
+with latency also broken down by answer source.
+Run: python manage.py load_test [--url http://127.0.0.1:8000] [--concurrency 1,4,16,64]
+
+Start the target with OPENAI_BASE_URL pointing at `manage.py llm_stub` to
+load-test without real completions. Tokens are minted from this checkout,
+so the target must use the same SECRET_KEY and database.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from perf.loadtest import prepare_actors, run_load
+
+
+def _levels(value):
+    try:
+        levels = [int(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        levels = []
+    if not levels or min(levels) < 1:
+        raise CommandError('--concurrency takes a comma-separated list of positive integers.')
+    return levels
+
+
+class Command(BaseCommand):
+    help = 'Load-test the chat endpoint of a running backend at increasing concurrency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000',
+                            help='Base URL of the target backend.')
+        parser.add_argument('--concurrency', default='1,2,4,8,16,32',
+                            help='Comma-separated concurrency levels, run in increasing order.')
+        parser.add_argument('--duration', type=float, default=30,
+                            help='Seconds per concurrency level.')
+        parser.add_argument('--users', type=int, default=200,
+                            help='Number of students to spread the requests over.')
+        parser.add_argument('--stream', action='store_true',
+                            help='Use /api/chat/stream/ and also report time to first token.')
+        parser.add_argument('--timeout', type=float, default=60)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', dest='json_path', default=None,
+                            help='Also write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        levels = _levels(options['concurrency'])
+        actors = prepare_actors(options['users'])
+        if not actors:
+            raise CommandError('No enrolled students to load-test with (see generate_dataset).')
+
+        self.stdout.write(
+            f"{len(actors)} users against {options['url']}, {options['duration']:g}s per level"
+        )
+        header = f"{'conc':>5} {'reqs':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}"
+        if options['stream']:
+            header += f" {'ttft p50':>9} {'ttft p95':>9}"
+        self.stdout.write(header)
+
+        results = []
+        for result in run_load(options['url'], actors, levels, options['duration'],
+                               options['stream'], options['seed'], options['timeout']):
+            results.append(result)
+            line = (
+                f"{result.concurrency:>5} {result.requests:>7} {result.errors:>7} "
+                f"{result.p50:>9.1f} {result.p95:>9.1f} {result.p99:>9.1f} {result.rps:>8.2f}"
+            )
+            if options['stream']:
+                line += f" {result.ttft_p50 or 0:>9.1f} {result.ttft_p95 or 0:>9.1f}"
+            self.stdout.write(line)
+            self.stdout.write('      ' + '; '.join(
+                f'{source}: {stats.requests} p50 {stats.p50:.1f} p95 {stats.p95:.1f}'
+                for source, stats in sorted(result.sources.items(), key=lambda item: str(item[0]))
+            ))
+            failures = {k: v for k, v in result.statuses.items() if k != 200}
+            if failures:
+                self.stdout.write(self.style.WARNING(
+                    '      ' + ', '.join(f'{k}: {v}' for k, v in failures.items())
+                ))
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump([
+                    {
+                        **r._asdict(),
+                        'statuses': {str(k): v for k, v in r.statuses.items()},
+                        'sources': {str(k): v._asdict() for k, v in r.sources.items()},
+                    }
+                    for r in results
+                ], f, indent=2)
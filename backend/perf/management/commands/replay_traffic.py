@@ -0,0 +1,108 @@
+"""
+Replay a captured traffic trace against a running backend.
+Run: python manage.py replay_traffic trace.jsonl.gz [--url http://127.0.0.1:8000] [--speed 10]
+
+Questions are re-issued at their recorded relative times divided by
+--speed, each pseudonymous user as its own account. By default tokens are
+minted for local accounts of the same role (the target must share this
+checkout's SECRET_KEY and database); --accounts logs in to the target as
+"username,password" lines from a file instead.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from perf.traffic import cache_hit_ratio, local_tokens, login_tokens, read_trace, replay
+
+
+def _accounts(path):
+    accounts = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                username, _, password = line.partition(',')
+                accounts.append((username.strip(), password.strip()))
+    if not accounts:
+        raise CommandError(f'No accounts in {path}.')
+    return accounts
+
+
+class Command(BaseCommand):
+    help = 'Replay a traffic trace against a running backend and report latency and cache hits.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Trace file written by capture_traffic.')
+        parser.add_argument('--url', default='http://127.0.0.1:8000',
+                            help='Base URL of the target backend.')
+        parser.add_argument('--speed', type=float, default=1.0,
+                            help='Replay N times faster than recorded.')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Replay only the first N queries.')
+        parser.add_argument('--accounts', default=None,
+                            help='File of "username,password" lines to log in to the target with.')
+        parser.add_argument('--stream', action='store_true', help='Use /api/chat/stream/.')
+        parser.add_argument('--max-in-flight', type=int, default=64)
+        parser.add_argument('--timeout', type=float, default=60)
+        parser.add_argument('--json', dest='json_path', default=None,
+                            help='Also write the report to this JSON file.')
+
+    def handle(self, *args, **options):
+        if options['speed'] <= 0:
+            raise CommandError('--speed must be positive.')
+        try:
+            header, records = read_trace(options['path'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        records = records[:options['limit']]
+        if not records:
+            raise CommandError('The trace has no queries.')
+
+        try:
+            if options['accounts']:
+                tokens = login_tokens(options['url'], records, _accounts(options['accounts']),
+                                      options['timeout'])
+            else:
+                tokens = local_tokens(records)
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        span = records[-1]['t'] / options['speed']
+        self.stdout.write(
+            f"Replaying {len(records):,} queries from {len(tokens):,} users "
+            f"against {options['url']} over ~{span:,.0f}s ({options['speed']:g}x)"
+        )
+        report = replay(options['url'], records, tokens, options['speed'], options['stream'],
+                        options['max_in_flight'], options['timeout'])
+
+        self.stdout.write(
+            f"requests {report.requests:,}, errors {report.errors:,} in {report.seconds:,.1f}s "
+            f"({report.rps:.2f} req/s)"
+        )
+        self.stdout.write(
+            f"latency ms: p50 {report.p50:.1f}  p95 {report.p95:.1f}  p99 {report.p99:.1f}  "
+            f"mean {report.mean:.1f}  (dispatch lag p95 {report.lag_p95:.1f})"
+        )
+        self.stdout.write(
+            f"cache hits: {cache_hit_ratio(report.sources):.1%} replayed, "
+            f"{cache_hit_ratio(report.recorded_sources):.1%} recorded"
+        )
+        self.stdout.write('sources: ' + ', '.join(
+            f'{source}: {count}' for source, count in sorted(report.sources.items(), key=str)
+        ))
+        failures = {k: v for k, v in report.statuses.items() if k != 200}
+        if failures:
+            self.stdout.write(self.style.WARNING(
+                'errors: ' + ', '.join(f'{k}: {v}' for k, v in failures.items())
+            ))
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({
+                    **report._asdict(),
+                    'statuses': {str(k): v for k, v in report.statuses.items()},
+                    'sources': {str(k): v for k, v in report.sources.items()},
+                    'recorded_sources': {str(k): v for k, v in report.recorded_sources.items()},
+                    'trace': header,
+                }, f, indent=2)
@@ -0,0 +1,60 @@
+"""
+Benchmark the main endpoints and compare against a stored baseline.
+Run: python manage.py run_benchmarks [--save-baseline] [--iterations N] [scenario ...]
+
+Load data first (python manage.py generate_dataset). Without
+--save-baseline, exits non-zero when a scenario needs more SQL queries than
+the baseline or its p95 latency exceeds the baseline by --tolerance.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from perf.benchmarks import (
+    DEFAULT_BASELINE, BenchmarkError, load_baseline, regressions, run_benchmarks, save_baseline,
+)
+
+
+class Command(BaseCommand):
+    help = 'Measure endpoint latency percentiles, throughput and query counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*',
+                            help='Only scenarios whose name starts with one of these.')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Store this run as the new baseline instead of comparing.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p95 slowdown as a fraction (default: 0.25).')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'scenario':<26} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'queries':>8}"
+        )
+        results = []
+        try:
+            for result in run_benchmarks(options['iterations'], options['warmup'], options['scenarios']):
+                results.append(result)
+                self.stdout.write(
+                    f"{result.name:<26} {result.p50:>9.2f} {result.p95:>9.2f} {result.p99:>9.2f} "
+                    f"{result.rps:>8.1f} {result.queries:>8}"
+                )
+        except BenchmarkError as exc:
+            raise CommandError(str(exc))
+
+        if options['save_baseline']:
+            save_baseline(options['baseline'], results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}."))
+            return
+        try:
+            baseline = load_baseline(options['baseline'])
+        except FileNotFoundError:
+            self.stdout.write(self.style.WARNING(
+                f"No baseline at {options['baseline']}; run with --save-baseline to create one."
+            ))
+            return
+        found = regressions(results, baseline, options['tolerance'])
+        if found:
+            raise CommandError('Regressions against baseline:\n  ' + '\n  '.join(found))
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
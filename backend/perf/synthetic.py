@@ -0,0 +1,313 @@
+"""
+Synthetic university-scale dataset for benchmarks.
+
+Rows are built in memory and written with bulk_create in fixed-size
+batches, one transaction per batch, so tens of thousands of users and
+millions of chats load in minutes. bulk_create skips save() and signals,
+so what they would do is done here explicitly: timestamps are spread over
+the past `days` (auto_now fields are switched off while loading),
+responses point at shared ResponseBody rows, and new chats are written to
+the search index in bulk.
+
+Everything created carries `prefix` (usernames, course codes, enrollment
+numbers), so several datasets can coexist and are easy to tell apart. Rows
+are never read back by prefix: bulk_create returns their ids.
+"""
+
+import random
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User
+from chat.indexing import reindex_course
+from chat.models import Query, Response, ResponseBody
+from chat.search import index_queries
+from courses.models import Assignment, Course, Enrollment
+
+Sizes = namedtuple('Sizes', ['students', 'faculty', 'courses', 'enrollments', 'assignments', 'queries'])
+
+UNIVERSITY = Sizes(
+    students=50_000, faculty=1_500, courses=3_000,
+    enrollments=200_000, assignments=100_000, queries=5_000_000,
+)
+
+Step = namedtuple('Step', ['table', 'rows', 'seconds'])
+
+PASSWORD = 'synthetic123'
+
+DEPARTMENTS = [
+    'Computer Science', 'Mathematics', 'Physics', 'Chemistry', 'Biology',
+    'Economics', 'History', 'Mechanical Engineering', 'Electrical Engineering',
+    'Psychology', 'Philosophy', 'Linguistics',
+]
+TOPICS = [
+    'Algorithms', 'Data Structures', 'Linear Algebra', 'Calculus', 'Thermodynamics',
+    'Organic Chemistry', 'Genetics', 'Microeconomics', 'Modern History', 'Circuits',
+    'Statistics', 'Operating Systems', 'Databases', 'Machine Learning', 'Ethics',
+    'Quantum Mechanics', 'Cognitive Science', 'Compilers', 'Networks', 'Optimization',
+]
+LEVELS = ['Introduction to', 'Advanced', 'Applied', 'Foundations of', 'Topics in']
+FIRST_NAMES = ['Aarav', 'Diya', 'Kabir', 'Meera', 'Rohan', 'Sara', 'Vivaan', 'Anaya', 'Ishaan', 'Zoya']
+LAST_NAMES = ['Sharma', 'Patel', 'Iyer', 'Khan', 'Gupta', 'Reddy', 'Das', 'Nair', 'Singh', 'Bose']
+
+QUESTIONS = [
+    'When is the next {code} assignment due?',
+    'What topics are covered in week {week} of {code}?',
+    'Who teaches {code}?',
+    'Can you summarize the {topic} syllabus?',
+    'How do I prepare for the {topic} midterm?',
+    'Explain {topic} in simple terms',
+    'What are my upcoming deadlines?',
+    'Which courses am I enrolled in?',
+    'Is there a lab for {code} this week?',
+    'and when is that due?',
+]
+ANSWERS = [
+    'The next {code} assignment is due on Friday at 23:59.',
+    'Week {week} of {code} covers {topic}: lectures, a problem set and a short quiz.',
+    '{code} is taught by the {department} department faculty.',
+    'The {topic} syllabus spans {week} weeks, starting with fundamentals and ending with a project.',
+    'Review the lecture notes, redo the problem sets and attend the revision session for {topic}.',
+    'You are enrolled in {code} and a few other courses this semester.',
+    'There is no lab for {code} this week; the next one is on Tuesday.',
+]
+# Distinct answer texts (and so ResponseBody rows) drawn on
+ANSWER_POOL = 2000
+
+MODELS = ['gpt-3.5-turbo-0125', 'gpt-4o-mini']
+SOURCES = ['llm'] * 6 + ['cache'] * 2 + ['routed'] * 2 + ['fallback']
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the given auto_now/auto_now_add values."""
+    saved = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class DatasetGenerator:
+
+    def __init__(self, sizes, prefix='synth', batch_size=5000, days=180, seed=0,
+                 index_courses=True):
+        # Course codes are "<prefix>-NNNNNN"
+        if len(prefix) + 7 > Course._meta.get_field('code').max_length:
+            raise ValueError(f"Prefix '{prefix}' is too long for course codes.")
+        self.sizes = sizes
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.days = days
+        self.rng = random.Random(seed)
+        self.index_courses = index_courses
+        self.now = timezone.now()
+
+    def exists(self):
+        return (User.objects.filter(username__startswith=f'{self.prefix}_').exists()
+                or Course.objects.filter(code__startswith=f'{self.prefix}-').exists())
+
+    def run(self):
+        """Generate everything; yields a Step per table as it completes."""
+        with explicit_timestamps(Course, Enrollment, Assignment, Query, Response):
+            yield self._timed('users', self.users)
+            yield self._timed('courses', self.courses)
+            yield self._timed('enrollments', self.enrollments)
+            yield self._timed('assignments', self.assignments)
+            yield self._timed('queries+responses', self.chats)
+        if self.index_courses:
+            yield self._timed('course_chunks', self.course_chunks)
+
+    def _timed(self, table, fn):
+        started = time.monotonic()
+        rows = fn()
+        return Step(table, rows, time.monotonic() - started)
+
+    # ─── Helpers ─────────────────────────────────────────────────
+
+    def _ago(self, max_days):
+        return self.now - timedelta(seconds=self.rng.random() * max_days * 86400)
+
+    def _skewed(self, items):
+        """Pick with a long-tailed popularity (low indexes far more likely)."""
+        return items[int(len(items) * self.rng.random() ** 2)]
+
+    def _batches(self, rows):
+        for start in range(0, len(rows), self.batch_size):
+            yield rows[start:start + self.batch_size]
+
+    def _bulk(self, model, rows):
+        for batch in self._batches(rows):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+        return len(rows)
+
+    # ─── Tables ──────────────────────────────────────────────────
+
+    def users(self):
+        password = make_password(PASSWORD)   # hashed once: hashing is ~100 ms each
+        rows = []
+        for role, count in (('faculty', self.sizes.faculty), ('student', self.sizes.students)):
+            for i in range(count):
+                rows.append(User(
+                    username=f'{self.prefix}_{role[0]}{i}',
+                    password=password,
+                    first_name=self.rng.choice(FIRST_NAMES),
+                    last_name=self.rng.choice(LAST_NAMES),
+                    email=f'{self.prefix}_{role[0]}{i}@example.edu',
+                    role=role,
+                    department=self.rng.choice(DEPARTMENTS),
+                    date_joined=self._ago(self.days * 2),
+                ))
+        created = self._bulk(User, rows)
+        self.faculty_ids = [u.pk for u in rows if u.role == 'faculty']
+        self.student_ids = [u.pk for u in rows if u.role == 'student']
+        return created
+
+    def courses(self):
+        rows = []
+        for i in range(self.sizes.courses):
+            topic = self.rng.choice(TOPICS)
+            department = self.rng.choice(DEPARTMENTS)
+            weeks = '\n'.join(
+                f'Week {w}-{w + 1}: {self.rng.choice(TOPICS)}' for w in range(1, 15, 2)
+            )
+            created = self._ago(self.days * 2)
+            rows.append(Course(
+                code=f'{self.prefix}-{i:06d}',
+                name=f'{self.rng.choice(LEVELS)} {topic}',
+                department=department,
+                description=f'A {department} course on {topic}.',
+                syllabus=weeks,
+                faculty_id=self.rng.choice(self.faculty_ids) if self.faculty_ids else None,
+                created_at=created,
+                updated_at=created,
+            ))
+        created = self._bulk(Course, rows)
+        self.courses_by_id = {
+            c.pk: {'id': c.pk, 'code': c.code, 'name': c.name,
+                   'department': c.department, 'faculty_id': c.faculty_id}
+            for c in rows
+        }
+        self.course_ids = sorted(self.courses_by_id)
+        return created
+
+    def enrollments(self):
+        target = min(self.sizes.enrollments, len(self.student_ids) * len(self.course_ids))
+        pairs = set()
+        while len(pairs) < target:
+            pairs.add((self.rng.choice(self.student_ids), self._skewed(self.course_ids)))
+        self.enrolled = {}
+        rows = []
+        for i, (student_id, course_id) in enumerate(pairs):
+            self.enrolled.setdefault(student_id, []).append(course_id)
+            rows.append(Enrollment(
+                student_id=student_id,
+                course_id=course_id,
+                enrollment_num=f'{self.prefix}-E{i}',
+                enrolled_at=self._ago(self.days),
+            ))
+        return self._bulk(Enrollment, rows)
+
+    def assignments(self):
+        rows = []
+        for i in range(self.sizes.assignments):
+            course = self.courses_by_id[self._skewed(self.course_ids)]
+            created = self._ago(self.days)
+            rows.append(Assignment(
+                course_id=course['id'],
+                faculty_id=course['faculty_id'] or self.rng.choice(self.faculty_ids),
+                title=f'{course["name"]} — Problem set {i % 12 + 1}',
+                content=f'Solve the exercises on {self.rng.choice(TOPICS)}.',
+                due_date=created + timedelta(days=self.rng.randint(3, 21)),
+                created_at=created,
+                updated_at=created,
+            ))
+        return self._bulk(Assignment, rows)
+
+    def _answer_bodies(self):
+        texts = set()
+        courses = list(self.courses_by_id.values())
+        while len(texts) < min(ANSWER_POOL, len(courses) * len(ANSWERS)):
+            course = self.rng.choice(courses)
+            texts.add(self.rng.choice(ANSWERS).format(
+                code=course['code'], topic=self.rng.choice(TOPICS),
+                week=self.rng.randint(1, 14), department=course['department'],
+            ))
+        bodies = [ResponseBody.objects.for_text(text) for text in sorted(texts)]
+        return [(body.pk, body.text) for body in bodies]
+
+    def chats(self):
+        """Queries (in timestamp order, like real traffic) with their responses."""
+        if not self.sizes.queries:
+            return 0
+        bodies = self._answer_bodies()
+        # Active students ask most of the questions
+        askers = self.student_ids[:]
+        self.rng.shuffle(askers)
+        span = self.days * 86400
+        step = span / self.sizes.queries
+        start = self.now - timedelta(seconds=span)
+        written = 0
+        for offset in range(0, self.sizes.queries, self.batch_size):
+            count = min(self.batch_size, self.sizes.queries - offset)
+            queries = []
+            for i in range(offset, offset + count):
+                user_id = self._skewed(askers)
+                course_id = self.rng.choice(self.enrolled.get(user_id) or self.course_ids)
+                course = self.courses_by_id[course_id]
+                queries.append(Query(
+                    user_id=user_id,
+                    content=self.rng.choice(QUESTIONS).format(
+                        code=course['code'], topic=self.rng.choice(TOPICS),
+                        week=self.rng.randint(1, 14),
+                    ),
+                    timestamp=start + timedelta(seconds=(i + self.rng.random()) * step),
+                ))
+            with transaction.atomic():
+                Query.objects.bulk_create(queries)
+                responses, index_rows = [], []
+                for query in queries:
+                    body_id, text = self.rng.choice(bodies)
+                    responses.append(self._response(query, body_id))
+                    index_rows.append((query.pk, query.user_id, query.content, text))
+                Response.objects.bulk_create(responses)
+                index_queries(index_rows)
+            written += count
+        return written
+
+    def _response(self, query, body_id):
+        source = self.rng.choice(SOURCES)
+        response = Response(
+            query_id=query.pk,
+            body_id=body_id,   # set directly: bulk_create skips save()
+            source=source,
+            timestamp=query.timestamp + timedelta(milliseconds=self.rng.randint(5, 4000)),
+        )
+        if source == 'llm':
+            latency = int(self.rng.lognormvariate(7, 0.5))   # median ~1.1 s
+            response.model = self.rng.choice(MODELS)
+            response.prompt_tokens = self.rng.randint(300, 1800)
+            response.completion_tokens = self.rng.randint(40, 400)
+            response.context_tokens = response.prompt_tokens - self.rng.randint(20, 80)
+            response.latency_ms = latency
+            if self.rng.random() < 0.5:
+                response.ttft_ms = latency // self.rng.randint(3, 8)
+        return response
+
+    def course_chunks(self):
+        for course_id in self.course_ids:
+            reindex_course(course_id)
+        return len(self.course_ids)
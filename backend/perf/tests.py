@@ -0,0 +1,208 @@
+import json
+import tempfile
+from collections import Counter
+from datetime import timedelta
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.test import LiveServerTestCase, SimpleTestCase, TestCase
+from django.utils import timezone
+
+from accounts.models import User
+from chat.models import Query, Response, ResponseBody
+from chat.llm import LLMClient
+from chat.search import search_history
+from courses.models import Assignment, Course, Enrollment
+from .benchmarks import percentile, regressions, run_benchmarks
+from .llm_stub import StubConfig, StubServer
+from .loadtest import prepare_actors, run_level
+from .traffic import anonymize, cache_hit_ratio, capture, local_tokens, read_trace, replay
+from .synthetic import DatasetGenerator, Sizes
+
+SMALL = Sizes(students=20, faculty=3, courses=5, enrollments=40, assignments=15, queries=300)
+
+
+class DatasetGeneratorTests(TestCase):
+
+    def test_generates_requested_sizes(self):
+        steps = list(DatasetGenerator(SMALL, batch_size=64, days=30).run())
+        self.assertEqual([s.table for s in steps][-1], 'course_chunks')
+        self.assertEqual(User.objects.filter(role='student').count(), 20)
+        self.assertEqual(Course.objects.count(), 5)
+        self.assertEqual(Enrollment.objects.count(), 40)
+        self.assertEqual(Assignment.objects.count(), 15)
+        self.assertEqual(Query.objects.count(), 300)
+        self.assertEqual(Response.objects.count(), 300)
+        # Answers share a small pool of bodies, and are readable and searchable
+        self.assertLess(ResponseBody.objects.count(), 300)
+        response = Response.objects.select_related('body', 'query__user').first()
+        self.assertTrue(response.response_text)
+        self.assertTrue(search_history(response.query.user, response.query.content.split()[0]))
+        # Timestamps are spread over the past, in id order
+        timestamps = list(Query.objects.order_by('id').values_list('timestamp', flat=True))
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertGreater((timestamps[-1] - timestamps[0]).days, 20)
+
+    def test_prefix_does_not_pick_up_other_courses(self):
+        real = Course.objects.create(code='CS101', name='Intro')
+        generator = DatasetGenerator(SMALL._replace(queries=0), prefix='cs', index_courses=False)
+        self.assertFalse(generator.exists())
+        list(generator.run())
+        self.assertEqual(len(generator.course_ids), 5)
+        self.assertNotIn(real.pk, generator.course_ids)
+        self.assertFalse(Enrollment.objects.filter(course=real).exists())
+        self.assertTrue(generator.exists())
+        with self.assertRaises(ValueError):
+            DatasetGenerator(SMALL, prefix='x' * 14)
+
+
+class BenchmarkTests(TestCase):
+
+    def test_runs_scenarios_and_flags_regressions(self):
+        list(DatasetGenerator(SMALL._replace(queries=50), index_courses=False).run())
+        User.objects.create_superuser('root', password='x', role='admin')
+        results = list(run_benchmarks(iterations=2, warmup=0, only=['chat.history', 'admin.queries']))
+        self.assertEqual([r.name for r in results], ['chat.history', 'chat.history.since', 'admin.queries'])
+        self.assertTrue(all(r.queries > 0 for r in results))
+
+        baseline = {'results': {r.name: r._asdict() for r in results}}
+        self.assertEqual(regressions(results, baseline), [])
+        slower = results[0]._replace(p95=results[0].p95 * 2 + 5, queries=results[0].queries + 1)
+        found = regressions([slower], baseline)
+        self.assertEqual(len(found), 2)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+
+
+class LLMStubTests(SimpleTestCase):
+    FAST = StubConfig(ttft_ms=1, sigma=0, tokens_per_second=10_000, completion_tokens=20, seed=1)
+
+    def stub(self, config):
+        stub = StubServer(config).start()
+        self.addCleanup(stub.stop)
+        return stub
+
+    def post(self, stub, data):
+        request = Request(f'{stub.url}/chat/completions', data=json.dumps(data).encode(),
+                          headers={'Content-Type': 'application/json'})
+        return urlopen(request, timeout=5)
+
+    def test_completions_through_the_llm_client(self):
+        stub = self.stub(self.FAST)
+        llm = LLMClient({**settings.CHAT_LLM, 'BASE_URL': stub.url})
+        messages = [{'role': 'user', 'content': 'When is the next assignment due?'}]
+
+        response = llm.complete(model='gpt-test', messages=messages)
+        self.assertTrue(response.choices[0].message.content)
+        self.assertEqual(response.model, 'gpt-test')
+        self.assertGreater(response.usage.prompt_tokens, 0)
+
+        chunks = list(llm.complete(model='gpt-test', messages=messages, stream=True,
+                                   stream_options={'include_usage': True}))
+        deltas = [c.choices[0].delta.content for c in chunks if c.choices and c.choices[0].delta.content]
+        self.assertGreaterEqual(len(deltas), 10)
+        self.assertEqual(chunks[-1].usage.completion_tokens, len(deltas))
+        self.assertEqual(stub.stats[200], 2)
+
+    def test_errors_and_rate_limits(self):
+        stub = self.stub(self.FAST._replace(error_rate=1.0))
+        with self.assertRaises(HTTPError) as failed:
+            self.post(stub, {'messages': []})
+        self.assertEqual(failed.exception.code, 500)
+
+        stub = self.stub(self.FAST._replace(rate_limit_rate=1.0, retry_after=3))
+        with self.assertRaises(HTTPError) as limited:
+            self.post(stub, {'messages': []})
+        self.assertEqual(limited.exception.code, 429)
+        self.assertEqual(limited.exception.headers['Retry-After'], '3')
+
+    def test_concurrency_limit(self):
+        stub = self.stub(self.FAST._replace(max_concurrency=1))
+        stub.in_flight = 1   # as if another request were being answered
+        with self.assertRaises(HTTPError) as limited:
+            self.post(stub, {'messages': []})
+        self.assertEqual(limited.exception.code, 429)
+
+
+class LoadTestTests(LiveServerTestCase):
+
+    def test_drives_the_chat_endpoint(self):
+        list(DatasetGenerator(SMALL._replace(queries=0), index_courses=False).run())
+        actors = prepare_actors(5)
+        self.assertEqual(len(actors), 5)
+
+        result = run_level(self.live_server_url, actors, concurrency=1, duration=0.3)
+        self.assertGreater(result.requests, 0)
+        self.assertEqual(result.errors, 0)
+        self.assertGreater(result.p50, 0)
+        self.assertEqual(Query.objects.count(), result.requests)
+        self.assertEqual(sum(s.requests for s in result.sources.values()), result.requests)
+
+        streamed = run_level(self.live_server_url, actors, concurrency=1, duration=0.3, stream=True)
+        self.assertEqual(streamed.errors, 0)
+        self.assertIsNotNone(streamed.ttft_p50)
+
+
+class TrafficReplayTests(LiveServerTestCase):
+
+    def setUp(self):
+        self.trace = Path(tempfile.mkdtemp()) / 'trace.jsonl.gz'
+        self.priya = User.objects.create_user('priya', password='x', first_name='Priya', role='student')
+        self.omar = User.objects.create_user('omar', password='x', first_name='Omar', role='student')
+        start = timezone.now() - timedelta(hours=1)
+        for offset, user, content in [
+            (0, self.priya, 'Hi, I am Priya (priya@uni.edu), what courses do I have?'),
+            (2, self.omar, 'My roll number is 2021003345, when is CS101 due?'),
+            (3, self.priya, 'and when is that due?'),
+        ]:
+            query = Query.objects.create(user=user, content=content)
+            Query.objects.filter(pk=query.pk).update(timestamp=start + timedelta(seconds=offset))
+            Response.objects.create(query=query, response_text='An answer.', source='cache')
+
+    def test_anonymize(self):
+        self.assertEqual(
+            anonymize('Mail priya@uni.edu or call +91 98765 43210 about CS101 and synth-000042', ['Priya']),
+            'Mail <email> or call <number> about CS101 and synth-000042',
+        )
+        self.assertEqual(anonymize('I am PRIYA, see www.x.org', ['priya']), 'I am <name>, see <url>')
+        self.assertEqual(
+            anonymize('Roll BT-20231234, ID S-1234567890, ref 2023-123456 for synth-000042-7'),
+            'Roll BT-<number>, ID S-<number>, ref <number> for synth-<number>',
+        )
+
+    def test_capture_and_replay(self):
+        self.assertEqual(capture(self.trace, salt='s'), 3)
+        header, records = read_trace(self.trace)
+        self.assertEqual(header['sample'], 1.0)
+        self.assertEqual([r['t'] for r in records], [0, 2, 3])
+        self.assertEqual([r['user'] for r in records], ['u1', 'u2', 'u1'])
+        text = ' '.join(r['message'] for r in records)
+        for secret in ('Priya', 'priya@uni.edu', '2021003345'):
+            self.assertNotIn(secret, text)
+        self.assertIn('CS101', text)
+        self.assertEqual(cache_hit_ratio(Counter(r['source'] for r in records)), 1.0)
+
+        tokens = local_tokens(records)
+        self.assertNotEqual(tokens['u1'], tokens['u2'])
+        report = replay(self.live_server_url, records, tokens, speed=20)
+        self.assertEqual((report.requests, report.errors), (3, 0))
+        self.assertEqual(sum(report.sources.values()), 3)   # every answer names its source
+        self.assertEqual(report.recorded_sources, {'cache': 3})
+        self.assertEqual(Query.objects.count(), 6)
+
+    def test_sampling_is_per_user(self):
+        sizes = set()
+        for salt in 'abcdefgh':
+            capture(self.trace, sample=0.5, salt=salt)
+            messages = [r['message'] for r in read_trace(self.trace)[1]]
+            sizes.add(len(messages))
+            # Priya's follow-up is captured exactly when her first question is
+            self.assertEqual('and when is that due?' in messages,
+                             any('what courses' in m for m in messages))
+        self.assertGreater(len(sizes), 1)
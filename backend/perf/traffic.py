@@ -0,0 +1,252 @@
+"""
+Capture recorded chat traffic into an anonymized trace, and replay it.
+
+A trace is JSON lines (gzip-compressed when the path ends in .gz): a
+header, then one record per question in arrival order,
+
+    {"t": 12.875, "user": "u3", "role": "student", "message": "...", "source": "cache"}
+
+where `t` is seconds since the first captured question and `source` is how
+it was answered at the time. Sampling is per user, so a sampled user's
+follow-up questions stay in the trace. Users become pseudonyms numbered in
+order of appearance, and emails, URLs, long numbers and the asker's own
+names are masked in the text. Nothing in the trace maps back to an account.
+
+The replayer re-issues the questions against a running backend at their
+original relative times (or `speed` times faster). It is open-loop, as real
+users are: a slow server does not delay later arrivals. Each pseudonym is
+served by its own account, so per-user memory, limits and caches behave as
+they would for real users.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.models import User
+from chat.models import Query
+from .benchmarks import percentile
+from .loadtest import ChatClient, access_token
+
+TRACE_VERSION = 1
+
+ReplayReport = namedtuple('ReplayReport', [
+    'requests', 'errors', 'statuses', 'p50', 'p95', 'p99', 'mean', 'rps',
+    'seconds', 'lag_p95', 'sources', 'recorded_sources',
+])
+
+_EMAIL = re.compile(r'[\w.+-]+@[\w-]+(\.[\w-]+)+')
+_URL = re.compile(r'https?://\S+|www\.\S+', re.IGNORECASE)
+# Phone, roll and ID numbers ("BT-20231234" keeps only its prefix). Digits
+# inside a word ("CS101") and synthetic course codes, a word plus one
+# hyphen-joined 6-digit group ("synth-000042"), are kept.
+_NUMBER = re.compile(
+    r'(?P<code>\b[A-Za-z][A-Za-z\d]*-\d{6}\b(?!-\d))'
+    r'|(?<!\w)\+?\d(?:[ -]?\d){5,}(?!\w)'
+)
+
+
+def anonymize(text, names=()):
+    """Mask emails, URLs, long numbers and the given names in `text`."""
+    text = _EMAIL.sub('<email>', text)
+    text = _URL.sub('<url>', text)
+    text = _NUMBER.sub(lambda m: m['code'] or '<number>', text)
+    names = sorted({n for n in names if n and len(n) > 1}, key=len, reverse=True)
+    if names:
+        pattern = r'\b(' + '|'.join(re.escape(n) for n in names) + r')\b'
+        text = re.sub(pattern, '<name>', text, flags=re.IGNORECASE)
+    return text
+
+
+def open_trace(path, mode='rt'):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+# ─── Capture ─────────────────────────────────────────────────────
+
+
+def _sampled(user_id, salt, fraction):
+    digest = hashlib.sha256(f'{salt}:{user_id}'.encode()).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64 < fraction
+
+
+def capture(path, since=None, until=None, sample=1.0, limit=None, salt=None):
+    """
+    Write the queries asked in [since, until) by a `sample` share of users
+    to a trace at `path`; returns the number of records written. Without a
+    salt the user sample is random on every capture.
+    """
+    salt = salt if salt is not None else os.urandom(16).hex()
+    queries = Query.objects.order_by('timestamp', 'id')
+    if since is not None:
+        queries = queries.filter(timestamp__gte=since)
+    if until is not None:
+        queries = queries.filter(timestamp__lt=until)
+    rows = queries.values(
+        'user_id', 'content', 'timestamp',
+        role=F('user__role'), username=F('user__username'),
+        first_name=F('user__first_name'), last_name=F('user__last_name'),
+        source=F('response__source'),
+    )
+
+    pseudonyms = {}
+    first = None
+    written = 0
+    with open_trace(path, 'wt') as f:
+        f.write(json.dumps({
+            'trace': TRACE_VERSION,
+            'captured': timezone.now().isoformat(),
+            'sample': sample,
+        }) + '\n')
+        for row in rows.iterator(chunk_size=2000):
+            if limit is not None and written >= limit:
+                break
+            if not _sampled(row['user_id'], salt, sample):
+                continue
+            if first is None:
+                first = row['timestamp']
+            pseudonym = pseudonyms.setdefault(row['user_id'], f'u{len(pseudonyms) + 1}')
+            names = (row['username'], row['first_name'], row['last_name'])
+            f.write(json.dumps({
+                't': round((row['timestamp'] - first).total_seconds(), 3),
+                'user': pseudonym,
+                'role': row['role'],
+                'message': anonymize(row['content'], names),
+                'source': row['source'],
+            }) + '\n')
+            written += 1
+    return written
+
+
+def read_trace(path):
+    """(header, records) of a trace file, records in arrival order."""
+    with open_trace(path) as f:
+        header = json.loads(f.readline() or '{}')
+        if header.get('trace') != TRACE_VERSION:
+            raise ValueError(f'{path} is not a version {TRACE_VERSION} traffic trace.')
+        records = [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda r: r['t'])
+    return header, records
+
+
+# ─── Accounts ────────────────────────────────────────────────────
+
+
+def local_tokens(records):
+    """
+    Token per pseudonym, minted for distinct local accounts of the same
+    role (students for unknown roles). Accounts are reused round-robin
+    when the trace has more users than the database.
+    """
+    pools = {}
+    tokens = {}
+    seen = Counter()
+    for record in records:
+        pseudonym = record['user']
+        if pseudonym in tokens:
+            continue
+        role = record.get('role') or 'student'
+        if role not in pools:
+            pools[role] = list(User.objects.filter(role=role, is_active=True).order_by('id'))
+        pool = pools[role] or pools.setdefault(
+            'student', list(User.objects.filter(role='student', is_active=True).order_by('id'))
+        )
+        if not pool:
+            raise ValueError(f'No active {role} accounts to replay as.')
+        user = pool[seen[role] % len(pool)]
+        seen[role] += 1
+        tokens[pseudonym] = access_token(user)
+    return tokens
+
+
+def login_tokens(base_url, records, accounts, timeout=60):
+    """
+    Token per pseudonym from logging in to the target as (username,
+    password) accounts, assigned round-robin in order of appearance.
+    """
+    client = ChatClient(base_url, timeout)
+    pseudonyms = list(dict.fromkeys(record['user'] for record in records))
+    logged_in = {}
+    tokens = {}
+    try:
+        for i, pseudonym in enumerate(pseudonyms):
+            username, password = accounts[i % len(accounts)]
+            if username not in logged_in:
+                logged_in[username] = client.login(username, password)
+            tokens[pseudonym] = logged_in[username]
+    finally:
+        client.close()
+    return tokens
+
+
+# ─── Replay ──────────────────────────────────────────────────────
+
+
+def replay(base_url, records, tokens, speed=1.0, stream=False, max_in_flight=64, timeout=60):
+    """
+    Re-issue `records` against `base_url` at their trace times divided by
+    `speed`; returns a ReplayReport. At most `max_in_flight` requests are
+    outstanding; beyond that arrivals queue, which shows up as lag.
+    """
+    local = threading.local()
+    clients = []
+    results = []
+    lock = threading.Lock()
+
+    def send(record, due):
+        if not hasattr(local, 'client'):
+            local.client = ChatClient(base_url, timeout)
+            with lock:
+                clients.append(local.client)
+        lag = time.monotonic() - due
+        sample, _ = local.client.chat(tokens[record['user']], record['message'], stream)
+        with lock:
+            results.append((sample, lag))
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for record in records:
+            due = started + record['t'] / speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, record, due)
+    elapsed = time.monotonic() - started
+    for client in clients:
+        client.close()
+
+    samples = [sample for sample, _ in results]
+    latencies = sorted(s.seconds * 1000 for s in samples if s.status == 200)
+    lags = sorted(max(0.0, lag) * 1000 for _, lag in results)
+    return ReplayReport(
+        len(samples),
+        sum(1 for s in samples if s.status != 200),
+        dict(Counter(s.error or s.status for s in samples)),
+        round(percentile(latencies, 50), 1),
+        round(percentile(latencies, 95), 1),
+        round(percentile(latencies, 99), 1),
+        round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+        round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        round(elapsed, 1),
+        round(percentile(lags, 95), 1),
+        dict(Counter(s.source for s in samples if s.status == 200)),
+        dict(Counter(r.get('source') for r in records)),
+    )
+
+
+def cache_hit_ratio(sources):
+    """Share of answers served from the answer cache or a coalesced call."""
+    answered = sum(count for source, count in sources.items() if source)
+    hits = sources.get('cache', 0) + sources.get('coalesced', 0)
+    return hits / answered if answered else 0.0
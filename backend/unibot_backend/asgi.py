@@ -2,6 +2,9 @@
 ASGI config for unibot_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The chat endpoints are native async views, so serve the API through this
+module (e.g. ``uvicorn unibot_backend.asgi:application``) to keep many chats
+in flight per process.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -14,3 +17,4 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'unibot_backend.settings')
 
 application = get_asgi_application()
+app = application   # the name Vercel's Python runtime serves (see vercel.json)
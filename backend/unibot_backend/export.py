@@ -0,0 +1,112 @@
+"""
+Streaming NDJSON/CSV exports shared by the chat and courses apps.
+
+Rows come from a server-side cursor (QuerySet.iterator) and are encoded and
+(optionally) gzip-compressed into ~64 KB chunks as the response is sent,
+so memory use stays flat however many rows are exported. Under ASGI each
+chunk is pulled from the cursor through sync_to_async, one at a time,
+instead of letting Django buffer the whole sync iterator into a list.
+"""
+
+import csv
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+
+from .streaming import async_chunks, is_asgi
+
+ITERATOR_CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer."""
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+def csv_cell(value):
+    """
+    A CSV cell for `value`; text that a spreadsheet would read as a formula
+    (leading =, +, -, @, tab or CR) is prefixed with a quote.
+    """
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_lines(rows, fields):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([csv_cell(row[f]) for f in fields])
+
+
+def buffered(lines, size=FLUSH_BYTES):
+    """Join small text lines into byte chunks of roughly `size`."""
+    parts, length = [], 0
+    for line in lines:
+        data = line.encode()
+        parts.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(parts)
+            parts, length = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)   # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_options(request):
+    """(format, gzip) from ?output=ndjson|csv and ?gzip=1."""
+    output = request.query_params.get('output', 'ndjson')
+    if output not in FORMATS:
+        raise ValidationError({'output': f"Choose one of: {', '.join(FORMATS)}."})
+    compress = request.query_params.get('gzip', '') in ('1', 'true', 'yes')
+    return output, compress
+
+
+def export_response(request, rows, fields, filename, output='ndjson', compress=False):
+    """
+    StreamingHttpResponse encoding `rows` (dicts, ideally from
+    values().iterator()) as NDJSON or CSV with the given columns; the
+    content is an async iterator when `request` is served over ASGI.
+    """
+    lines = csv_lines(rows, fields) if output == 'csv' else ndjson_lines(rows)
+    chunks = buffered(lines)
+    filename = f'{filename}.{output}'
+    content_type = FORMATS[output]
+    if compress:
+        chunks = gzipped(chunks)
+        filename += '.gz'
+        content_type = 'application/gzip'
+    if is_asgi(request):
+        chunks = async_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,341 @@
+"""
+In-process metrics, exposed in Prometheus text format at /api/metrics/.
+
+Counters, gauges and histograms are plain dicts behind a lock, keyed by
+label values, so recording an event costs a dict update (~1 µs) and needs
+no client library. Collectors registered with `collector()` are called only
+when the endpoint is scraped, which is how existing stats() snapshots
+(admission, single-flight, answer cache) are published at no hot-path cost.
+
+MetricsMiddleware times every request and counts the DB queries it ran
+(including those on sync_to_async threads), and `timed(stage)` records
+per-stage latency inside a request.
+
+Metrics are per process: scrape every worker, or aggregate in Prometheus.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.views import APIView
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; covers sub-millisecond cache hits up to slow LLM calls
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+                for labels, value in items]
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram; values are [bucket counts..., sum, count]."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 3)
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def value(self, *labels):
+        """(count, sum) observed for these labels."""
+        state = self._values.get(labels)
+        return (state[-1], state[-2]) if state else (0, 0)
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(state)) for labels, state in self._values.items()]
+        lines = []
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), state):
+                cumulative += count
+                le = bound if bound == '+Inf' else _format_value(float(bound))
+                lines.append(
+                    f'{self.name}_bucket{_format_labels(self.labelnames, labels, [("le", le)])} {cumulative}'
+                )
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(float(state[-2]))}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {state[-1]}')
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Re-importing a module returns the already registered series
+            return self._metrics.setdefault(metric.name, metric)
+
+    def collector(self, fn):
+        """
+        Register fn() -> iterable of (name, kind, documentation, {labels: value})
+        to be evaluated at scrape time. Usable as a decorator.
+        """
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines += metric.header() + metric.samples()
+        for fn in list(self._collectors):
+            for name, kind, documentation, values in fn():
+                lines += [f'# HELP {name} {documentation}', f'# TYPE {name} {kind}']
+                for labels, value in values.items():
+                    names = [n for n, _ in labels]
+                    lines.append(
+                        f'{name}{_format_labels(names, [v for _, v in labels])} {_format_value(value)}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+collector = REGISTRY.collector
+
+
+# ─── Request-level series ────────────────────────────────────────
+
+REQUEST_SECONDS = histogram(
+    'unibot_http_request_seconds', 'Time to produce the response (streams: until the first byte).',
+    ['view', 'method', 'status'],
+)
+REQUESTS_IN_FLIGHT = gauge('unibot_http_requests_in_flight', 'Requests being handled.')
+REQUEST_DB_QUERIES = histogram(
+    'unibot_http_request_db_queries', 'Database queries per request.', ['view'], COUNT_BUCKETS,
+)
+REQUEST_DB_SECONDS = histogram(
+    'unibot_http_request_db_seconds', 'Database time per request.', ['view'],
+)
+STAGE_SECONDS = histogram(
+    'unibot_stage_seconds', 'Latency of instrumented stages of a request.', ['stage'],
+)
+DB_QUERIES = counter('unibot_db_queries_total', 'Database queries executed.', ['alias'])
+DB_SECONDS = counter('unibot_db_seconds_total', 'Time spent in database queries.', ['alias'])
+
+
+class _RequestStats:
+    __slots__ = ('queries', 'db_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# Context variables follow the request into sync_to_async threads
+_request_stats = ContextVar('unibot_request_stats', default=None)
+
+
+class timed:
+    """
+    Record how long a block takes as a stage of the current request:
+
+        with timed('llm'):
+            ...
+
+    Works in sync and async code alike (the block is just wall time).
+    """
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        STAGE_SECONDS.observe(time.perf_counter() - self.started, self.stage)
+        return False
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        alias = context['connection'].alias
+        DB_QUERIES.inc(alias)
+        DB_SECONDS.inc(alias, amount=elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+
+def instrument_connection(connection, **kwargs):
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+connection_created.connect(instrument_connection, dispatch_uid='unibot_metrics')
+
+
+class MetricsMiddleware:
+    """Request latency, in-flight and per-request DB query metrics."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        # Connections opened before the middleware loaded
+        for connection in connections.all(initialized_only=True):
+            instrument_connection(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats, token, started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            _request_stats.reset(token)
+        self._finish(request, response, stats, started)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            _request_stats.reset(token)
+        self._finish(request, response, stats, started)
+        return response
+
+    def _start(self):
+        REQUESTS_IN_FLIGHT.inc()
+        stats = _RequestStats()
+        return stats, _request_stats.set(stats), time.perf_counter()
+
+    def _finish(self, request, response, stats, started):
+        match = request.resolver_match
+        # The route name, not the path, keeps label cardinality bounded
+        view = (match.view_name or match._func_path) if match else 'unmatched'
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started, view, request.method, response.status_code,
+        )
+        REQUEST_DB_QUERIES.observe(stats.queries, view)
+        REQUEST_DB_SECONDS.observe(stats.db_seconds, view)
+
+
+# ─── Endpoint ────────────────────────────────────────────────────
+
+class IsAdminOrStaff(permissions.BasePermission):
+    def has_permission(self, request, view):
+        user = request.user
+        return user.is_authenticated and (user.is_admin_role or user.is_staff)
+
+
+class MetricsView(APIView):
+    """
+    GET /api/metrics/
+    Prometheus text exposition of this process's metrics (admins only).
+    """
+    permission_classes = [IsAdminOrStaff]
+
+    def get(self, request):
+        return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
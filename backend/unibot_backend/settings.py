@@ -2,9 +2,11 @@
 Django settings for UNIBOT backend.
 """
 
+import json
 import os
 from pathlib import Path
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -30,9 +32,11 @@ INSTALLED_APPS = [
     'accounts',
     'courses',
     'chat',
+    'perf',
 ]
 
 MIDDLEWARE = [
+    'unibot_backend.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -97,6 +101,8 @@ CORS_ALLOWED_ORIGINS = os.getenv(
     'CORS_ALLOWED_ORIGINS', 'http://localhost:3000'
 ).split(',')
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key', 'prefer')
+CORS_EXPOSE_HEADERS = ['Location', 'Idempotent-Replayed']
 
 # REST Framework
 REST_FRAMEWORK = {
@@ -119,3 +125,114 @@ SIMPLE_JWT = {
 
 # OpenAI
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
+
+# Long-lived LLM client: pooling, deadlines, retries and circuit breaker
+CHAT_LLM = {
+    'MODEL': os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo'),
+    'BASE_URL': os.getenv('OPENAI_BASE_URL', ''),
+    'TIMEOUT': float(os.getenv('OPENAI_TIMEOUT', '20')),
+    'CONNECT_TIMEOUT': 3.0,
+    'DEADLINE': float(os.getenv('OPENAI_DEADLINE', '30')),
+    'MAX_RETRIES': int(os.getenv('OPENAI_MAX_RETRIES', '2')),
+    'BACKOFF_BASE': 0.25,
+    'BACKOFF_CAP': 4.0,
+    'BREAKER_THRESHOLD': 5,
+    'BREAKER_RESET': 30.0,
+}
+
+# Chat course-context cache ('local' = in-process LRU, 'django' = CACHES alias)
+CHAT_CONTEXT_CACHE = {
+    'BACKEND': os.getenv('CHAT_CONTEXT_CACHE_BACKEND', 'local'),
+    'ALIAS': 'default',
+    'MAX_ENTRIES': int(os.getenv('CHAT_CONTEXT_CACHE_MAX_ENTRIES', '1024')),
+    'TTL': int(os.getenv('CHAT_CONTEXT_CACHE_TTL', '300')),
+}
+
+# Semantic cache of LLM answers (near-duplicate questions, same course context)
+CHAT_ANSWER_CACHE = {
+    'ENABLED': os.getenv('CHAT_ANSWER_CACHE_ENABLED', 'True') == 'True',
+    'THRESHOLD': float(os.getenv('CHAT_ANSWER_CACHE_THRESHOLD', '0.75')),
+    'TTL': int(os.getenv('CHAT_ANSWER_CACHE_TTL', '3600')),
+    'MAX_ENTRIES': int(os.getenv('CHAT_ANSWER_CACHE_MAX_ENTRIES', '5000')),
+}
+
+# Retrieval: only the top-k relevant course chunks go into each prompt
+CHAT_RETRIEVAL = {
+    'ENABLED': os.getenv('CHAT_RETRIEVAL_ENABLED', 'True') == 'True',
+    'TOP_K': int(os.getenv('CHAT_RETRIEVAL_TOP_K', '6')),
+}
+
+# Prompt assembly: input-token budget for system prompt + context + question
+CHAT_PROMPT = {
+    'TOKEN_BUDGET': int(os.getenv('CHAT_PROMPT_TOKEN_BUDGET', '2000')),
+}
+
+# Incremental course-content indexing (BACKGROUND=False re-indexes inline)
+CHAT_INDEXING = {
+    'BACKGROUND': os.getenv('CHAT_INDEXING_BACKGROUND', 'True') == 'True',
+}
+
+# Single-flight: identical concurrent questions share one LLM call.
+# CROSS_PROCESS elects one leader across workers via the Django cache
+# (needs a shared cache backend such as Redis/Memcached).
+CHAT_COALESCE = {
+    'ENABLED': os.getenv('CHAT_COALESCE_ENABLED', 'True') == 'True',
+    'CROSS_PROCESS': os.getenv('CHAT_COALESCE_CROSS_PROCESS', 'False') == 'True',
+    'CACHE_ALIAS': 'default',
+    'LOCK_TIMEOUT': int(os.getenv('CHAT_COALESCE_LOCK_TIMEOUT', '60')),
+    'WAIT_TIMEOUT': int(os.getenv('CHAT_COALESCE_WAIT_TIMEOUT', '30')),
+}
+
+# Admission control for LLM calls (per process): concurrency caps, role
+# priority, and shedding to the local fallback past the queue-wait SLO.
+CHAT_ADMISSION = {
+    'ENABLED': os.getenv('CHAT_ADMISSION_ENABLED', 'True') == 'True',
+    'MAX_CONCURRENT': int(os.getenv('CHAT_LLM_MAX_CONCURRENT', '16')),
+    'PER_USER': int(os.getenv('CHAT_LLM_PER_USER', '2')),
+    'SLO': float(os.getenv('CHAT_LLM_QUEUE_SLO', '10')),
+}
+
+# Conversation memory for follow-up questions: recent turns verbatim plus a
+# rolling summary of older ones, each within its own token budget
+CHAT_MEMORY = {
+    'ENABLED': os.getenv('CHAT_MEMORY_ENABLED', 'True') == 'True',
+    'TURNS': int(os.getenv('CHAT_MEMORY_TURNS', '3')),
+    'TURN_TOKENS': int(os.getenv('CHAT_MEMORY_TURN_TOKENS', '200')),
+    'SUMMARY_TOKENS': int(os.getenv('CHAT_MEMORY_SUMMARY_TOKENS', '300')),
+}
+
+# Job mode: POST /api/chat/ returns 202 and a worker pool generates the answer.
+# DEFAULT_MODE='job' suits serverless deployments with short time limits.
+CHAT_JOBS = {
+    'DEFAULT_MODE': os.getenv('CHAT_DEFAULT_MODE', 'sync'),
+    'WORKERS': int(os.getenv('CHAT_JOB_WORKERS', '4')),
+    'POLL_INTERVAL': float(os.getenv('CHAT_JOB_POLL_INTERVAL', '1')),
+    'LEASE': int(os.getenv('CHAT_JOB_LEASE', '120')),
+    'MAX_ATTEMPTS': int(os.getenv('CHAT_JOB_MAX_ATTEMPTS', '3')),
+}
+
+# Idempotency-Key replay window for POST /api/chat/, and how long a retry
+# waits for an in-progress first attempt before answering 202
+CHAT_IDEMPOTENCY = {
+    'WINDOW': int(os.getenv('CHAT_IDEMPOTENCY_WINDOW', '86400')),
+    'WAIT': float(os.getenv('CHAT_IDEMPOTENCY_WAIT', '30')),
+    'POLL_INTERVAL': 0.25,
+}
+
+# Chat history retention (python manage.py purge_chat_history)
+CHAT_RETENTION = {
+    'DAYS': int(os.getenv('CHAT_RETENTION_DAYS', '365')),
+    'ARCHIVE_DIR': os.getenv('CHAT_ARCHIVE_DIR', str(BASE_DIR / 'archive')),
+    'BATCH_SIZE': int(os.getenv('CHAT_RETENTION_BATCH_SIZE', '500')),
+}
+
+# Deduplicated response-text store: bodies at least this large are zlib-compressed
+CHAT_RESPONSE_STORE = {
+    'COMPRESS_MIN_BYTES': int(os.getenv('CHAT_RESPONSE_COMPRESS_MIN_BYTES', '256')),
+}
+
+# Usage/cost reports (python manage.py rollup_chat_usage, /api/chat/usage/).
+# PRICES: {"model": [USD per 1M prompt tokens, USD per 1M completion tokens]}
+CHAT_USAGE = {
+    'PRICES': json.loads(os.getenv('CHAT_LLM_PRICES', '{"gpt-3.5-turbo": [0.5, 1.5]}')),
+}
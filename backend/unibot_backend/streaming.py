@@ -0,0 +1,77 @@
+"""
+Adapters that keep StreamingHttpResponse content streaming under both
+ASGI and WSGI.
+
+Django serves a sync iterator under ASGI, and an async one under WSGI, by
+first collecting the whole iterator into a list. So a view hands over
+whichever kind the server consumes natively: `async_chunks` wraps a sync
+iterator for ASGI, and `sync_iterator` wraps an async one for WSGI.
+"""
+
+import queue
+import threading
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+def is_asgi(request):
+    """Whether `request` (a Django or DRF request) is served over ASGI."""
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+async def async_chunks(chunks):
+    """Async iterator pulling each chunk of a sync iterator in a worker thread."""
+    chunks = iter(chunks)
+    done = object()
+    pull = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await pull(chunks, done)) is not done:
+        yield chunk
+
+
+def sync_iterator(aiterator):
+    """
+    Sync iterator over an async one. A thread drives `aiterator` on its own
+    event loop (its ORM calls run in that thread too) and hands each item
+    over as soon as it is produced. Closing the iterator early, as a WSGI
+    server does when the client disconnects, closes `aiterator` once its
+    next item arrives.
+    """
+    items = queue.SimpleQueue()
+    closed = threading.Event()
+
+    async def pump():
+        try:
+            async for item in aiterator:
+                items.put(item)
+                if closed.is_set():
+                    break
+        finally:
+            if hasattr(aiterator, 'aclose'):
+                await aiterator.aclose()
+
+    def produce():
+        try:
+            async_to_sync(pump)()
+            items.put(_DONE)
+        except BaseException as exc:
+            items.put(_Failed(exc))
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=produce, name='stream-producer', daemon=True).start()
+    try:
+        while (item := items.get()) is not _DONE:
+            if isinstance(item, _Failed):
+                raise item.exc
+            yield item
+    finally:
+        closed.set()
@@ -8,6 +8,8 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
+from .metrics import MetricsView
+
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -20,6 +22,7 @@ def api_root(request):
             'auth': '/api/auth/',
             'courses': '/api/courses/',
             'chat': '/api/chat/',
+            'metrics': '/api/metrics/',
         }
     })
 
@@ -30,4 +33,5 @@ urlpatterns = [
     path('api/auth/', include('accounts.urls')),
     path('api/courses/', include('courses.urls')),
     path('api/chat/', include('chat.urls')),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
 ]
@@ -121,16 +121,24 @@ export function logout() {
 // ─── Chat API ────────────────────────────────────────────────
 
 export async function sendMessage(message: string) {
+    // One key per message: retries (including after a token refresh)
+    // replay the stored answer instead of generating a second one.
     const res = await apiFetch('/chat/', {
         method: 'POST',
+        headers: { 'Idempotency-Key': crypto.randomUUID() },
         body: JSON.stringify({ message }),
     });
     if (!res.ok) throw new Error('Failed to send message');
     return res.json();
 }
 
-export async function getChatHistory() {
-    const res = await apiFetch('/chat/history/');
+export async function getChatHistory(params: { since?: string; before?: string; limit?: number } = {}) {
+    // Keyset-paginated: pass a previous response's `cursor` as `since` to
+    // fetch only new turns, or its `previous` cursor as `before` for older ones.
+    const query = new URLSearchParams(
+        Object.entries(params).filter(([, v]) => v !== undefined).map(([k, v]) => [k, String(v)])
+    ).toString();
+    const res = await apiFetch(`/chat/history/${query ? `?${query}` : ''}`);
     if (!res.ok) throw new Error('Failed to fetch history');
     return res.json();
 }